@@ -2,18 +2,23 @@ import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
 import RAGModel.llmbasedbackend as lm
-import json
-import numpy as np
 import captureSparql as cs
-import fastapi
 import requests
 import os
 import time
 import searchTool.searchtool as sa
+import tracing
+from history_store import ResultStore
 
 # Ignore torch file watcher issue
 os.environ["STREAMLIT_WATCHER_IGNORE"] = "torch"
 
+# With NL2SPARQL_API_URL set (e.g. http://localhost:8000) the app is a thin
+# client of the HTTP API (api.py): questions go to its /ask endpoint and no
+# models or indexes are loaded here.
+API_URL = os.getenv("NL2SPARQL_API_URL", "").rstrip("/")
+API_TIMEOUT = float(os.getenv("NL2SPARQL_API_TIMEOUT", "300"))
+
 # Custom font size for radio buttons
 st.markdown("""
     <style>
@@ -30,9 +35,6 @@ backend_choice = st.radio("Choose backend implementation", ("LLM Based Agent", "
 # Title
 st.title(f"NL TO SPARQL LLM ({backend_choice})")
 
-# SPARQL endpoint
-url = 'https://query.wikidata.org/sparql'
-
 # Init session state
 if "dialog_history" not in st.session_state:
     st.session_state.dialog_history = []
@@ -46,65 +48,211 @@ if "show_retry_button" not in st.session_state:
 if "retry_rdfs" not in st.session_state:
     st.session_state.retry_rdfs = False
 
+# Result tables of this session's history (Arrow, spilled to Parquet above
+# the memory cap); history messages only keep a table id
+if "result_store" not in st.session_state:
+    st.session_state.result_store = ResultStore()
+
+# Cache key of the last answer, dropped when the user asks for the RDFS retry
+if "last_answer_key" not in st.session_state:
+    st.session_state.last_answer_key = None
+
+# Bypass the semantic answer cache (always generate a fresh translation)
+bypass_answer_cache = st.sidebar.checkbox("Bypass answer cache", value=False)
+
+# -------- Helper: Paginated preview of a stored result table --------
+def display_table_preview(table_id):
+    """One page of a history table; older tables are read from their spill file"""
+    store = st.session_state.result_store
+    if table_id not in store:
+        return
+    pages = store.num_pages(table_id)
+    page = 0
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                               key=f"page-{table_id}") - 1
+    try:
+        st.dataframe(store.page(table_id, page), hide_index=True)
+    except FileNotFoundError:
+        st.caption("This result is no longer available.")
+        return
+    st.caption(f"{store.num_rows(table_id)} rows")
+
 # Display previous messages
 for message in st.session_state.dialog_history:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if "table" in message:
-            df = pd.DataFrame(message["table"])
-            st.table(df)
+        if "table_id" in message:
+            display_table_preview(message["table_id"])
+        if "first_token_time" in message:
+            st.write(f"⏱️ First token after {round(message['first_token_time'], 2)} seconds")
         if "time" in message:
             st.write(f"⏱️ Answered in {round(message['time'], 2)} seconds")
 
-# -------- Helper: Typewriter animation --------
-def typewriter(text: str, speed: int):
-    tokens = text.split()
-    container = st.empty()
-    for index in range(len(tokens) + 1):
-        container.markdown(" ".join(tokens[:index]))
-        time.sleep(1 / speed)
+# The RAG backend loads its encoder and indexes lazily; do it as soon as the
+# backend is picked rather than on the first question (no-op once loaded).
+if backend_choice == "RAG Model" and not API_URL:
+    with st.spinner("Loading retrieval indexes..."):
+        lm.warmup()
+
+# -------- Helper: Render a streamed LLM answer --------
+def render_streamed_answer(chunks, start_time):
+    """Render answer chunks live: reasoning as text, the query as a code block
+    as soon as the SPARQL: marker has arrived. Returns the full answer and the
+    time to the first chunk (seconds since start_time)."""
+    reasoning_box = st.empty()
+    code_box = st.empty()
+    answer = ""
+    first_token_time = None
+    for chunk in chunks:
+        if first_token_time is None:
+            first_token_time = time.time() - start_time
+        answer += chunk
+        if cs.SPARQL_MARKER in answer:
+            reasoning, sparql_code = cs.split_answer(answer)
+            reasoning_box.markdown(reasoning)
+            code_box.code(sparql_code, language="sparql")
+        else:
+            reasoning_box.markdown(answer)
+
+    if cs.SPARQL_MARKER not in answer:
+        # Bare query without a Thought section
+        reasoning_box.empty()
+        code_box.code(answer.strip(), language="sparql")
+    if first_token_time is None:
+        first_token_time = time.time() - start_time
+    return answer, first_token_time
 
 # -------- Helper: Execute SPARQL query --------
 def execute_sparql_query(sparql_code, show_results=True):
     """Execute SPARQL query and return results"""
-    query = cs.clean_query(sparql_code)
+    with tracing.span("sparql_clean"):
+        query = cs.clean_query(sparql_code)
     if not query:
         if show_results:
             st.error("❌ No valid SPARQL query extracted.")
         return None, None
     
-    r = requests.get(url, params={'format': 'json', 'query': query},
-                     headers={"Accept": "application/sparql-results+json"})
-    if not r.ok:
+    # Show the first page of rows while the rest is still downloading
+    preview = st.empty() if show_results else None
+
+    def show_first_page(page):
+        with preview.container():
+            st.caption("Loading more results…")
+            st.dataframe(page)
+
+    # Served from the canonical-query result cache when the same query
+    # (modulo whitespace, comments, prefix order, variable names) ran before
+    try:
+        df, info = cs.execute_query(query, on_page=show_first_page if show_results else None)
+    except cs.SparqlError as e:
         if show_results:
-            st.error(f"❌ SPARQL endpoint returned an error: {r.status_code}")
-            st.text(r.text)
+            preview.empty()
+            st.error(f"❌ {e}")
+            st.text(e.detail)
         return None, None
-    
-    try:
-        data = r.json()
-    except json.JSONDecodeError as e:
+    except requests.RequestException as e:
         if show_results:
-            st.error(f"❌ Failed to parse JSON: {str(e)}")
-            st.text(r.text)
+            preview.empty()
+            st.error(f"❌ SPARQL request failed: {e}")
         return None, None
-    
-    bindings = data.get("results", {}).get("bindings", [])
-    flat_rows = [{k: v["value"] for k, v in row.items()} for row in bindings]
-    df = pd.DataFrame(flat_rows)
-    
+
+    if show_results:
+        preview.empty()
+        if info["cached"]:
+            st.caption(f"⚡ Results served from cache in {info['latency'] * 1000:.0f} ms")
+        if info["truncated"] == "max_rows":
+            st.warning(f"⚠️ Showing the first {len(df)} results; the query returned more.")
+        elif info["truncated"]:
+            st.warning(f"⚠️ The result was too large; showing the first {len(df)} results.")
+
     return df, query
 
 # -------- Helper: Display query results --------
-def display_query_results(df, elapsed_time):
+def display_query_results(df, elapsed_time, first_token_time=None):
     """Display query results in chat"""
     with st.chat_message("assistant"):
         st.table(df)
         st.write(f"Number of results: {len(df)}")
+        if first_token_time is not None:
+            st.write(f"First token after {round(first_token_time, 2)} seconds")
         st.write(f"Question was answered in {round(elapsed_time, 2)} seconds")
 
+# -------- Helper: Display stage timings --------
+def display_stage_timings(records):
+    """Collapsed per-stage breakdown of one request's trace"""
+    totals = {}
+    for record in records:
+        totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration_s"]
+    if not totals:
+        return
+    with st.expander("⏱️ Stage timings"):
+        st.table(pd.DataFrame(
+            [{"stage": name, "ms": round(seconds * 1000, 1)} for name, seconds in totals.items()]
+        ))
+        for record in records:
+            attrs = record["attrs"]
+            if record["name"] == "prompt_build" and "prompt_tokens" in attrs:
+                st.caption(
+                    f"Prompt ≈ {attrs['prompt_tokens']} tokens, history {attrs.get('history_tokens', 0)} "
+                    f"({attrs.get('history_verbatim', 0)} turns verbatim, "
+                    f"{attrs.get('history_compacted', 0)} compacted, {attrs.get('history_dropped', 0)} dropped)"
+                )
+
+# -------- Helper: Call the HTTP API (thin-client mode) --------
+@st.cache_resource
+def api_session():
+    return requests.Session()
+
+def ask_service(question, backend, previous_turns, use_cache):
+    """POST /ask; returns the response dict, or None after showing the error"""
+    history = [{"role": m["role"], "content": m["content"]} for m in previous_turns]
+    try:
+        r = api_session().post(f"{API_URL}/ask", json={
+            "question": question, "backend": backend, "history": history, "use_cache": use_cache,
+        }, timeout=API_TIMEOUT)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        st.error(f"❌ Translation service failed: {e}")
+        return None
+    return r.json()
+
+def forget_answer(key):
+    if not key:
+        return
+    if API_URL:
+        try:
+            api_session().delete(f"{API_URL}/answers/{key}", timeout=API_TIMEOUT)
+        except requests.RequestException:
+            pass
+    else:
+        lm.forget_answer(key)
+
+# -------- Helper: Display answer cache stats --------
+def display_answer_cache_stats():
+    if API_URL:
+        try:
+            stats = api_session().get(f"{API_URL}/stats", timeout=API_TIMEOUT).json()["answer_cache"]
+        except (requests.RequestException, ValueError, KeyError):
+            return
+    else:
+        stats = lm.answer_cache_stats()
+    lookups = stats["hits"] + stats["misses"]
+    if lookups:
+        st.sidebar.caption(
+            f"Answer cache: {stats['hits']}/{lookups} hits ({stats['hit_rate']:.0%}), "
+            f"{stats['saved_s']:.1f} s saved, {stats['size']} entries"
+        )
+
 # -------- Helper: Process user question --------
 def process_user_question(user_quest, use_rdfs=False):
+    """Process user question inside a traced request span"""
+    backend = "rdfs" if use_rdfs else ("rag" if backend_choice == "RAG Model" else "search")
+    with tracing.span("request", backend=backend) as root, tracing.collect(root.trace_id) as records:
+        _process_user_question(user_quest, use_rdfs)
+    display_stage_timings(records)
+
+def _process_user_question(user_quest, use_rdfs=False):
     """Process user question and return answer"""
     start_time = time.time()
     
@@ -115,46 +263,83 @@ def process_user_question(user_quest, use_rdfs=False):
     with st.chat_message("user"):
         st.markdown(user_quest)
     
-    # Get answer based on backend choice or RDFS retry
-    if use_rdfs:
-        answer = lm.get_llm_response_rdfs(user_quest, st.session_state.dialog_history)
-    elif backend_choice == "RAG Model":
-        answer = lm.get_llm_response(user_quest, st.session_state.dialog_history)
+    # A near-identical earlier question (same resolved entities) is answered
+    # from the semantic answer cache (RAG backend only); the RDFS retry always
+    # generates afresh.
+    backend = "rag" if backend_choice == "RAG Model" else "search"
+    use_answer_cache = backend in lm.CACHED_BACKENDS and not use_rdfs and not bypass_answer_cache
+    previous_turns = st.session_state.dialog_history[:-1]
+    hit = service = probe = None
+    cached_from = None  # (earlier question, similarity) of a cached answer
+    if API_URL:
+        # Cache lookup, translation, execution and caching all happen in the service
+        service = ask_service(user_quest, "rdfs" if use_rdfs else backend, previous_turns,
+                              use_cache=not bypass_answer_cache)
+        if service is None:
+            return
+        chunks = [service["answer"]]
+        if service["cached"]:
+            cached_from = (service["cached_question"], service["similarity"])
     else:
-        search_terms_with_roles = sa.convert_query_to_wikidata_search(user_quest)
-        search_terms_with_roles = sa.normalize_roles(search_terms_with_roles)
-        term_strings = [entry["term"] for entry in search_terms_with_roles]
-        search_results_dict = sa.query_search_api(term_strings)
-        wikidata_ids = sa.extract_ids_per_term(search_results_dict)
-        wikidata_entities = sa.get_wikidata_descriptions(wikidata_ids)
-        answer = sa.natural_language_to_sparql(user_quest, wikidata_entities, search_terms_with_roles)
-        print(answer)
-    
+        if use_answer_cache:
+            probe = lm.probe_answer_cache(user_quest, previous_turns, backend)
+            hit = lm.lookup_cached_answer(user_quest, previous_turns, backend=backend, probe=probe)
+        # Get answer based on backend choice or RDFS retry. The Gemini backends
+        # stream, so the Thought section shows up while it is being generated.
+        if hit is not None:
+            chunks = [hit.answer]
+            cached_from = (hit.question, hit.similarity)
+        elif use_rdfs:
+            chunks = lm.stream_llm_response_rdfs(user_quest, previous_turns)
+        elif backend_choice == "RAG Model":
+            chunks = lm.stream_llm_response(user_quest, previous_turns)
+        else:
+            chunks = [sa.translate(user_quest)]
+
     # Display answer
     with st.chat_message("assistant"):
-        if "SPARQL:" in answer:
-            reasoning, sparql_code = answer.split("SPARQL:", 1)
-            typewriter(reasoning.strip(), 10)
-            st.code(sparql_code.strip(), language="sparql")
-        else:
-            sparql_code = answer.strip()
-            st.code(sparql_code, language="sparql")
-    
-    # Execute query and get results
-    df, query = execute_sparql_query(sparql_code)
+        answer, first_token_time = render_streamed_answer(chunks, start_time)
+        if cached_from is not None:
+            st.caption(f"⚡ Answer served from cache (similar to \"{cached_from[0]}\", "
+                       f"similarity {cached_from[1]:.2f})")
+    _, sparql_code = cs.split_answer(answer)
+
+    # Execute query and get results (rows of a cached answer are reused)
+    if service is not None:
+        if service["error"]:
+            st.error(f"❌ {service['error']}")
+            if service["error_detail"]:
+                st.text(service["error_detail"])
+            return
+        df, query = pd.DataFrame(service["rows"], columns=service["columns"]), service["sparql"]
+    elif hit is not None and hit.result is not None:
+        df, query = pd.DataFrame(hit.result), hit.sparql
+    else:
+        df, query = execute_sparql_query(sparql_code)
     if df is None:
         return
     
     # Display results
     elapsed_time = time.time() - start_time
-    display_query_results(df, elapsed_time)
+    display_query_results(df, elapsed_time, first_token_time)
+
+    if service is not None:
+        st.session_state.last_answer_key = service["cache_key"]
+    elif hit is not None:
+        st.session_state.last_answer_key = hit.key
+    elif probe is not None:
+        st.session_state.last_answer_key = lm.remember_answer(
+            user_quest, previous_turns, answer, elapsed_time, backend=backend,
+            sparql=query, result=df.to_dict("records"), probe=probe,
+        )
     
     # Add assistant message to history
     st.session_state.dialog_history.append({
         "role": "assistant",
         "content": answer,
-        "table": df.to_dict(),
-        "time": elapsed_time
+        "table_id": st.session_state.result_store.put(df),
+        "time": elapsed_time,
+        "first_token_time": first_token_time
     })
     
     # Auto scroll
@@ -208,6 +393,8 @@ if user_quest:
     st.session_state.last_user_question = user_quest
     process_user_question(user_quest)
 
+display_answer_cache_stats()
+
 # Show retry button after results are displayed (if needed)
 if st.session_state.show_retry_button:
     st.warning("Do you think the results we provided you with were false? Would you like to try again with our RDFS method?")
@@ -219,6 +406,8 @@ if st.session_state.show_retry_button:
     with col5:pass
     with col3:
      if st.button("🔄 Yes, retry"):
+        forget_answer(st.session_state.last_answer_key)
+        st.session_state.last_answer_key = None
         st.session_state.retry_rdfs = True
         st.session_state.show_retry_button = True
         st.rerun()
\ No newline at end of file
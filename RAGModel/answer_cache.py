@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cachestore import DEFAULT_DB_PATH, PURGE_INTERVAL
+from tracing import current_span
+
+from .embedding_cache import normalize_text
+
+###########################################################################
+# Semantic answer cache                                                   #
+###########################################################################
+
+# Whole translations (LLM answer, SPARQL and, once it has run, the result
+# rows) keyed by the normalised embedding of the question.  A new question
+# is served from the cache when its cosine similarity to a cached question
+# reaches THRESHOLD *and* the retriever resolves it to the same entities, so
+# "Where is Siemens headquartered?" and "Siemens HQ location?" share an
+# entry while the same question about BMW does not.
+#
+# Entries are evicted least-recently-used beyond MAXSIZE and expire after
+# TTL seconds; they are persisted in the SQLite file of cachestore.py
+# (NL2SPARQL_CACHE_DB, empty = memory only).  The table is bounded the same
+# way, including rows written by other processes.
+
+ENABLED: bool = os.getenv("NL2SPARQL_ANSWER_CACHE", "1").lower() not in ("0", "false", "no", "off")
+THRESHOLD: float = float(os.getenv("NL2SPARQL_ANSWER_CACHE_THRESHOLD", "0.92"))
+MAXSIZE: int = int(os.getenv("NL2SPARQL_ANSWER_CACHE_SIZE", "2048"))
+TTL: Optional[float] = float(os.getenv("NL2SPARQL_ANSWER_CACHE_TTL", "604800")) or None
+MAX_ROWS: int = int(os.getenv("NL2SPARQL_ANSWER_CACHE_MAX_ROWS", "5000"))
+
+
+class CachedAnswer:
+    """One cached translation."""
+
+    __slots__ = ("key", "backend", "question", "embedding", "entity_ids", "answer", "sparql",
+                 "result", "cost_s", "created", "last_used", "hits", "similarity")
+
+    def __init__(self, key: str, backend: str, question: str, embedding: np.ndarray,
+                 entity_ids: Sequence[str], answer: str, sparql: Optional[str] = None,
+                 result: Optional[List[Dict[str, Any]]] = None, cost_s: float = 0.0,
+                 created: Optional[float] = None, last_used: Optional[float] = None,
+                 hits: int = 0) -> None:
+        self.key = key
+        self.backend = backend
+        self.question = question
+        self.embedding = embedding
+        self.entity_ids = sorted(str(i) for i in entity_ids)
+        self.answer = answer
+        self.sparql = sparql
+        self.result = result
+        self.cost_s = cost_s  # seconds it took to produce answer (and result)
+        self.created = time.time() if created is None else created
+        self.last_used = self.created if last_used is None else last_used
+        self.hits = hits
+        self.similarity = 1.0  # of the lookup that returned this copy of the entry
+
+
+def entry_key(question: str, backend: str) -> str:
+    text = normalize_text(question).lower()
+    return hashlib.sha1(f"{backend}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """Thread-safe similarity-keyed LRU of translations with optional SQLite backing."""
+
+    def __init__(self, threshold: float = THRESHOLD, maxsize: int = MAXSIZE,
+                 ttl: Optional[float] = TTL, db_path: Optional[str | Path] = None) -> None:
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: Dict[str, CachedAnswer] = {}
+        self._matrix: Optional[np.ndarray] = None  # rows follow _entries, rebuilt on change
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_s = 0.0
+        self._purged = 0.0
+
+        self._db = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answer_cache ("
+                " key TEXT PRIMARY KEY, backend TEXT NOT NULL, question TEXT NOT NULL,"
+                " embedding BLOB NOT NULL, entity_ids TEXT NOT NULL, answer TEXT NOT NULL,"
+                " sparql TEXT, result TEXT, cost_s REAL NOT NULL, created REAL NOT NULL,"
+                " last_used REAL NOT NULL, hits INTEGER NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    # ---------------------------------------------------------------- persistence
+    def _load(self) -> None:
+        rows = self._db.execute(
+            "SELECT key, backend, question, embedding, entity_ids, answer, sparql, result,"
+            " cost_s, created, last_used, hits FROM answer_cache ORDER BY last_used"
+        ).fetchall()
+        for (key, backend, question, emb, ids, answer, sparql, result,
+             cost_s, created, last_used, hits) in rows:
+            self._entries[key] = CachedAnswer(
+                key, backend, question, np.frombuffer(emb, dtype="<f4").copy(), json.loads(ids),
+                answer, sparql, None if result is None else json.loads(result),
+                cost_s, created, last_used, hits,
+            )
+        self._expire(time.time())
+        self._evict()
+
+    def _write(self, entry: CachedAnswer) -> None:
+        # caller holds the lock
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry.key, entry.backend, entry.question,
+             np.asarray(entry.embedding, dtype="<f4").tobytes(), json.dumps(entry.entity_ids),
+             entry.answer, entry.sparql, None if entry.result is None else json.dumps(entry.result),
+             entry.cost_s, entry.created, entry.last_used, entry.hits),
+        )
+        self._db.commit()
+
+    def _delete(self, keys: Sequence[str]) -> None:
+        # caller holds the lock
+        for key in keys:
+            self._entries.pop(key, None)
+        self._matrix = None
+        if self._db is not None and keys:
+            self._db.executemany("DELETE FROM answer_cache WHERE key = ?", [(k,) for k in keys])
+            self._db.commit()
+
+    def _trim(self, now: float) -> None:
+        # caller holds the lock.  _evict/_expire only see this process's
+        # entries; this bounds the shared table (expired rows every
+        # PURGE_INTERVAL seconds)
+        if self._db is None:
+            return
+        self._db.execute(
+            "DELETE FROM answer_cache WHERE key NOT IN"
+            " (SELECT key FROM answer_cache ORDER BY last_used DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+        if self.ttl is not None and now - self._purged >= PURGE_INTERVAL:
+            self._db.execute("DELETE FROM answer_cache WHERE created < ?", (now - self.ttl,))
+            self._purged = now
+        self._db.commit()
+
+    # ---------------------------------------------------------------- helpers
+    def _expire(self, now: float) -> None:
+        # caller holds the lock
+        if self.ttl is None:
+            return
+        self._delete([k for k, e in self._entries.items() if e.created + self.ttl < now])
+
+    def _evict(self) -> None:
+        # caller holds the lock
+        excess = len(self._entries) - self.maxsize
+        if excess > 0:
+            by_use = sorted(self._entries.values(), key=lambda e: e.last_used)
+            self._delete([e.key for e in by_use[:excess]])
+
+    def _embeddings(self) -> np.ndarray:
+        # caller holds the lock
+        if self._matrix is None:
+            self._matrix = np.stack([e.embedding for e in self._entries.values()]).astype(np.float32)
+        return self._matrix
+
+    # ---------------------------------------------------------------- public API
+    def lookup(self, embedding: np.ndarray, entity_ids: Sequence[str], backend: str, *,
+               overhead_s: float = 0.0) -> Optional[CachedAnswer]:
+        """A copy of the most similar cached translation for ``backend``, or ``None``.
+
+        ``embedding`` must be L2-normalised.  Only entries whose entity ids
+        equal ``entity_ids`` are considered.  ``overhead_s`` (time spent
+        embedding and retrieving for this lookup) is subtracted from the
+        latency saved by a hit.
+        """
+        t0 = time.perf_counter()
+        wanted = sorted(str(i) for i in entity_ids)
+        with self._lock:
+            self._expire(time.time())
+            best = None
+            if self._entries:
+                entries = list(self._entries.values())
+                scores = self._embeddings() @ np.asarray(embedding, dtype=np.float32)
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = entries[i]
+                    if entry.backend == backend and entry.entity_ids == wanted:
+                        best = entry
+                        similarity = float(scores[i])
+                        break
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                best.hits += 1
+                best.last_used = time.time()
+                self._write(best)
+                self.saved_s += max(0.0, best.cost_s - overhead_s - (time.perf_counter() - t0))
+                # A copy, so concurrent lookups each see their own similarity
+                best = copy.copy(best)
+                best.similarity = similarity
+        current_span().add("cache_hits" if best is not None else "cache_misses", 1)
+        return best
+
+    def store(self, question: str, embedding: np.ndarray, entity_ids: Sequence[str], backend: str,
+              answer: str, *, sparql: Optional[str] = None,
+              result: Optional[List[Dict[str, Any]]] = None, cost_s: float = 0.0) -> CachedAnswer:
+        """Add (or replace) the translation of ``question``."""
+        entry = CachedAnswer(entry_key(question, backend), backend, question,
+                             np.asarray(embedding, dtype=np.float32), entity_ids, answer,
+                             sparql, result if result is None or len(result) <= MAX_ROWS else None,
+                             cost_s)
+        with self._lock:
+            self._entries.pop(entry.key, None)
+            self._entries[entry.key] = entry
+            self._matrix = None
+            self._write(entry)
+            self._evict()
+            self._trim(time.time())
+        return entry
+
+    def attach_result(self, key: str, sparql: str, result: List[Dict[str, Any]],
+                      extra_cost_s: float = 0.0) -> None:
+        """Record the executed query and its rows for an existing entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.sparql = sparql
+            entry.result = result if len(result) <= MAX_ROWS else None
+            entry.cost_s += extra_cost_s
+            self._write(entry)
+
+    def invalidate(self, key: str) -> None:
+        """Drop an entry, e.g. after the user rejected its answer."""
+        with self._lock:
+            self._delete([key])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._delete(list(self._entries))
+            self.hits = self.misses = 0
+            self.saved_s = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_s": self.saved_s,
+                "mean_saved_ms": 1000 * self.saved_s / self.hits if self.hits else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "persistent": self._db is not None,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """The process-wide answer cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache(db_path=DEFAULT_DB_PATH or None)
+    return _cache
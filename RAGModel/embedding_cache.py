@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tracing import current_span
+
+###########################################################################
+# Query-embedding cache                                                   #
+###########################################################################
+
+# Bounded LRU of *normalised* query embeddings keyed by (model name,
+# normalised text).  Entries evicted from memory can optionally be spilled
+# to a directory as .npy files and are read back from there on a later miss,
+# so a question that was asked (or retried) before never reaches the
+# transformer again.
+
+DEFAULT_MAXSIZE: int = int(os.getenv("NL2SPARQL_EMBED_CACHE_SIZE", "4096"))
+DEFAULT_SPILL_DIR: Optional[str] = os.getenv("NL2SPARQL_EMBED_SPILL_DIR") or None
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalise and collapse whitespace (case is kept)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of query embeddings with optional on-disk spill."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, spill_dir: Optional[str | Path] = None) -> None:
+        self.maxsize = maxsize
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._data: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---------------------------------------------------------------- helpers
+    def _spill_path(self, key: Tuple[str, str]) -> Path:
+        digest = hashlib.sha1("\x00".join(key).encode("utf-8")).hexdigest()
+        return self.spill_dir / f"{digest}.npy"
+
+    def _put(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        # caller holds the lock
+        self._data[key] = vec
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            old_key, old_vec = self._data.popitem(last=False)
+            if self.spill_dir is not None:
+                path = self._spill_path(old_key)
+                if not path.exists():
+                    np.save(path, old_vec)
+
+    def _get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        # caller holds the lock
+        vec = self._data.get(key)
+        if vec is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return vec
+        if self.spill_dir is not None:
+            path = self._spill_path(key)
+            if path.exists():
+                vec = np.load(path)
+                self._put(key, vec)
+                self.disk_hits += 1
+                return vec
+        return None
+
+    # ------------------------------------------------------------- public API
+    def encode(self, encoder, model_name: str, texts: Sequence[str], *, batch_size: int = 64) -> np.ndarray:
+        """Normalised float32 embeddings for *texts*, encoding only cache misses."""
+        keys = [(model_name, normalize_text(t)) for t in texts]
+        found: Dict[Tuple[str, str], np.ndarray] = {}
+        missing: Dict[Tuple[str, str], None] = {}  # ordered set
+        with self._lock:
+            for key in keys:
+                if key in found or key in missing:
+                    continue
+                vec = self._get(key)
+                if vec is None:
+                    missing[key] = None
+                else:
+                    found[key] = vec
+            self.misses += len(missing)
+        current_span().add("cache_hits", len(found))
+        current_span().add("cache_misses", len(missing))
+
+        if missing:
+            vecs = np.asarray(
+                encoder.encode([k[1] for k in missing], batch_size=batch_size, normalize_embeddings=True),
+                dtype=np.float32,
+            )
+            with self._lock:
+                for key, vec in zip(missing, vecs):
+                    found[key] = vec
+                    self._put(key, vec)
+
+        return np.stack([found[k] for k in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """The process-wide cache shared by the retriever and the RAG backend."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(DEFAULT_MAXSIZE, DEFAULT_SPILL_DIR)
+    return _cache
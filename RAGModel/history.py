@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from tracing import current_span
+
+###########################################################################
+# Token-budgeted dialogue history                                         #
+###########################################################################
+
+# The "Conversation so far" block of the generation prompts.  The last
+# RECENT_TURNS turns (a user message and the answers that follow it) are
+# kept verbatim; older turns are reduced to the question and the final
+# SPARQL, without the Thought section.  Turns are added newest first until
+# TOKEN_BUDGET (estimated tokens) is used up, falling back to the compact
+# form for a recent turn that does not fit verbatim; anything older is
+# replaced by a one-line note.  A budget of 0 leaves the history out.
+#
+# The caller supplies the token estimate and the function that reduces an
+# answer to its SPARQL, so this module does not depend on the LLM or
+# SPARQL layers.
+
+TOKEN_BUDGET: int = int(os.getenv("NL2SPARQL_HISTORY_TOKENS", "1500"))
+RECENT_TURNS: int = int(os.getenv("NL2SPARQL_HISTORY_RECENT_TURNS", "2"))
+
+Message = Dict[str, str]
+TokenEstimator = Callable[[str], int]
+SparqlOf = Callable[[str], str]
+
+
+def _turns(dialog_history: Sequence[Message]) -> List[List[Message]]:
+    turns: List[List[Message]] = []
+    for msg in dialog_history:
+        if msg["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def _verbatim(turn: Sequence[Message]) -> str:
+    return "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in turn)
+
+
+def _compact(turn: Sequence[Message], sparql_of: SparqlOf) -> str:
+    lines = []
+    for msg in turn:
+        if msg["role"] == "assistant":
+            sparql = sparql_of(msg["content"])
+            lines.append(f"Assistant: SPARQL:\n{sparql}")
+        else:
+            lines.append(f"{msg['role'].capitalize()}: {msg['content']}")
+    return "\n".join(lines)
+
+
+def compact_history(
+    dialog_history: Sequence[Message],
+    estimate_tokens: TokenEstimator,
+    sparql_of: SparqlOf,
+    budget: int = TOKEN_BUDGET,
+    recent_turns: int = RECENT_TURNS,
+) -> Tuple[str, Dict[str, int]]:
+    """History text within ``budget`` tokens, and counts of what went into it.
+
+    ``estimate_tokens`` counts the tokens of a text; ``sparql_of`` returns
+    the SPARQL of an assistant answer, used for compacted turns.
+    """
+    turns = _turns(dialog_history)
+    blocks: List[str] = []
+    stats = {"history_turns": len(turns), "history_verbatim": 0, "history_compacted": 0,
+             "history_dropped": 0, "history_tokens": 0}
+    used = 0
+    for age, turn in enumerate(reversed(turns)):
+        candidates = [("history_verbatim", _verbatim(turn))] if age < recent_turns else []
+        candidates.append(("history_compacted", _compact(turn, sparql_of)))
+        for kind, text in candidates:
+            tokens = estimate_tokens(text)
+            if used + tokens <= budget:
+                blocks.append(text)
+                stats[kind] += 1
+                used += tokens
+                break
+        else:
+            # Out of budget: this turn and everything before it is left out
+            stats["history_dropped"] = len(turns) - age
+            break
+    if stats["history_dropped"] and blocks:
+        blocks.append(f"({stats['history_dropped']} earlier turns omitted)")
+    text = "\n".join(reversed(blocks))
+    stats["history_tokens"] = estimate_tokens(text) if text else 0
+    return text, stats
+
+
+def format_history(dialog_history: Sequence[Message], estimate_tokens: TokenEstimator,
+                   sparql_of: SparqlOf) -> str:
+    """History block for a prompt; its token counts are recorded on the current span."""
+    text, stats = compact_history(dialog_history, estimate_tokens, sparql_of)
+    sp = current_span()
+    for key, value in stats.items():
+        sp.set(key, value)
+    return text
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+###########################################################################
+# Label gazetteer (Aho-Corasick)                                          #
+###########################################################################
+
+# One automaton over all lower-cased entity and property labels.  A single
+# pass over the query reports every occurrence; entity labels additionally
+# have to sit on word boundaries, exactly like
+#     re.search(r"\b" + re.escape(label) + r"\b", query_lower)
+# while property labels are plain substrings (``label in query_lower``).
+
+
+def _is_word(ch: str) -> bool:
+    """Same definition of a word character as ``re``'s ``\\w`` on ``str``."""
+    return ch.isalnum() or ch == "_"
+
+
+class Gazetteer:
+    """Whole-word entity / substring property label matcher."""
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._pattern: List[int] = [-1]  # pattern id ending at node, or -1
+        self._dict_link: List[int] = [0]  # next node on the fail chain with a pattern
+        self._lengths: List[int] = []
+        self._edges: List[Tuple[bool, bool]] = []  # is first/last char a word char
+        self._entities: List[List[int]] = []  # pattern id -> entity positions
+        self._props: List[List[int]] = []  # pattern id -> property positions
+        self._empty_entities: List[int] = []
+        self._empty_props: List[int] = []
+
+    # ------------------------------------------------------------------ build
+    @classmethod
+    def build(
+        cls,
+        entity_labels: Iterable[Optional[str]],
+        prop_labels: Iterable[Optional[str]],
+    ) -> "Gazetteer":
+        """Compile labels; positions in the input lists are what ``match`` returns."""
+        gz = cls()
+        ids: Dict[str, int] = {}
+
+        def add(label: Optional[str], pos: int, kind: str) -> None:
+            if label is None:
+                return
+            text = label.lower()
+            if not text:
+                (gz._empty_entities if kind == "entity" else gz._empty_props).append(pos)
+                return
+            pid = ids.get(text)
+            if pid is None:
+                pid = ids[text] = gz._insert(text)
+            (gz._entities if kind == "entity" else gz._props)[pid].append(pos)
+
+        for pos, label in enumerate(entity_labels):
+            add(label, pos, "entity")
+        for pos, label in enumerate(prop_labels):
+            add(label, pos, "prop")
+        gz._link()
+        return gz
+
+    def _insert(self, text: str) -> int:
+        node = 0
+        for ch in text:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._pattern.append(-1)
+                self._dict_link.append(0)
+            node = nxt
+        pid = len(self._lengths)
+        self._pattern[node] = pid
+        self._lengths.append(len(text))
+        self._edges.append((_is_word(text[0]), _is_word(text[-1])))
+        self._entities.append([])
+        self._props.append([])
+        return pid
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                target = self._fail[child]
+                self._dict_link[child] = target if self._pattern[target] >= 0 else self._dict_link[target]
+                queue.append(child)
+
+    # ------------------------------------------------------------------ query
+    def match(self, query_lower: str) -> Tuple[List[int], List[int]]:
+        """Return sorted entity and property positions whose label occurs in the query."""
+        goto, fail, pattern, dict_link = self._goto, self._fail, self._pattern, self._dict_link
+        n = len(query_lower)
+        ents = set()
+        props = set()
+
+        node = 0
+        for i, ch in enumerate(query_lower):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node if pattern[node] >= 0 else dict_link[node]
+            while out:
+                pid = pattern[out]
+                out = dict_link[out]
+                if self._props[pid]:
+                    props.update(self._props[pid])
+                if self._entities[pid]:
+                    start = i - self._lengths[pid] + 1
+                    first_word, last_word = self._edges[pid]
+                    before = start > 0 and _is_word(query_lower[start - 1])
+                    after = i + 1 < n and _is_word(query_lower[i + 1])
+                    if before != first_word and after != last_word:
+                        ents.update(self._entities[pid])
+
+        if self._empty_entities and any(_is_word(ch) for ch in query_lower):
+            # r"\b\b" matches wherever the query has any word boundary
+            ents.update(self._empty_entities)
+        props.update(self._empty_props)
+        return sorted(ents), sorted(props)
+
+    def __len__(self) -> int:
+        return len(self._lengths)
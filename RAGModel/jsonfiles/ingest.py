@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import bz2
+import gzip
+import io
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+###########################################################################
+# Streaming entity ingestion                                              #
+###########################################################################
+
+# Entity records are read one at a time, normalised, encoded in fixed-size
+# batches and appended to files in the artifact directory, so peak memory
+# is one batch of records and embeddings instead of the whole corpus.
+#
+# Accepted inputs (optionally .gz or .bz2 compressed):
+#   * a JSON array of objects, like the bundled capital.json etc.
+#   * JSON lines, one object per line
+#   * Wikidata JSON dumps and slices of them ("[", one entity per line with
+#     a trailing comma, "]"), with labels/descriptions/aliases per language
+
+READ_CHUNK = 1 << 20  # characters read from a file at a time
+_SEPARATORS = " \t\r\n,[]"
+
+
+def open_text(path: Path) -> TextIO:
+    """Open a (possibly gzip or bz2 compressed) UTF-8 text file for reading."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    if path.suffix == ".bz2":
+        return io.TextIOWrapper(bz2.open(path, "rb"), encoding="utf-8")
+    return path.open("r", encoding="utf-8")
+
+
+def iter_raw_records(path: Path, *, chunk_size: int = READ_CHUNK) -> Iterator[Dict[str, Any]]:
+    """Yield the JSON objects of ``path`` one by one.
+
+    The file is treated as a sequence of objects separated by whitespace,
+    commas or array brackets, which covers JSON arrays, JSON lines and dump
+    slices alike.  Only the record being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open_text(path) as fp:
+        buf = ""
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in _SEPARATORS:
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                buf, pos = fp.read(chunk_size), 0
+                eof = not buf
+                continue
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The record runs past the buffer; read on and retry
+                more = fp.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+            if pos >= chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def _dump_value(field: Any, language: str) -> str:
+    value = (field or {}).get(language)
+    return value.get("value", "") if isinstance(value, dict) else ""
+
+
+def normalize_record(raw: Dict[str, Any], language: str = "en") -> Optional[Dict[str, Any]]:
+    """Map one raw record to ``{"id", "label", "description", "facts"}``.
+
+    Wikidata dump entities (``labels``/``descriptions``/``aliases`` keyed by
+    language) use the ``language`` texts; dump properties and items without
+    a label in that language are skipped (``None``).  Every other record
+    goes through the field mapping of the bundled files.
+    """
+    if isinstance(raw.get("labels"), dict):
+        if raw.get("type", "item") != "item":
+            return None
+        label = _dump_value(raw["labels"], language)
+        if not label:
+            return None
+        aliases = (raw.get("aliases") or {}).get(language) or []
+        return {
+            "id": raw.get("id"),
+            "label": label,
+            "description": _dump_value(raw.get("descriptions"), language),
+            "facts": [a["value"] for a in aliases if isinstance(a, dict) and a.get("value")],
+        }
+
+    return {
+        "id": raw.get("wikidata_id")
+        or raw.get("uid")
+        or raw.get("pk")
+        or raw.get("code"),
+        "label": raw.get("label") or raw.get("name") or raw.get("title"),
+        "description": raw.get("description")
+        or raw.get("summary")
+        or "",
+        "facts": raw.get("facts")
+        or raw.get("aliases")
+        or raw.get("aka")
+        or [],
+    }
+
+
+def iter_entities(paths: Iterable[Path], language: str = "en") -> Iterator[Dict[str, Any]]:
+    """Normalised entities of all ``paths``, in file order."""
+    for path in paths:
+        for raw in iter_raw_records(path):
+            entity = normalize_record(raw, language)
+            if entity is not None:
+                yield entity
+
+
+def entity_text(e: Dict[str, Any]) -> str:
+    """The text that is embedded for an entity."""
+    return f"{e['label']} ({e['id']}): {e['description']} {' '.join(e.get('facts', []))}"
+
+
+###########################################################################
+# Append-only writers                                                     #
+###########################################################################
+
+class JsonArrayWriter:
+    """Write a JSON array one element at a time."""
+
+    def __init__(self, path: Path) -> None:
+        self._fp = Path(path).open("w", encoding="utf-8")
+        self._fp.write("[")
+        self._first = True
+
+    def append(self, obj: Any) -> None:
+        if not self._first:
+            self._fp.write(",")
+        self._fp.write(json.dumps(obj, ensure_ascii=False))
+        self._first = False
+
+    def close(self) -> None:
+        self._fp.write("]")
+        self._fp.close()
+
+    def __enter__(self) -> "JsonArrayWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class EmbeddingWriter:
+    """Append float32 rows straight into a ``.npy`` file.
+
+    A fixed-size header is reserved up front and filled in with the final
+    shape by :meth:`finish`, so rows never have to be held or copied.
+    """
+
+    HEADER_LEN = 128
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._fp = self.path.open("wb")
+        self._fp.write(b"\0" * self.HEADER_LEN)
+        self.rows = 0
+        self.dim: Optional[int] = None
+
+    def append(self, emb: np.ndarray) -> None:
+        emb = np.ascontiguousarray(emb, dtype="<f4")
+        if self.dim is None:
+            self.dim = emb.shape[1]
+        self._fp.write(emb.tobytes())
+        self.rows += len(emb)
+
+    def _header(self) -> bytes:
+        # .npy format 1.0: magic, version, header length, padded dict text
+        text = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (self.rows, self.dim)
+        text = text.ljust(self.HEADER_LEN - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) + text.encode("latin1")
+
+    def finish(self) -> np.ndarray:
+        """Write the header and return the embeddings memory-mapped."""
+        if not self.rows:
+            self._fp.close()
+            self.path.unlink()
+            raise ValueError("No entities were ingested")
+        self._fp.seek(0)
+        self._fp.write(self._header())
+        self._fp.close()
+        return np.load(self.path, mmap_mode="r")
+
+
+###########################################################################
+# Ingestion                                                               #
+###########################################################################
+
+def ingest_entities(
+    paths: Iterable[Path],
+    out_dir: Path,
+    encoder: Any,
+    *,
+    batch_size: int = 256,
+    language: str = "en",
+) -> Dict[str, Any]:
+    """Stream entities from ``paths`` into ``out_dir``.
+
+    Writes ``entity_docs.json``, ``entity_texts.json``, ``entity_ids.json``
+    and ``entity_embeddings.npy`` (normalised float32).  Returns
+    ``{"embeddings": <memory-mapped array>, "labels": [...], "count": n}``;
+    the labels are kept for the gazetteer, everything else stays on disk.
+    """
+    out_dir = Path(out_dir)
+    labels: List[str] = []
+    embeddings = EmbeddingWriter(out_dir / "entity_embeddings.npy")
+    batch: List[str] = []
+
+    def flush() -> None:
+        if batch:
+            embeddings.append(encoder.encode(batch, normalize_embeddings=True, batch_size=batch_size))
+            batch.clear()
+
+    with JsonArrayWriter(out_dir / "entity_docs.json") as docs, \
+            JsonArrayWriter(out_dir / "entity_texts.json") as texts, \
+            JsonArrayWriter(out_dir / "entity_ids.json") as ids:
+        for entity in iter_entities(paths, language):
+            text = entity_text(entity)
+            docs.append(entity)
+            texts.append(text)
+            ids.append(entity["id"])
+            labels.append(entity["label"])
+            batch.append(text)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+    return {"embeddings": embeddings.finish(), "labels": labels, "count": len(labels)}
+
+
+###########################################################################
+# CLI: inspect an input file without encoding it                          #
+###########################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count and preview the entities of dump files")
+    parser.add_argument("paths", nargs="+", type=Path)
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--show", type=int, default=3, help="entities to print")
+    args = parser.parse_args()
+
+    count = 0
+    for entity in iter_entities(args.paths, args.language):
+        if count < args.show:
+            print(json.dumps(entity, ensure_ascii=False))
+        count += 1
+    print(f"{count} entities")
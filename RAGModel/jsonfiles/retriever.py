@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+import argparse
+import base64
+import copy
+import hashlib
 import json
+import logging
 import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from tracing import span
+
+from ..embedding_cache import get_embedding_cache
+from ..model_registry import get_encoder
+from .gazetteer import Gazetteer
+from .ingest import entity_text, ingest_entities, iter_raw_records, normalize_record
 
 ###########################################################################
 # Configuration                                                           #
@@ -15,6 +30,8 @@ from sentence_transformers import SentenceTransformer
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 
+logger = logging.getLogger(__name__)
+
 # List the JSON files that hold entity data. Add/remove as you like.
 ENTITY_JSON_FILES: List[str] = [
     "capital.json",
@@ -25,84 +42,678 @@ ENTITY_JSON_FILES: List[str] = [
     "public_figures.json",
 ]
 
+# Additional entity sources, e.g. Wikidata dump slices (.json/.jsonl, also
+# .gz/.bz2), separated by os.pathsep.  They are streamed, never loaded whole.
+ENTITY_DUMPS: List[Path] = [Path(p) for p in os.getenv("NL2SPARQL_ENTITY_DUMPS", "").split(os.pathsep) if p]
+DUMP_LANGUAGE: str = os.getenv("NL2SPARQL_DUMP_LANGUAGE", "en")
+INGEST_BATCH_SIZE: int = 256
+
 # Path to the natural‑language property file (predicate labels)
 EN_JSON_PATH: Path = SCRIPT_DIR / "en.json"
 
 # Sentence‑Transformers model (using CPU by default)
 MODEL_NAME: str = "all-MiniLM-L6-v2"
 
+# Prebuilt embeddings and FAISS indexes live here, one sub-directory per
+# content hash of the inputs above.  Bump ARTIFACT_VERSION whenever the
+# on-disk layout changes so old artifacts are ignored.
+ARTIFACT_ROOT: Path = SCRIPT_DIR / "index_artifacts"
+ARTIFACT_VERSION: int = 3
+
+# Entity index type.  "flat" is an exact scan and right for the bundled
+# corpus; the approximate types are for corpora with millions of items:
+#   ivf_flat  inverted lists over full vectors (search nprobe of nlist lists)
+#   ivf_pq    inverted lists over product-quantised codes, re-ranked exactly
+#             against the stored embeddings
+#   hnsw      graph index, no training (search quality set by efSearch)
+# Build parameters are part of the artifact hash; nprobe/efSearch are search
+# time settings and can be changed without a rebuild.  The property index is
+# always flat (Wikidata has about 12k properties).
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+INDEX_TYPE: str = os.getenv("NL2SPARQL_INDEX_TYPE", "flat")
+IVF_NLIST: int = int(os.getenv("NL2SPARQL_IVF_NLIST", "0"))  # 0: about 4 * sqrt(n)
+IVF_NPROBE: int = int(os.getenv("NL2SPARQL_IVF_NPROBE", "16"))
+PQ_M: int = int(os.getenv("NL2SPARQL_PQ_M", "48"))  # sub-quantizers; must divide the dimension
+PQ_NBITS: int = 8
+PQ_REFINE: int = 4  # exact re-ranking of topk * PQ_REFINE candidates
+HNSW_M: int = int(os.getenv("NL2SPARQL_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION: int = 200
+HNSW_EF_SEARCH: int = int(os.getenv("NL2SPARQL_HNSW_EF_SEARCH", "64"))
+ADD_CHUNK: int = 65536  # vectors added to an index per call
+
+# How vectors are stored, for the entity and the property index:
+#   float32  full vectors in the index, plus entity/prop_embeddings.npy
+#   sq8      8-bit scalar quantisation (4x smaller), no float32 copy kept
+#   pq       product quantisation, PQ_M bytes per vector, no float32 copy
+# Quantised scores are approximate; benchmarks/vector_storage.py reports
+# how far top-k results drift from float32 on the bundled data.
+VECTOR_STORAGES = ("float32", "sq8", "pq")
+VECTOR_STORAGE: str = os.getenv("NL2SPARQL_VECTOR_STORAGE", "float32")
+
+# Entity upserts/deletes made after a build are appended to this log and
+# applied on top of the artifacts at load time (see "Incremental updates").
+# Running processes check it for new lines every RELOAD_INTERVAL seconds.
+CHANGELOG_PATH: Path = ARTIFACT_ROOT / "changes.jsonl"
+RELOAD_INTERVAL: float = float(os.getenv("NL2SPARQL_RELOAD_INTERVAL", "2"))
+
 ###########################################################################
 # Model & helpers                                                         #
 ###########################################################################
 
-model = SentenceTransformer(MODEL_NAME, device="cpu")
+def _encoder():
+    """Shared encoder from the process-wide registry (loaded on first use)."""
+    return get_encoder(MODEL_NAME, device="cpu")
+
+
+###########################################################################
+# Index construction                                                      #
+###########################################################################
+
+def index_config(kind: Optional[str] = None, storage: Optional[str] = None) -> Dict[str, Any]:
+    """Build parameters of an index of type ``kind`` (default INDEX_TYPE)
+    storing vectors as ``storage`` (default VECTOR_STORAGE)."""
+    kind = kind or INDEX_TYPE
+    storage = storage or VECTOR_STORAGE
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {kind!r}; expected one of {INDEX_TYPES}")
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(f"Unknown vector storage {storage!r}; expected one of {VECTOR_STORAGES}")
+    if kind == "hnsw" and storage == "pq":
+        raise ValueError("FAISS HNSW-PQ only supports L2 distances; use sq8 storage with hnsw")
+    config: Dict[str, Any] = {"type": kind, "storage": storage}
+    if kind in ("ivf_flat", "ivf_pq"):
+        config["nlist"] = IVF_NLIST
+    if kind == "ivf_pq" or storage == "pq":
+        config.update(pq_m=PQ_M, pq_nbits=PQ_NBITS)
+    if kind == "hnsw":
+        config.update(hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION)
+    return config
+
+
+def build_index(emb: np.ndarray, config: Dict[str, Any]) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """Create, train and fill an inner-product index for ``emb``.
+
+    Returns the index and the parameters actually used: ``nlist`` is derived
+    from the corpus size when 0 and capped so every list gets enough training
+    points; corpora too small to train an IVF index get a flat one.
+    """
+    n, dim = emb.shape
+    kind = config["type"]
+    used = dict(config)
+    if kind in ("ivf_flat", "ivf_pq"):
+        nlist = config["nlist"] or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))  # FAISS wants >= 39 points per centroid
+        min_train = 2 ** config["pq_nbits"] if kind == "ivf_pq" else nlist
+        if n < max(min_train, 2 * nlist):
+            logger.warning("%d vectors are too few to train %s; using a flat index", n, kind)
+            kind = used["type"] = "flat"
+        else:
+            used["nlist"] = nlist
+
+    if "pq_m" in used and dim % used["pq_m"]:
+        raise ValueError(f"PQ_M={used['pq_m']} does not divide the embedding dimension {dim}")
+    used["factory"] = _factory_string(kind, used)
+    index = faiss.index_factory(dim, used["factory"], faiss.METRIC_INNER_PRODUCT)
+    if kind == "hnsw":
+        index.hnsw.efConstruction = config["ef_construction"]
+    if hasattr(index, "do_polysemous_training"):
+        # The factory turns this on for PQ; it only helps Hamming-distance
+        # search and makes training orders of magnitude slower
+        index.do_polysemous_training = False
+    if not index.is_trained:
+        index.train(_training_sample(emb, used))
+    # Added in chunks so a memory-mapped ``emb`` is never loaded whole
+    for start in range(0, n, ADD_CHUNK):
+        index.add(np.ascontiguousarray(emb[start:start + ADD_CHUNK], dtype=np.float32))
+    return index, used
+
+
+def _factory_string(kind: str, config: Dict[str, Any]) -> str:
+    codec = {
+        "float32": "Flat",
+        "sq8": "SQ8",
+        "pq": f"PQ{config.get('pq_m')}x{config.get('pq_nbits')}",
+    }[config["storage"]]
+    if kind == "flat":
+        return codec
+    if kind == "ivf_flat":
+        return f"IVF{config['nlist']},{codec}"
+    if kind == "ivf_pq":
+        return f"IVF{config['nlist']},PQ{config['pq_m']}x{config['pq_nbits']}"
+    return f"HNSW{config['hnsw_m']}" + ("" if codec == "Flat" else f",{codec}")
+
+
+def _training_sample(emb: np.ndarray, config: Dict[str, Any]) -> np.ndarray:
+    # k-means in FAISS uses at most 256 points per centroid anyway; the
+    # scalar quantiser only needs value ranges
+    centroids = max(config.get("nlist", 1), 2 ** config.get("pq_nbits", 0))
+    size = min(len(emb), max(256 * centroids, 65536))
+    if size == len(emb):
+        return np.ascontiguousarray(emb, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(0).choice(len(emb), size, replace=False))
+    return np.ascontiguousarray(emb[rows], dtype=np.float32)
+
+
+def set_search_params(
+    index: faiss.Index, *, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> None:
+    """Apply the search-time knobs that exist for this index type."""
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass  # not an IVF index
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def search_index(
+    index: faiss.Index,
+    config: Dict[str, Any],
+    embeddings: np.ndarray,
+    query_emb: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-``k`` inner products against an index made by :func:`build_index`.
+
+    PQ scores are approximate, so for ``ivf_pq`` a larger candidate set is
+    re-scored exactly against ``embeddings`` (the vectors that were indexed);
+    this keeps the score thresholds tuned on the flat index meaningful.
+    Without float32 ``embeddings`` (quantised storage) the index scores are
+    returned as they are.
+    """
+    if config["type"] != "ivf_pq" or embeddings is None:
+        return index.search(query_emb, k)
+
+    _, cand = index.search(query_emb, k * PQ_REFINE)
+    scores = np.full((len(query_emb), k), -np.inf, dtype=np.float32)
+    idx = np.full((len(query_emb), k), -1, dtype=np.int64)
+    for row, ids in enumerate(cand):
+        ids = np.unique(ids[ids >= 0])  # sorted, so the mmap is read in order
+        exact = np.asarray(embeddings[ids]) @ query_emb[row]
+        order = np.argsort(-exact, kind="stable")[:k]
+        scores[row, : len(order)] = exact[order]
+        idx[row, : len(order)] = ids[order]
+    return scores, idx
+
 
+def _search_entities(
+    st: "_IndexState", ov: "_Overlay", query_emb: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-``k`` entity rows of the artifact index merged with the overlay."""
+    # Over-fetch from the artifact index by the number of hidden rows so
+    # that dropping them still leaves k candidates
+    scores, idx = search_index(
+        st.entity_index, st.entity_index_config, st.entity_embeddings, query_emb, k + ov.n_hidden_base
+    )
+    if not ov.hidden and not ov.index.ntotal:
+        return scores, idx
 
-def _load_entities(path: Path) -> List[Dict[str, Any]]:
-    """Normalise various entity JSON formats into a common schema."""
+    if ov.index.ntotal:
+        d_scores, d_idx = ov.index.search(query_emb, k)
+    else:
+        d_scores = np.empty((len(query_emb), 0), dtype=np.float32)
+        d_idx = np.empty((len(query_emb), 0), dtype=np.int64)
+    out_scores = np.full((len(query_emb), k), -np.inf, dtype=np.float32)
+    out_idx = np.full((len(query_emb), k), -1, dtype=np.int64)
+    for row in range(len(query_emb)):
+        cand = [
+            (score, i)
+            for score, i in zip(np.concatenate([scores[row], d_scores[row]]), np.concatenate([idx[row], d_idx[row]]))
+            if i >= 0 and i not in ov.hidden
+        ]
+        cand.sort(key=lambda c: -c[0])
+        for j, (score, i) in enumerate(cand[:k]):
+            out_scores[row, j] = score
+            out_idx[row, j] = i
+    return out_scores, out_idx
+
+
+###########################################################################
+# Index artifacts (build once, memory-map on import)                      #
+###########################################################################
+
+def corpus_hash() -> str:
+    """Content hash of everything that goes into the indexes."""
+    h = hashlib.sha256()
+    h.update(f"v{ARTIFACT_VERSION}|{MODEL_NAME}".encode("utf-8"))
+    h.update(json.dumps(index_config(), sort_keys=True).encode("utf-8"))
+    for path in [SCRIPT_DIR / fname for fname in ENTITY_JSON_FILES] + [EN_JSON_PATH]:
+        if not path.exists():
+            raise FileNotFoundError(f"Expected JSON file not found: {path}")
+        h.update(f"|{path.name}|".encode("utf-8"))
+        h.update(path.read_bytes())
+    # Dumps can be many GB: identify them by path, size and mtime instead
+    for path in ENTITY_DUMPS:
+        stat = path.stat()
+        h.update(f"|{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8"))
+    h.update(f"|{DUMP_LANGUAGE}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    with path.open("w", encoding="utf-8") as fp:
+        json.dump(obj, fp, ensure_ascii=False)
+
+
+def _read_json(path: Path) -> Any:
     with path.open("r", encoding="utf-8") as fp:
-        raw = json.load(fp)
+        return json.load(fp)
+
+
+def build_artifacts(*, force: bool = False) -> Path:
+    """Encode the corpus and write embeddings, indexes and id/text arrays.
+
+    Returns the artifact directory for the current :func:`corpus_hash`.
+    Nothing is re-encoded when that directory already exists, unless
+    ``force`` is set.  The build goes to a temporary directory that is
+    renamed into place, so concurrent workers never see a partial artifact.
+    """
+    digest = corpus_hash()
+    target = ARTIFACT_ROOT / digest
+    if target.exists() and not force:
+        return target
+
+    ARTIFACT_ROOT.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{digest}-", dir=ARTIFACT_ROOT))
+    try:
+        # Entities are streamed: records -> batches of embeddings on disk
+        sources = [SCRIPT_DIR / fname for fname in ENTITY_JSON_FILES] + ENTITY_DUMPS
+        ingested = ingest_entities(
+            sources, tmp, _encoder(), batch_size=INGEST_BATCH_SIZE, language=DUMP_LANGUAGE
+        )
+        entity_index, entity_config = build_index(ingested["embeddings"], index_config())
+        faiss.write_index(entity_index, str(tmp / "entity.index"))
+        del entity_index
+        if entity_config["storage"] != "float32":
+            # The index holds the only (quantised) copy of the vectors
+            del ingested["embeddings"]
+            (tmp / "entity_embeddings.npy").unlink()
 
-    entities: List[Dict[str, Any]] = []
-    for entry in raw:
-        entities.append(
+        props: Dict[str, str] = _read_json(EN_JSON_PATH)
+        p_texts = list(props.values())  # No "(P84)"
+        p_ids = list(props.keys())
+
+        p_emb = np.asarray(
+            _encoder().encode(p_texts, normalize_embeddings=True), dtype=np.float32
+        )
+        prop_index, prop_config = build_index(p_emb, index_config("flat"))
+        if prop_config["storage"] == "float32":
+            np.save(tmp / "prop_embeddings.npy", p_emb)
+        del p_emb
+        faiss.write_index(prop_index, str(tmp / "prop.index"))
+
+        gazetteer = Gazetteer.build(ingested["labels"], p_texts)
+        with (tmp / "gazetteer.pkl").open("wb") as fp:
+            pickle.dump(gazetteer, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+        _write_json(tmp / "properties.json", props)
+        _write_json(tmp / "prop_texts.json", p_texts)
+        _write_json(tmp / "prop_ids.json", p_ids)
+        _write_json(
+            tmp / "meta.json",
             {
-                "id": entry.get("wikidata_id")
-                or entry.get("uid")
-                or entry.get("pk")
-                or entry.get("code"),
-                "label": entry.get("label") or entry.get("name") or entry.get("title"),
-                "description": entry.get("description")
-                or entry.get("summary")
-                or "",
-                "facts": entry.get("facts")
-                or entry.get("aliases")
-                or entry.get("aka")
-                or [],
-            }
+                "version": ARTIFACT_VERSION,
+                "hash": digest,
+                "model": MODEL_NAME,
+                "entity_files": ENTITY_JSON_FILES,
+                "entity_dumps": [str(p) for p in ENTITY_DUMPS],
+                "n_entities": ingested["count"],
+                "n_properties": len(p_ids),
+                "entity_index": entity_config,
+                "prop_index": prop_config,
+            },
         )
-    return entities
+
+        if force and target.exists():
+            shutil.rmtree(target)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another process finished the same build first; keep theirs.
+            if not target.exists():
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Drop artifacts for stale hashes (and leftovers of crashed builds).
+    for other in ARTIFACT_ROOT.iterdir():
+        if other.is_dir() and other.name != digest and not other.name.startswith(f".{digest}-"):
+            shutil.rmtree(other, ignore_errors=True)
+    return target
+
+
+def _read_index(path: Path) -> faiss.Index:
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Not every index type supports mmap; fall back to a regular read.
+        return faiss.read_index(str(path))
 
 
 ###########################################################################
-# Build entity corpus & FAISS index                                       #
+# Load entity & property indexes (lazily, on first use)                   #
 ###########################################################################
 
-entity_docs: List[Dict[str, Any]] = []
-for fname in ENTITY_JSON_FILES:
-    fpath = SCRIPT_DIR / fname
-    if not fpath.exists():
-        raise FileNotFoundError(f"Expected JSON file not found: {fpath}")
-    entity_docs.extend(_load_entities(fpath))
+def _load_embeddings(path: Path) -> Optional[np.ndarray]:
+    return np.load(path, mmap_mode="r") if path.exists() else None
 
-entity_texts: List[str] = [
-    f"{e['label']} ({e['id']}): {e['description']} {' '.join(e.get('facts', []))}"
-    for e in entity_docs
-]
-entity_ids: List[Any] = [e["id"] for e in entity_docs]
 
-entity_embeddings = model.encode(entity_texts, normalize_embeddings=True)
-entity_index = faiss.IndexFlatIP(entity_embeddings.shape[1])
-entity_index.add(np.asarray(entity_embeddings, dtype=np.float32))
+class _IndexState:
+    """Everything loaded from one artifact directory."""
+
+    def __init__(self, artifact_dir: Path) -> None:
+        self.artifact_dir = artifact_dir
+
+        self.entity_docs: List[Dict[str, Any]] = _read_json(artifact_dir / "entity_docs.json")
+        self.entity_texts: List[str] = _read_json(artifact_dir / "entity_texts.json")
+        self.entity_ids: List[Any] = _read_json(artifact_dir / "entity_ids.json")
+        # None when the index stores quantised vectors only
+        self.entity_embeddings = _load_embeddings(artifact_dir / "entity_embeddings.npy")
+        self.entity_index = _read_index(artifact_dir / "entity.index")
+        self.entity_index_config: Dict[str, Any] = _read_json(artifact_dir / "meta.json")["entity_index"]
+        set_search_params(self.entity_index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH)
+
+        self.properties: Dict[str, str] = _read_json(artifact_dir / "properties.json")
+        self.prop_texts: List[str] = _read_json(artifact_dir / "prop_texts.json")
+        self.prop_ids: List[str] = _read_json(artifact_dir / "prop_ids.json")
+        self.prop_embeddings = _load_embeddings(artifact_dir / "prop_embeddings.npy")
+        self.prop_index = _read_index(artifact_dir / "prop.index")
+
+        with (artifact_dir / "gazetteer.pkl").open("rb") as fp:
+            self.gazetteer: Gazetteer = pickle.load(fp)
+
+        # Changes from the change log; replaced as a whole on every reload
+        self.overlay = _Overlay(self)
+        self._rows_by_id: Optional[Dict[Any, List[int]]] = None
+
+    def base_rows(self, entity_id: Any) -> List[int]:
+        """Artifact rows holding ``entity_id`` (ids can repeat across files)."""
+        if self._rows_by_id is None:
+            rows: Dict[Any, List[int]] = {}
+            for row, eid in enumerate(self.entity_ids):
+                rows.setdefault(eid, []).append(row)
+            self._rows_by_id = rows
+        return self._rows_by_id.get(entity_id, [])
+
+
+_state: _IndexState | None = None
+_state_lock = threading.Lock()
+
+# Module attributes that used to be built at import time; still reachable as
+# ``retriever.entity_index`` etc. through the module-level ``__getattr__``.
+_STATE_ATTRS = {
+    "ARTIFACT_DIR": "artifact_dir",
+    "entity_docs": "entity_docs",
+    "entity_texts": "entity_texts",
+    "entity_ids": "entity_ids",
+    "entity_embeddings": "entity_embeddings",
+    "entity_index": "entity_index",
+    "properties": "properties",
+    "prop_texts": "prop_texts",
+    "prop_ids": "prop_ids",
+    "prop_embeddings": "prop_embeddings",
+    "prop_index": "prop_index",
+    "gazetteer": "gazetteer",
+}
+
+
+def get_state() -> _IndexState:
+    """Load (building first if needed) the indexes for the current corpus."""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                st = _IndexState(build_artifacts())
+                _reload_changes(st)
+                _state = st
+    else:
+        _maybe_reload(_state)
+    return _state
+
+
+def warmup() -> None:
+    """Load the encoder and indexes now instead of on the first query."""
+    get_state()
+    _encoder()
+
+
+def __getattr__(name: str) -> Any:
+    if name in _STATE_ATTRS:
+        return getattr(get_state(), _STATE_ATTRS[name])
+    if name == "model":
+        return _encoder()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 ###########################################################################
-# Build property index                                                    #
+# Incremental updates                                                     #
 ###########################################################################
 
-with EN_JSON_PATH.open("r", encoding="utf-8") as fp:
-    properties: Dict[str, str] = json.load(fp)
+# Rows of the artifact index are numbered by position.  Upserted entities
+# get new row ids after those and go into a small id-mapped overlay index
+# (IndexIDMap2 over a flat index); replaced or deleted rows are hidden.
+# Every change is first appended to CHANGELOG_PATH, so other processes and
+# later loads see it too.  A reload builds a new _Overlay next to the one in
+# use and swaps the reference, so searches never wait for it: each search
+# reads ``st.overlay`` once and works on that snapshot.  A full build
+# (``--build``) re-encodes everything; the log still applies on top.
+
+class _Overlay:
+    """Entities added or removed after the artifact build (never mutated once published)."""
+
+    def __init__(self, st: _IndexState) -> None:
+        self.n_base = len(st.entity_ids)
+        self._base = st
+        self.docs: List[Dict[str, Any]] = []
+        self.texts: List[str] = []
+        self.ids: List[Any] = []
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(st.entity_index.d))
+        self.gazetteer = Gazetteer.build([], [])
+        self.hidden: frozenset = frozenset()  # row ids that must not be returned
+        self.n_hidden_base = 0
+        self.rows_by_id: Dict[Any, List[int]] = {}  # overlay rows per entity id
+        self.log_offset = 0  # bytes of CHANGELOG_PATH applied
+
+    def entity_id(self, row: int) -> Any:
+        return self._base.entity_ids[row] if row < self.n_base else self.ids[row - self.n_base]
+
+    def entity_text(self, row: int) -> str:
+        return self._base.entity_texts[row] if row < self.n_base else self.texts[row - self.n_base]
+
+
+def _apply_changes(st: _IndexState, old: _Overlay, changes: List[Dict[str, Any]], offset: int) -> _Overlay:
+    """New overlay with ``changes`` (change-log records) applied to ``old``."""
+    ov = copy.copy(old)
+    ov.docs, ov.texts, ov.ids = list(old.docs), list(old.texts), list(old.ids)
+    ov.rows_by_id = dict(old.rows_by_id)
+    ov.index = faiss.clone_index(old.index)
+    hidden = set(old.hidden)
+
+    added_rows: List[int] = []
+    vectors: List[Optional[np.ndarray]] = []
+    for change in changes:
+        entity = change.get("entity") or {}
+        entity_id = change["id"] if change["op"] == "delete" else entity["id"]
+        hidden.update(st.base_rows(entity_id))
+        hidden.update(ov.rows_by_id.pop(entity_id, []))
+        if change["op"] != "upsert":
+            continue
+        row = ov.n_base + len(ov.ids)
+        ov.docs.append(entity)
+        ov.texts.append(change.get("text") or entity_text(entity))
+        ov.ids.append(entity_id)
+        ov.rows_by_id[entity_id] = [row]
+        added_rows.append(row)
+        vector = None
+        if change.get("model") == MODEL_NAME and change.get("vector"):
+            vector = np.frombuffer(base64.b64decode(change["vector"]), dtype="<f4")
+        vectors.append(vector)
+
+    # Re-encode records written with another model (or without a vector)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = _encoder().encode([ov.texts[added_rows[i] - ov.n_base] for i in missing], normalize_embeddings=True)
+        for i, vector in zip(missing, encoded):
+            vectors[i] = np.asarray(vector, dtype=np.float32)
+    if added_rows:
+        ov.index.add_with_ids(np.vstack(vectors).astype(np.float32), np.asarray(added_rows, dtype=np.int64))
+
+    dead_overlay = [row for row in hidden if row >= ov.n_base]
+    if dead_overlay:
+        ov.index.remove_ids(np.asarray(dead_overlay, dtype=np.int64))
+    ov.hidden = frozenset(hidden)
+    ov.n_hidden_base = sum(1 for row in hidden if row < ov.n_base)
+    ov.gazetteer = Gazetteer.build([d.get("label") for d in ov.docs], [])
+    ov.log_offset = offset
+    return ov
+
+
+_reload_lock = threading.Lock()
+_last_check = 0.0
+
+
+def _read_changes(offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Complete change-log records after byte ``offset`` and the new offset."""
+    if not CHANGELOG_PATH.exists():
+        return [], offset
+    with CHANGELOG_PATH.open("rb") as fp:
+        fp.seek(offset)
+        data = fp.read()
+    end = data.rfind(b"\n") + 1  # a writer may be mid-line
+    changes = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return changes, offset + end
+
+
+def _reload_changes(st: _IndexState) -> bool:
+    """Apply change-log records not yet in ``st.overlay``; True if anything changed."""
+    with _reload_lock:
+        ov = st.overlay
+        size = CHANGELOG_PATH.stat().st_size if CHANGELOG_PATH.exists() else 0
+        if size < ov.log_offset:
+            ov = _Overlay(st)  # log was truncated or replaced; start over
+        changes, offset = _read_changes(ov.log_offset)
+        if not changes and ov is st.overlay:
+            return False
+        st.overlay = _apply_changes(st, ov, changes, offset)
+        logger.info("Applied %d entity changes (overlay: %d rows)", len(changes), len(st.overlay.ids))
+        return True
+
+
+def _maybe_reload(st: _IndexState) -> None:
+    # Cheap enough for every get_state(): one stat() per RELOAD_INTERVAL.
+    # The reload itself runs in the background; callers keep the current
+    # overlay until the new one is swapped in.
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < RELOAD_INTERVAL:
+        return
+    _last_check = now
+    try:
+        size = CHANGELOG_PATH.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    if size != st.overlay.log_offset and not _reload_lock.locked():
+        threading.Thread(target=_reload_changes, args=(st,), name="retriever-reload", daemon=True).start()
 
-prop_texts: List[str] = [v for v in properties.values()]  # No "(P84)"
-prop_ids: List[str] = list(properties.keys())
 
-prop_embeddings = model.encode(prop_texts, normalize_embeddings=True)
-prop_index = faiss.IndexFlatIP(prop_embeddings.shape[1])
-prop_index.add(np.asarray(prop_embeddings, dtype=np.float32))
+def _append_changes(changes: List[Dict[str, Any]]) -> None:
+    ts = time.time()
+    lines = "".join(json.dumps(dict(change, ts=ts), ensure_ascii=False) + "\n" for change in changes)
+    CHANGELOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with CHANGELOG_PATH.open("a", encoding="utf-8") as fp:
+        fp.write(lines)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def upsert_entities(records: Sequence[Dict[str, Any]]) -> int:
+    """Add or replace entities without a rebuild; returns how many were applied.
+
+    ``records`` use any format :func:`ingest.normalize_record` accepts (the
+    bundled JSON layout or Wikidata dump entities).  An entity whose id is
+    already indexed replaces every earlier version.
+    """
+    entities = [e for e in (normalize_record(r, DUMP_LANGUAGE) for r in records) if e and e["id"]]
+    if not entities:
+        return 0
+    texts = [entity_text(e) for e in entities]
+    vectors = np.asarray(_encoder().encode(texts, normalize_embeddings=True), dtype="<f4")
+    _append_changes([
+        {"op": "upsert", "entity": e, "text": t, "model": MODEL_NAME,
+         "vector": base64.b64encode(v.tobytes()).decode("ascii")}
+        for e, t, v in zip(entities, texts, vectors)
+    ])
+    _reload_changes(get_state())
+    return len(entities)
+
+
+def delete_entities(entity_ids: Sequence[Any]) -> int:
+    """Remove entities by id (e.g. QIDs) without a rebuild."""
+    if not entity_ids:
+        return 0
+    _append_changes([{"op": "delete", "id": eid} for eid in entity_ids])
+    _reload_changes(get_state())
+    return len(entity_ids)
+
+
+def reload_changes() -> bool:
+    """Hot-reload hook: apply new change-log records now instead of on the next check."""
+    return _reload_changes(get_state())
+
 
 ###########################################################################
 # Public API                                                              #
 ###########################################################################
 
+def encode_queries(queries: Sequence[str], *, batch_size: int = 64) -> np.ndarray:
+    """Normalised float32 query embeddings, one ``encode`` call for all queries.
+
+    Goes through the shared embedding cache, so only texts that were not
+    embedded before reach the model.
+    """
+    with span("embedding", texts=len(queries)):
+        return get_embedding_cache().encode(_encoder(), MODEL_NAME, queries, batch_size=batch_size)
+
+
+def _merge_hits(
+    st: _IndexState,
+    ov: _Overlay,
+    query: str,
+    ent_scores: np.ndarray,
+    ent_idx: np.ndarray,
+    prop_scores: np.ndarray,
+    prop_idx: np.ndarray,
+    prop_threshold: float,
+    ent_threshold: float,
+) -> Tuple[List[Any], List[str]]:
+    """Thresholded FAISS hits for one query, followed by its label matches."""
+    entity_hits = [ov.entity_id(i) for score, i in zip(ent_scores, ent_idx) if i >= 0 and score >= ent_threshold]
+    prop_hits = [st.prop_ids[i] for score, i in zip(prop_scores, prop_idx) if i >= 0 and score >= prop_threshold]
+
+    # Whole-word label matches for entities, substring matches for
+    # properties, both found in one pass over the lower-cased query.
+    with span("lexical_match") as sp:
+        ent_pos, prop_pos = st.gazetteer.match(query.lower())
+        if ov.docs:
+            ent_pos = ent_pos + [ov.n_base + i for i in ov.gazetteer.match(query.lower())[0]]
+        if ov.hidden:
+            ent_pos = [i for i in ent_pos if i not in ov.hidden]
+        sp.set("entity_matches", len(ent_pos))
+        sp.set("prop_matches", len(prop_pos))
+
+    for i in ent_pos:
+        if ov.entity_id(i) not in entity_hits:
+            entity_hits.append(ov.entity_id(i))
+    for i in prop_pos:
+        if st.prop_ids[i] not in prop_hits:
+            prop_hits.append(st.prop_ids[i])
+
+    return entity_hits, prop_hits
+
+
 def retrieve_offline_ids(
     query: str,
     *,
@@ -112,31 +723,59 @@ def retrieve_offline_ids(
     ent_threshold: float = 0.6
 ) -> Tuple[List[Any], List[str]]:
     """Return the *ids* of the most similar entities and properties."""
-    query_emb = model.encode([query], normalize_embeddings=True)
+    st = get_state()
+    ov = st.overlay
+    query_emb = encode_queries([query])
+
+    with span("faiss_search", queries=1, index=st.entity_index_config["type"]):
+        ent_scores, ent_idx = _search_entities(st, ov, query_emb, topk_entity)
+        prop_scores, prop_idx = st.prop_index.search(query_emb, topk_prop)
+    if logger.isEnabledFor(logging.DEBUG):
+        for score, i in zip(ent_scores[0], ent_idx[0]):
+            logger.debug("entity %s: %.3f", ov.entity_text(i), score)
+        for score, i in zip(prop_scores[0], prop_idx[0]):
+            logger.debug("property %s: %.3f", st.properties[st.prop_ids[i]], score)
 
-    # Entity search
-    ent_scores, ent_idx = entity_index.search(query_emb, topk_entity)
-    entity_hits = [entity_ids[i] for score, i in zip(ent_scores[0],ent_idx[0]) if score>=ent_threshold]
-    for score, i in zip(ent_scores[0], ent_idx[0]):
-        print(f"{entity_texts[i]}: {score:.3f}")
+    return _merge_hits(
+        st, ov, query, ent_scores[0], ent_idx[0], prop_scores[0], prop_idx[0],
+        prop_threshold, ent_threshold,
+    )
 
-    query_lower = query.lower()
 
+def retrieve_offline_ids_batch(
+    queries: Sequence[str],
+    *,
+    embeddings: Optional[np.ndarray] = None,
+    batch_size: int = 64,
+    topk_entity: int = 3,
+    topk_prop: int = 5,
+    prop_threshold: float = 0.2,
+    ent_threshold: float = 0.6
+) -> List[Tuple[List[Any], List[str]]]:
+    """Batch version of :func:`retrieve_offline_ids`, same result per query.
 
-    for e in entity_docs:
-     if re.search(r'\b' + re.escape(e["label"].lower()) + r'\b', query_lower) and e["id"] not in entity_hits:
-        entity_hits.append(e["id"])
-    # Property search
-    prop_scores, prop_idx = prop_index.search(query_emb, topk_prop)
-    prop_hits = [prop_ids[i] for score, i in zip(prop_scores[0], prop_idx[0])if score>=prop_threshold]
-    for score, i in zip(prop_scores[0], prop_idx[0]):
-        print(f"{properties[prop_ids[i]]}: {score:.3f}")
+    All queries are encoded in one call (``batch_size`` per forward pass) and
+    each index is searched once with the whole query matrix.  Pass
+    ``embeddings`` (from :func:`encode_queries`) to reuse vectors already
+    computed by the caller.
+    """
+    if not queries:
+        return []
+    st = get_state()
+    ov = st.overlay
+    query_emb = encode_queries(queries, batch_size=batch_size) if embeddings is None else embeddings
 
-    for i, label in enumerate(prop_texts):
-        if label.lower() in query_lower and prop_ids[i] not in prop_hits:
-            prop_hits.append(prop_ids[i])
+    with span("faiss_search", queries=len(queries), index=st.entity_index_config["type"]):
+        ent_scores, ent_idx = _search_entities(st, ov, query_emb, topk_entity)
+        prop_scores, prop_idx = st.prop_index.search(query_emb, topk_prop)
 
-    return entity_hits, prop_hits
+    return [
+        _merge_hits(
+            st, ov, query, ent_scores[row], ent_idx[row], prop_scores[row], prop_idx[row],
+            prop_threshold, ent_threshold,
+        )
+        for row, query in enumerate(queries)
+    ]
 
 
 ###########################################################################
@@ -144,7 +783,25 @@ def retrieve_offline_ids(
 ###########################################################################
 
 if __name__ == "__main__":
-    print("Loaded", len(entity_docs), "entities and", len(prop_ids), "properties.")
+    parser = argparse.ArgumentParser(description="Offline entity/property retriever")
+    parser.add_argument("--build", action="store_true", help="(re)build the index artifacts and exit")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the hash is unchanged")
+    parser.add_argument("--upsert", type=Path, metavar="FILE",
+                        help="add/replace the entities in FILE (any format ingest reads) and exit")
+    parser.add_argument("--delete", nargs="+", metavar="ID", help="remove entities by id and exit")
+    args = parser.parse_args()
+    if args.build:
+        print("Artifacts at", build_artifacts(force=args.force))
+        raise SystemExit(0)
+    if args.upsert or args.delete:
+        if args.upsert:
+            print("Upserted", upsert_entities(list(iter_raw_records(args.upsert))), "entities")
+        if args.delete:
+            print("Deleted", delete_entities(args.delete), "entities")
+        raise SystemExit(0)
+
+    st = get_state()
+    print("Loaded", len(st.entity_docs), "entities and", len(st.prop_ids), "properties.")
     while True:
         try:
             q = input("\nQuery (blank to exit): ").strip()
@@ -1,30 +1,41 @@
 # ------------------------ Imports and Environment Setup ------------------------
 
 # Import custom prompt templates
-from .prompt_template import SYSTEM_PROMPT, USER_TEMPLATE
+from .prompt_template import (
+    RDFS_PREFIX, RDFS_SUFFIX_TEMPLATE, SYSTEM_PROMPT, USER_PREFIX, USER_SUFFIX_TEMPLATE,
+)
 
 # External libraries
-import google.generativeai as genai
+import llm_gateway
+from captureSparql import split_answer
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import json
-import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import re
-from difflib import get_close_matches
-from .jsonfiles.retriever import retrieve_offline_ids
+from .jsonfiles.retriever import MODEL_NAME, encode_queries, retrieve_offline_ids, retrieve_offline_ids_batch
+from .model_registry import get_encoder
+from .embedding_cache import get_embedding_cache
+from .answer_cache import ENABLED as ANSWER_CACHE_ENABLED, get_answer_cache
+from .history import format_history as _format_history
+from .pipeline import PipelineRun
+from extraction_cache import cached_extraction, parse_term_list
+from tracing import current_span, span
 
 # Optional CUDA settings for performance (currently forcing CPU usage)
 os.environ['CUDA_VISIBLE_DEVICES'] = ''
 os.environ['TORCH_USE_CUDA_DSA'] = '1'
 # ------------------------ Configuration and Model Loading ------------------------
 
-# Load API key from .env file
+# Load API key from .env file (read by the LLM gateway)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+GEMINI_MODEL = "gemini-2.5-pro"
+
+logger = logging.getLogger(__name__)
 
 # Load example question-answer pairs for few-shot prompting
 with open(os.path.join(script_dir, '..', 'examples', 'examples.json'), 'r', encoding='utf-8') as f:
@@ -35,27 +46,101 @@ with open(os.path.join(script_dir, '..', 'examples', 'examples_rdfs.json'), 'r',
     EXAMPLES_RDFS = json.load(f)
 
 
+def render_example(ex):
+    return (
+        f"Question: {ex['question']}\n"
+        f"ReasoningStyle: {ex.get('reasoning_style', 'Chain of Thought')}\n"
+        f"Thought: {ex['thought']}\n"
+        f"SPARQL:\n{ex['sparql']}\n\n"
+    )
+
+
+# Example blocks are rendered once; retrieval returns the example dicts
+# themselves, so they are looked up by identity
+_EXAMPLE_BLOCKS = {id(ex): render_example(ex) for ex in EXAMPLES + EXAMPLES_RDFS}
 
 
+def render_examples(examples):
+    return "".join(_EXAMPLE_BLOCKS.get(id(ex)) or render_example(ex) for ex in examples)
 
 
-# Load sentence embedding model for semantic similarity
-EMBEDDER = SentenceTransformer("all-MiniLM-L6-v2", device='cpu')
 
 
 
-# Precompute example embeddings for fast retrieval
-EXAMPLE_QUESTIONS = [ex["question"] for ex in EXAMPLES]
-EXAMPLE_EMBEDDINGS = EMBEDDER.encode(EXAMPLE_QUESTIONS, normalize_embeddings=True)
 
+# Sentence embedding model for semantic similarity (shared with the retriever)
+EMBEDDER_MODEL = MODEL_NAME
+
+# Example embeddings are computed on first use, not at import time
+EXAMPLE_QUESTIONS = [ex["question"] for ex in EXAMPLES]
 EXAMPLE_RDFS_QUESTIONS = [ex["question"] for ex in EXAMPLES_RDFS]
-EXAMPLE_RDFS_EMBEDDINGS = EMBEDDER.encode(EXAMPLE_RDFS_QUESTIONS, normalize_embeddings=True)
+
+_example_embeddings = {}
+_example_lock = threading.Lock()
+
+
+def _embedder():
+    return get_encoder(EMBEDDER_MODEL, device='cpu')
+
+
+def get_example_embeddings(kind="sparql"):
+    """Normalised embeddings of the example questions ("sparql" or "rdfs")."""
+    emb = _example_embeddings.get(kind)
+    if emb is None:
+        with _example_lock:
+            emb = _example_embeddings.get(kind)
+            if emb is None:
+                questions = EXAMPLE_RDFS_QUESTIONS if kind == "rdfs" else EXAMPLE_QUESTIONS
+                emb = _embedder().encode(questions, normalize_embeddings=True)
+                _example_embeddings[kind] = emb
+    return emb
+
+
+def warmup():
+    """Load the encoder, retriever indexes and example embeddings up front."""
+    from .jsonfiles import retriever
+    retriever.warmup()
+    get_example_embeddings("sparql")
+    get_example_embeddings("rdfs")
+
+
+def embedding_cache_stats():
+    """Hit/miss counters of the query-embedding cache shared with the retriever."""
+    return get_embedding_cache().stats()
+
+
+def answer_cache_stats():
+    """Hit rate and latency saved by the semantic answer cache."""
+    return get_answer_cache().stats()
+
+
+def __getattr__(name):
+    # Backwards-compatible access to the formerly eager module globals
+    if name == "EMBEDDER":
+        return _embedder()
+    if name == "EXAMPLE_EMBEDDINGS":
+        return get_example_embeddings("sparql")
+    if name == "EXAMPLE_RDFS_EMBEDDINGS":
+        return get_example_embeddings("rdfs")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ------------------------ Utility Functions ------------------------
 
     
-# Extract named entities using spaCy (or fallback regex)
+# Bump when the extraction prompt below changes (part of the cache key)
+CONCEPT_PROMPT_VERSION = 1
+
+
+# Extract the concepts of a question with Gemini.  Replies are memoised in
+# the shared extraction cache, so the RDFS retry of a question reuses them.
 def convert_query_to_wikidata_search(output):
+    try:
+        return cached_extraction("rag", GEMINI_MODEL, CONCEPT_PROMPT_VERSION, output, _extract_concepts)
+    except Exception:
+        return []
+
+
+def _extract_concepts(output):
     prompt = f"""
 Your job is to extract only the **semantic concepts** from the user's natural language query that should be searched on Wikidata to build a SPARQL query.
 
@@ -82,30 +167,31 @@ And also try always to remove plural (albums -> album | dogs -> dog). You just n
 some product (album named Pictures for example)
 
 """
-    model = genai.GenerativeModel(
-    model_name="gemini-2.5-pro",
-        system_instruction=SYSTEM_PROMPT
-    )
-    response = model.generate_content(prompt, generation_config={"temperature": 0.2})
+    text = llm_gateway.complete("gemini", prompt, model=GEMINI_MODEL, system=SYSTEM_PROMPT,
+                                temperature=0.2, purpose="concept_extraction")
+    logger.debug("Concept extraction reply: %s", text)
+    return parse_term_list(text)
 
-    try:
-        print(response.text)
-        result = eval(response.text)
-        return result
-    except Exception:
-        return []
 
-
-# Use matcher and fallback to generate ID hints for prompting
-def get_id_hints(user_question):
+# Use matcher and fallback to generate ID hints for prompting.  The hits of
+# the question itself (pass them as `question_hits` when they were retrieved
+# concurrently with the extraction call) come first, then those of the
+# extracted candidate terms.
+def get_id_hints(user_question, candidates=None, question_hits=None):
 
     hints = []
 
-    candidates = convert_query_to_wikidata_search(user_question)
-    candidate_text =  " ".join(candidates)
-    candidate_terms = " ".join(c['term'] for c in candidates)
-
-    entity_ids,prop_ids = retrieve_offline_ids(user_question+ " " + candidate_text)
+    if candidates is None:
+        candidates = convert_query_to_wikidata_search(user_question)
+    candidate_terms = " ".join(c['term'] if isinstance(c, dict) else str(c) for c in candidates)
+
+    if question_hits is None:
+        question_hits = retrieve_offline_ids(user_question)
+    entity_ids, prop_ids = list(question_hits[0]), list(question_hits[1])
+    if candidate_terms:
+        candidate_entities, candidate_props = retrieve_offline_ids(candidate_terms)
+        entity_ids += [eid for eid in candidate_entities if eid not in entity_ids]
+        prop_ids += [pid for pid in candidate_props if pid not in prop_ids]
     for eid in entity_ids:
         hints.append(f"(entity:{eid})")
     for pid in prop_ids:
@@ -117,123 +203,314 @@ def get_id_hints(user_question):
 
 
 # Retrieve similar example questions from precomputed embeddings
+def _top_examples(query_embs, kind, top_k):
+    examples = EXAMPLES_RDFS if kind == "rdfs" else EXAMPLES
+    # Both sides are L2-normalised, so the dot product is the cosine similarity
+    scores = query_embs @ get_example_embeddings(kind).T
+    top = np.argsort(scores, axis=1)[:, -top_k:][:, ::-1]
+    return [[examples[i] for i in row] for row in top]
+
+
 def retrieve_examples(query, top_k=3):
-    query_emb = EMBEDDER.encode([query], normalize_embeddings=True)
-    scores = cosine_similarity(query_emb, EXAMPLE_EMBEDDINGS)[0]
-    top_indices = np.argsort(scores)[-top_k:][::-1]
-    return [EXAMPLES[i] for i in top_indices]
+    return _top_examples(encode_queries([query]), "sparql", top_k)[0]
 
 
 def retrieve_examples_rdfs(query, top_k=3):
-    query_emb = EMBEDDER.encode([query], normalize_embeddings=True)
-    scores = cosine_similarity(query_emb, EXAMPLE_RDFS_EMBEDDINGS)[0]
-    top_indices = np.argsort(scores)[-top_k:][::-1]
-    return [EXAMPLES_RDFS[i] for i in top_indices]
+    return _top_examples(encode_queries([query]), "rdfs", top_k)[0]
+
+
+# Batch variants: one encode call and one similarity product for all queries
+def retrieve_examples_batch(queries, top_k=3, batch_size=64):
+    if not queries:
+        return []
+    return _top_examples(encode_queries(queries, batch_size=batch_size), "sparql", top_k)
+
+
+def retrieve_examples_rdfs_batch(queries, top_k=3, batch_size=64):
+    if not queries:
+        return []
+    return _top_examples(encode_queries(queries, batch_size=batch_size), "rdfs", top_k)
+
+
+def retrieve_context_batch(questions, top_k=3, batch_size=64, rdfs=False):
+    """Entity hits, property hits and examples for many questions at once.
+
+    The questions are embedded once and that matrix drives the entity,
+    property and example searches. Used for replaying evaluation sets and
+    pre-warming caches; returns one dict per question.
+    """
+    if not questions:
+        return []
+    embs = encode_queries(questions, batch_size=batch_size)
+    hits = retrieve_offline_ids_batch(questions, embeddings=embs)
+    examples = _top_examples(embs, "rdfs" if rdfs else "sparql", top_k)
+    return [
+        {"question": q, "entities": ents, "properties": props, "examples": exs}
+        for q, (ents, props), exs in zip(questions, hits, examples)
+    ]
+
+
+# Conversation block of the prompts, within NL2SPARQL_HISTORY_TOKENS;
+# older answers are reduced to their SPARQL
+def format_history(dialog_history):
+    return _format_history(dialog_history, llm_gateway.estimate_tokens,
+                           lambda answer: split_answer(answer)[1])
+
+
+class Prompt(str):
+    """Prompt text that knows its stable prefix (static instructions).
+
+    It is ``prefix + suffix`` as a string; the generation calls pass the
+    prefix separately so providers can cache it.
+    """
+
+    def __new__(cls, prefix, suffix):
+        obj = super().__new__(cls, prefix + suffix)
+        obj.prefix = prefix
+        obj.suffix = suffix
+        return obj
+
 
 # Build the prompt given user query, examples, history, and entity hints
 def build_prompt(user_question, examples, dialog_history, hints):
-    example_text = "".join([
-        f"Question: {ex['question']}\n"
-        f"ReasoningStyle: {ex.get('reasoning_style', 'Chain of Thought')}\n"
-        f"Thought: {ex['thought']}\n"
-        f"SPARQL:\n{ex['sparql']}\n\n"
-        for ex in examples
-    ])
-
-    # Format the dialogue history
-    history_lines = [f"{msg['role'].capitalize()}: {msg['content']}" for msg in dialog_history]
-    formatted_history = "\n".join(history_lines)
+    # Recent turns verbatim, older ones as question + SPARQL, within the token budget
+    formatted_history = format_history(dialog_history)
 
     user_augmented = f"{user_question}\n{hints}" if hints else user_question
 
-    # Fill the user prompt using a template
-    return USER_TEMPLATE.format(
-        examples_block=example_text,
+    # Static instructions first, then the per-request part
+    return Prompt(USER_PREFIX, USER_SUFFIX_TEMPLATE.format(
+        examples_block=render_examples(examples),
         dialog_history=formatted_history,
         user_question=user_augmented,
-    )
-
-# Get the final LLM-generated SPARQL using Gemini and prompt
-def get_llm_response(user_question, dialog_history):
-    hints,found_entities,candidate_terms = get_id_hints(user_question)
-    print(hints)
-    print(f"The hints that I've gathered are {hints}")
+    ))
+
+# Build the full generation prompt for a question (hints, examples, history).
+# The concept-extraction LLM call runs concurrently with the question-only
+# stages (entity and example retrieval for the question itself); the
+# candidate-term hits are merged in once the extraction returns.  Pass a
+# dict as `timings` to receive per-stage wall times.
+def prepare_prompt(user_question, dialog_history, timings=None):
+    run = PipelineRun(timings)
+    extraction = run.submit("concept_extraction", convert_query_to_wikidata_search, user_question)
+    question_hits = run.submit("entity_retrieval", retrieve_offline_ids, user_question)
+    examples = run.submit("example_retrieval", retrieve_examples, user_question)
+
+    candidates = extraction.result()
+    question_hits = question_hits.result()
+
+    with run.stage("candidate_retrieval"):
+        hints,found_entities,candidate_terms = get_id_hints(user_question, candidates, question_hits)
+    logger.debug("ID hints: %s", hints)
 
     #if not found_entities:
         #return "__NO_ENTITY_FOUND__"
 
-    retrieved = retrieve_examples(user_question + " " + hints)
-    final_prompt = build_prompt(user_question, retrieved, dialog_history, hints)
+    retrieved = examples.result()
+    with run.stage("prompt_build"):
+        prompt = build_prompt(user_question, retrieved, dialog_history, hints)
+        current_span().set("prompt_chars", len(prompt))
+        current_span().set("prompt_tokens", llm_gateway.estimate_tokens(prompt))
+    run.finish()
+    return prompt
 
-    model = genai.GenerativeModel(
-    model_name="gemini-2.5-pro",
-        system_instruction=SYSTEM_PROMPT
-    )
 
-    response = model.generate_content(final_prompt, generation_config={"temperature": 0.2})
+# Gemini calls go through the shared LLM gateway (pooled client, concurrency
+# and tokens-per-minute limits, retries with backoff, llm_call spans).  The
+# static prefix of a Prompt is passed separately so it can be cached.
+def _split_prompt(prompt):
+    if isinstance(prompt, Prompt):
+        return prompt.prefix, prompt.suffix
+    return "", prompt
+
+
+def _generate(prompt):
+    prefix, text = _split_prompt(prompt)
+    return llm_gateway.complete("gemini", text, prefix=prefix, model=GEMINI_MODEL, system=SYSTEM_PROMPT,
+                                temperature=0.2, purpose="generation")
+
+
+# Async variant for the HTTP API: the event loop is not blocked while waiting
+async def agenerate(prompt):
+    prefix, text = _split_prompt(prompt)
+    return await llm_gateway.acomplete("gemini", text, prefix=prefix, model=GEMINI_MODEL,
+                                       system=SYSTEM_PROMPT, temperature=0.2, purpose="generation")
 
-    return response.text
 
+# Yield the text of a streamed Gemini response as the chunks arrive
+def _stream_text(prompt):
+    prefix, text = _split_prompt(prompt)
+    return llm_gateway.stream("gemini", text, prefix=prefix, model=GEMINI_MODEL, system=SYSTEM_PROMPT,
+                              temperature=0.2, purpose="generation")
 
-def build_prompt_rdfs(user_question, examples, dialog_history, candidates):
-    example_text = "".join([
-        f"Question: {ex['question']}\n"
-        f"ReasoningStyle: {ex.get('reasoning_style', 'Chain of Thought')}\n"
-        f"Thought: {ex['thought']}\n"
-        f"SPARQL:\n{ex['sparql']}\n\n"
-        for ex in examples
-    ])
 
-    history_lines = [f"{msg['role'].capitalize()}: {msg['content']}" for msg in dialog_history]
-    formatted_history = "\n".join(history_lines)
+# ------------------------ Semantic answer cache ------------------------
+
+# Only RAG answers are cached: the key uses the RAG retriever's entities, and
+# probing would load its encoder and indexes for the search backend too.
+CACHED_BACKENDS = ("rag",)
+
+
+_NOT_PROBED = object()
+
+
+class CacheProbe:
+    """What the answer cache is keyed on for one question.
+
+    The question embedding and the entities the offline retriever resolves
+    the question to, plus the seconds it took to compute them.  Compute it
+    once per request (:func:`probe_answer_cache`) and pass it to both
+    :func:`lookup_cached_answer` and :func:`remember_answer`.
+    """
+
+    __slots__ = ("embedding", "entity_ids", "cost_s")
+
+    def __init__(self, embedding, entity_ids, cost_s=0.0):
+        self.embedding = embedding
+        self.entity_ids = entity_ids
+        self.cost_s = cost_s
+
+
+def probe_answer_cache(user_question, dialog_history=(), backend="rag"):
+    """The CacheProbe of a question, or None if its answer is not cached.
+
+    That is the case when the cache is off, for backends other than
+    CACHED_BACKENDS, and for a follow-up without entities of its own (its
+    answer depends on the earlier turns, not just on its wording).
+    """
+    if not ANSWER_CACHE_ENABLED or backend not in CACHED_BACKENDS:
+        return None
+    t0 = time.perf_counter()
+    entity_ids, _ = retrieve_offline_ids(user_question)
+    if dialog_history and not entity_ids:
+        return None
+    return CacheProbe(encode_queries([user_question])[0], entity_ids, time.perf_counter() - t0)
 
-    user_augmented = f"{user_question}\n{candidates}" if candidates else user_question
 
-    return f"""You are a SPARQL expert.
+def lookup_cached_answer(user_question, dialog_history=(), backend="rag", probe=_NOT_PROBED):
+    """Cached translation of a near-identical earlier question, or None.
 
-Task:
-- Translate the natural-language question to SPARQL.
-- Use rdfs:label look-ups (e.g., ?x rdfs:label "Albert Einstein"@en).
-- Always add SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }} for readable labels.
-- Use the correct properties (like wdt:P31) and known constants (like wd:Q5).
-- Never guess IDs — use only rdfs:label matches or provided hints.
+    ``dialog_history`` is the conversation *before* this question.
+    """
+    if not ANSWER_CACHE_ENABLED or backend not in CACHED_BACKENDS:
+        return None
+    t0 = time.perf_counter()
+    with span("answer_cache", backend=backend) as sp:
+        if probe is _NOT_PROBED:
+            probe = probe_answer_cache(user_question, dialog_history, backend)
+        if probe is None:
+            sp.set("skipped", True)
+            return None
+        hit = get_answer_cache().lookup(probe.embedding, probe.entity_ids, backend,
+                                        overhead_s=probe.cost_s + time.perf_counter() - t0)
+        if hit is not None:
+            sp.set("similarity", hit.similarity)
+            logger.info("Answer cache hit for %r (%.3f similar to %r)",
+                        user_question, hit.similarity, hit.question)
+    return hit
 
-Use the following examples to guide your approach:
 
-{example_text}
+def remember_answer(user_question, dialog_history, answer, cost_s, backend="rag", sparql=None, result=None,
+                    probe=_NOT_PROBED):
+    """Store a fresh translation; returns its cache key, or None if it was not cached.
 
-Conversation so far:
-{formatted_history}
+    Pass the ``probe`` of the lookup so the question is not embedded and
+    retrieved again.
+    """
+    if probe is _NOT_PROBED:
+        probe = probe_answer_cache(user_question, dialog_history, backend)
+    if probe is None or not ANSWER_CACHE_ENABLED or backend not in CACHED_BACKENDS:
+        return None
+    entry = get_answer_cache().store(user_question, probe.embedding, probe.entity_ids, backend, answer,
+                                     sparql=sparql, result=result, cost_s=cost_s)
+    return entry.key
 
-Now answer the following question using rdfs:label and no QIDs unless explicitly provided:
-Question: {user_augmented}
-Your answer should follow this structure:
-Thought: <reasoning>
-SPARQL:
-<query>"""
 
-def get_llm_response_rdfs(user_question,dialog_history):
+def remember_result(key, sparql, result, cost_s=0.0):
+    """Attach the executed query and its rows to a cached answer."""
+    if key:
+        get_answer_cache().attach_result(key, sparql, result, cost_s)
+
+
+def forget_answer(key):
+    """Drop a cached translation the user rejected (e.g. by asking for the RDFS retry)."""
+    if key:
+        get_answer_cache().invalidate(key)
+
+
+# Get the final LLM-generated SPARQL using Gemini and prompt.  Near-identical
+# earlier questions are answered from the semantic answer cache unless
+# use_cache is False.
+def get_llm_response(user_question, dialog_history, timings=None, use_cache=True):
+    probe = None
+    if use_cache:
+        probe = probe_answer_cache(user_question, dialog_history)
+        hit = lookup_cached_answer(user_question, dialog_history, probe=probe)
+        if hit is not None:
+            return hit.answer
+
+    t0 = time.perf_counter()
+    final_prompt = prepare_prompt(user_question, dialog_history, timings)
+    answer = _generate(final_prompt)
+    if probe is not None:
+        remember_answer(user_question, dialog_history, answer, time.perf_counter() - t0, probe=probe)
+    return answer
+
+
+# Streaming variant of get_llm_response: yields answer chunks as they arrive
+def stream_llm_response(user_question, dialog_history, timings=None):
+    final_prompt = prepare_prompt(user_question, dialog_history, timings)
+    yield from _stream_text(final_prompt)
+
+
+def build_prompt_rdfs(user_question, examples, dialog_history, candidates):
+    formatted_history = format_history(dialog_history)
+
+    user_augmented = f"{user_question}\n{candidates}" if candidates else user_question
+
+    return Prompt(RDFS_PREFIX, RDFS_SUFFIX_TEMPLATE.format(
+        examples_block=render_examples(examples),
+        dialog_history=formatted_history,
+        user_question=user_augmented,
+    ))
+
+def prepare_prompt_rdfs(user_question, dialog_history, timings=None):
+    run = PipelineRun(timings)
       # Step 1: Extract candidate labels from the question
-    candidates = convert_query_to_wikidata_search(user_question)
+    extraction = run.submit("concept_extraction", convert_query_to_wikidata_search, user_question)
+
+    # Step 2: Retrieve relevant examples as usual (question only, so this
+    # overlaps with the extraction call)
+    examples = run.submit("example_retrieval", retrieve_examples_rdfs, user_question)
+
+    candidates = extraction.result()
     label_hints = [f'(label:"{entry["term"]}"@en)' for entry in candidates]
     hint_text = " ".join(label_hints)
-
-    # Step 2: Retrieve relevant examples as usual
-    retrieved = retrieve_examples_rdfs(user_question)
-    print(retrieved)
+    retrieved = examples.result()
+    logger.debug("Retrieved RDFS examples: %s", [ex["question"] for ex in retrieved])
 
     # Step 3: Build the prompt with label-based hints
-    prompt = build_prompt_rdfs(user_question, retrieved, dialog_history, hint_text)
+    with run.stage("prompt_build"):
+        prompt = build_prompt_rdfs(user_question, retrieved, dialog_history, hint_text)
+        current_span().set("prompt_chars", len(prompt))
+        current_span().set("prompt_tokens", llm_gateway.estimate_tokens(prompt))
+    run.finish()
+    return prompt
+
+
+def get_llm_response_rdfs(user_question,dialog_history, timings=None):
+    prompt = prepare_prompt_rdfs(user_question, dialog_history, timings)
+
+    logger.info("RDFS retry activated with question: %s", user_question)
+    answer = _generate(prompt)
+    logger.debug("RDFS answer: %s", answer)
+    return answer
 
-    model = genai.GenerativeModel(
-    model_name="gemini-2.5-pro",
-        system_instruction=SYSTEM_PROMPT
-    )
 
-    response = model.generate_content(prompt, generation_config={"temperature": 0.2})
-    print("RDFS RETRY activated with question:", user_question)
-    print(response.text)
-    return response.text
+def stream_llm_response_rdfs(user_question, dialog_history, timings=None):
+    prompt = prepare_prompt_rdfs(user_question, dialog_history, timings)
+    logger.info("RDFS retry activated with question: %s", user_question)
+    yield from _stream_text(prompt)
 
 
 # ------------------------ Main REPL Loop ------------------------
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Tuple
+
+###########################################################################
+# Process-wide sentence-embedding model registry                          #
+###########################################################################
+
+# Every module that needs an encoder asks the registry instead of
+# constructing its own SentenceTransformer, so each (model, device) pair is
+# loaded exactly once per process, and only when it is first used.
+
+DEFAULT_MODEL: str = "all-MiniLM-L6-v2"
+DEFAULT_DEVICE: str = "cpu"
+
+_encoders: Dict[Tuple[str, str], "SentenceTransformer"] = {}
+_lock = threading.Lock()
+
+
+def get_encoder(name: str = DEFAULT_MODEL, device: str = DEFAULT_DEVICE) -> "SentenceTransformer":
+    """Return the shared encoder for *name*, loading it on first call."""
+    key = (name, device)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        with _lock:
+            encoder = _encoders.get(key)
+            if encoder is None:
+                # Imported here: sentence_transformers pulls in torch, which
+                # dominates start-up time when done at module import.
+                from sentence_transformers import SentenceTransformer
+
+                encoder = SentenceTransformer(name, device=device)
+                _encoders[key] = encoder
+    return encoder
+
+
+def loaded_encoders() -> list:
+    """Names/devices of the encoders loaded so far (for diagnostics)."""
+    return sorted(_encoders)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from tracing import span
+
+###########################################################################
+# Stage runner for the RAG pipeline                                       #
+###########################################################################
+
+# Stages that do not depend on each other (the concept-extraction LLM call
+# and the question-only retrieval work) are started on a shared thread
+# pool; the caller joins on their futures where the results are needed.
+# Every stage records its wall time, also when it ran in the background, and
+# is traced as a span of the same name.
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-stage")
+
+
+class PipelineRun:
+    """Per-request stage timings plus helpers to run stages inline or concurrently."""
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None) -> None:
+        self.timings: Dict[str, float] = {} if timings is None else timings
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def _record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time an inline stage."""
+        t0 = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self._record(name, time.perf_counter() - t0)
+
+    def submit(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        """Start a stage in the background and return its future."""
+        def timed() -> Any:
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        # Run in a copy of the caller's context so the span nests under the
+        # caller's current span
+        return _executor.submit(contextvars.copy_context().run, timed)
+
+    def finish(self) -> Dict[str, float]:
+        """Record the end-to-end time and return all timings."""
+        self._record("total", time.perf_counter() - self._start)
+        return self.timings
@@ -30,10 +30,18 @@ The physicist who developed relativity" → QID: Q937 (Albert Einstein)"""
     
 )
 
-USER_TEMPLATE = """
+# Generation prompts are a stable prefix (the static instructions before
+# the first per-request field, identical for every request, so provider-side
+# prompt/context caches can reuse it) followed by a per-request suffix
+# (examples, conversation, question).  prefix + suffix is the full prompt
+# text; keep anything that varies per request out of the prefixes.
+
+USER_PREFIX = """
 Use the following examples to help you write a correct SPARQL query:
 
-{examples_block}
+"""
+
+USER_SUFFIX_TEMPLATE = """{examples_block}
 
 
 
@@ -42,4 +50,29 @@ Conversation so far:
 
 Now answer the following question. Use only hints that were given (do not invent new ones):
 Question: {user_question}
-ReasoningStyle:"""
\ No newline at end of file
+ReasoningStyle:"""
+
+RDFS_PREFIX = """You are a SPARQL expert.
+
+Task:
+- Translate the natural-language question to SPARQL.
+- Use rdfs:label look-ups (e.g., ?x rdfs:label "Albert Einstein"@en).
+- Always add SERVICE wikibase:label { bd:serviceParam wikibase:language "en". } for readable labels.
+- Use the correct properties (like wdt:P31) and known constants (like wd:Q5).
+- Never guess IDs — use only rdfs:label matches or provided hints.
+
+Use the following examples to guide your approach:
+
+"""
+
+RDFS_SUFFIX_TEMPLATE = """{examples_block}
+
+Conversation so far:
+{dialog_history}
+
+Now answer the following question using rdfs:label and no QIDs unless explicitly provided:
+Question: {user_question}
+Your answer should follow this structure:
+Thought: <reasoning>
+SPARQL:
+<query>"""
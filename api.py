@@ -0,0 +1,264 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
+
+import requests
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+import captureSparql as cs
+import llm_gateway
+from extraction_cache import extraction_cache_stats
+import RAGModel.llmbasedbackend as lm
+import searchTool.searchtool as sa
+import tracing
+
+# ------------------------ HTTP API ------------------------
+#
+# The translator as an async service, for concurrent users and for clients
+# other than the Streamlit app (which can use it through NL2SPARQL_API_URL):
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000
+#
+#   POST   /translate      question -> answer (reasoning + SPARQL)
+#   POST   /execute        SPARQL -> result rows
+#   POST   /ask            both, using the semantic answer cache for the rows too
+#   DELETE /answers/{key}  drop a cached answer the user rejected
+#   GET    /stats          cache and LLM gateway counters
+#   GET    /health
+#
+# The encoder, FAISS indexes and example embeddings are loaded once at
+# start-up.  Blocking work (embedding, FAISS search, the search tool's HTTP
+# fan-out, SPARQL requests) runs on a bounded thread pool; the RAG
+# generation call is awaited through the LLM gateway's async entry point.
+# ``history`` is the conversation before ``question``.
+
+logger = logging.getLogger(__name__)
+
+API_WORKERS = int(os.getenv("NL2SPARQL_API_WORKERS", "8"))
+
+_pool = None
+
+
+async def run_blocking(fn, *args):
+    """Run ``fn(*args)`` on the API thread pool, inside the caller's trace."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_pool, functools.partial(ctx.run, fn, *args))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _pool
+    _pool = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+    t0 = time.perf_counter()
+    await run_blocking(lm.warmup)
+    logger.info("RAG backend loaded in %.1f s", time.perf_counter() - t0)
+    try:
+        yield
+    finally:
+        _pool.shutdown(wait=False)
+
+
+app = FastAPI(title="NL2SPARQL", lifespan=lifespan)
+
+
+# ------------------------ Schemas ------------------------
+
+class Turn(BaseModel):
+    role: str
+    content: str
+
+
+class TranslateRequest(BaseModel):
+    question: str
+    backend: Literal["rag", "rdfs", "search"] = "rag"
+    history: List[Turn] = []
+    use_cache: bool = True
+
+
+class TranslateResponse(BaseModel):
+    answer: str
+    reasoning: str
+    sparql: str
+    cached: bool = False
+    cached_question: Optional[str] = None
+    similarity: Optional[float] = None
+    cache_key: Optional[str] = None
+    timings: Dict[str, float] = {}
+
+
+class ExecuteRequest(BaseModel):
+    sparql: str
+    use_cache: bool = True
+
+
+class ExecuteResponse(BaseModel):
+    query: str
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+    cached: bool
+    latency_ms: float
+    truncated: Optional[str] = None
+
+
+class AskResponse(TranslateResponse):
+    columns: List[str] = []
+    rows: List[Dict[str, Any]] = []
+    truncated: Optional[str] = None
+    error: Optional[str] = None
+    error_detail: Optional[str] = None
+    elapsed_s: float = 0.0
+
+
+# ------------------------ Helpers ------------------------
+
+def _rows(df):
+    # Unbound variables are NaN in the frame; JSON wants null
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _clean(rows):
+    # Rows cached by the Streamlit app may still carry NaN for unbound values
+    return [{k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()} for row in rows]
+
+
+def _history(req):
+    return [{"role": t.role, "content": t.content} for t in req.history]
+
+
+def _probe_and_lookup(req, history):
+    probe = lm.probe_answer_cache(req.question, history, req.backend)
+    return probe, lm.lookup_cached_answer(req.question, history, req.backend, probe=probe)
+
+
+async def _lookup(req, history):
+    """(answer-cache probe, cached answer); the probe is None when the answer is not cached."""
+    if not req.use_cache or req.backend not in lm.CACHED_BACKENDS:
+        return None, None
+    return await run_blocking(_probe_and_lookup, req, history)
+
+
+async def _translate(req, history, timings):
+    if req.backend == "search":
+        return await run_blocking(sa.translate, req.question)
+    prepare = lm.prepare_prompt_rdfs if req.backend == "rdfs" else lm.prepare_prompt
+    prompt = await run_blocking(prepare, req.question, history, timings)
+    return await lm.agenerate(prompt)
+
+
+def _translation(answer, **extra):
+    reasoning, sparql = cs.split_answer(answer)
+    return dict(answer=answer, reasoning=reasoning, sparql=cs.clean_query(sparql), **extra)
+
+
+def _from_hit(hit):
+    return _translation(hit.answer, cached=True, cached_question=hit.question,
+                        similarity=hit.similarity, cache_key=hit.key)
+
+
+def _execute(query, use_cache):
+    df, info = cs.execute_query(query, use_cache=use_cache)
+    return {"query": query, "columns": [str(c) for c in df.columns], "rows": _rows(df),
+            "cached": info["cached"], "latency_ms": 1000 * info["latency"], "truncated": info["truncated"]}
+
+
+# ------------------------ Endpoints ------------------------
+
+@app.post("/translate", response_model=TranslateResponse)
+async def translate(req: TranslateRequest):
+    history = _history(req)
+    with tracing.span("request", backend=req.backend, endpoint="translate"):
+        probe, hit = await _lookup(req, history)
+        if hit is not None:
+            return _from_hit(hit)
+        timings = {}
+        t0 = time.perf_counter()
+        answer = await _translate(req, history, timings)
+        key = None
+        if probe is not None:
+            key = await run_blocking(
+                functools.partial(lm.remember_answer, req.question, history, answer,
+                                  time.perf_counter() - t0, req.backend, probe=probe))
+        return _translation(answer, cache_key=key, timings=timings)
+
+
+@app.post("/execute", response_model=ExecuteResponse)
+async def execute(req: ExecuteRequest):
+    query = cs.clean_query(req.sparql)
+    if not query:
+        raise HTTPException(status_code=422, detail="No SPARQL query given")
+    with tracing.span("request", endpoint="execute"):
+        try:
+            return await run_blocking(_execute, query, req.use_cache)
+        except cs.SparqlError as e:
+            raise HTTPException(status_code=502, detail={"error": str(e), "detail": e.detail})
+        except requests.RequestException as e:
+            raise HTTPException(status_code=504, detail={"error": f"SPARQL request failed: {e}"})
+
+
+@app.post("/ask", response_model=AskResponse)
+async def ask(req: TranslateRequest):
+    """Translate and execute; a cached answer is returned with its stored rows."""
+    history = _history(req)
+    t0 = time.perf_counter()
+    with tracing.span("request", backend=req.backend, endpoint="ask"):
+        probe, hit = await _lookup(req, history)
+        if hit is not None and hit.result is not None:
+            rows = _clean(hit.result)
+            return AskResponse(**_from_hit(hit), columns=list(rows[0]) if rows else [], rows=rows,
+                               elapsed_s=time.perf_counter() - t0)
+
+        timings = {}
+        if hit is not None:
+            out = _from_hit(hit)
+        else:
+            out = _translation(await _translate(req, history, timings), timings=timings)
+        if not out["sparql"]:
+            return AskResponse(**out, error="No valid SPARQL query extracted.",
+                               elapsed_s=time.perf_counter() - t0)
+        try:
+            result = await run_blocking(_execute, out["sparql"], True)
+        except cs.SparqlError as e:
+            return AskResponse(**out, error=str(e), error_detail=e.detail, elapsed_s=time.perf_counter() - t0)
+        except requests.RequestException as e:
+            return AskResponse(**out, error=f"SPARQL request failed: {e}", elapsed_s=time.perf_counter() - t0)
+
+        elapsed = time.perf_counter() - t0
+        if hit is not None:
+            await run_blocking(lm.remember_result, hit.key, out["sparql"], result["rows"],
+                               result["latency_ms"] / 1000)
+        elif probe is not None:
+            out["cache_key"] = await run_blocking(
+                functools.partial(lm.remember_answer, req.question, history, out["answer"], elapsed,
+                                  req.backend, sparql=out["sparql"], result=result["rows"], probe=probe))
+        return AskResponse(**out, columns=result["columns"], rows=result["rows"],
+                           truncated=result["truncated"], elapsed_s=elapsed)
+
+
+@app.delete("/answers/{key}")
+async def forget_answer(key: str):
+    await run_blocking(lm.forget_answer, key)
+    return {"deleted": key}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "answer_cache": lm.answer_cache_stats(),
+        "embedding_cache": lm.embedding_cache_stats(),
+        "extraction_cache": extraction_cache_stats(),
+        "sparql_cache": cs.sparql_cache_stats(),
+        "wikidata_cache": sa.wikidata_cache_stats(),
+        "llm_gateway": llm_gateway.gateway_stats(),
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
@@ -0,0 +1,323 @@
+"""Translate a file of questions to SPARQL in bulk, resumably.
+
+    python -m batch_translate questions.csv --out results.jsonl
+        [--backend rag|rdfs|search] [--concurrency 4] [--rate 1.0]
+        [--execute] [--max-rows 1000] [--format jsonl|parquet]
+        [--question-column question] [--id-column ID] [--limit N]
+
+Input is a CSV with a question column (evaluation.csv works as is) or JSON
+lines with a "question" field; rows without a question are skipped.  Every
+translated question becomes one output record:
+
+    {"id", "question", "backend", "answer", "sparql", "error", "elapsed_s",
+     "input": {<all input fields>},
+     # with --execute:
+     "columns", "rows" (at most --max-rows), "row_count", "exec_error"}
+
+The output doubles as the checkpoint.  JSONL records are appended and
+flushed one by one; Parquet output is a directory of part files written
+every --flush-every records.  Re-running the same command skips the ids
+that are already in the output (failed ones are retried unless
+--skip-failed), so an interrupted run only pays for what is left.  Ids come
+from --id-column or, by default, the row number in the input file.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------ Input ------------------------
+
+def read_questions(path, question_column="question", id_column=None):
+    """Yield ``(id, question, row)`` for every row of a CSV or JSONL file."""
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as fp:
+        if path.suffix in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in fp if line.strip())
+        else:
+            rows = csv.DictReader(fp)
+        for n, row in enumerate(rows, start=1):
+            question = (row.get(question_column) or "").strip()
+            if not question:
+                continue
+            rid = str(row[id_column]) if id_column else f"row-{n}"
+            yield rid, question, row
+
+
+# ------------------------ Output sinks ------------------------
+
+class JsonlSink:
+    """Append one JSON object per line, flushed per record."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = None
+        self._lock = threading.Lock()
+
+    def done(self):
+        """``{id: failed}`` for the records already in the file."""
+        done = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut off by an interrupted run
+                    done[record["id"]] = bool(record.get("error") or record.get("exec_error"))
+        return done
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._fp is None:
+                self._repair()
+                self._fp = self.path.open("a", encoding="utf-8")
+            self._fp.write(line + "\n")
+            self._fp.flush()
+
+    def _repair(self):
+        # Terminate a last line that an interrupted run left without newline
+        if self.path.exists() and self.path.stat().st_size:
+            with self.path.open("rb+") as fp:
+                fp.seek(-1, 2)
+                if fp.read(1) != b"\n":
+                    fp.write(b"\n")
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+
+class ParquetSink:
+    """A directory of Parquet part files, one per ``flush_every`` records.
+
+    Nested fields (input row, result rows, columns) are stored as JSON text.
+    """
+
+    NESTED = ("input", "columns", "rows")
+    # Every part has the same columns, whether or not its records failed or
+    # were executed; nested fields are JSON text
+    FIELDS = (
+        ("id", "string"), ("question", "string"), ("backend", "string"), ("answer", "string"),
+        ("sparql", "string"), ("error", "string"), ("elapsed_s", "float64"), ("input", "string"),
+        ("columns", "string"), ("rows", "string"), ("row_count", "int64"), ("exec_error", "string"),
+    )
+
+    def __init__(self, path, flush_every=50):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        import pyarrow.parquet as pq
+        done = {}
+        for part in sorted(self.path.glob("part-*.parquet")):
+            table = pq.read_table(part, columns=["id", "error", "exec_error"]).to_pydict()
+            for rid, error, exec_error in zip(table["id"], table["error"], table["exec_error"]):
+                done[rid] = bool(error or exec_error)
+        return done
+
+    def write(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        # caller holds the lock
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.FIELDS])
+        rows = []
+        for record in self._buffer:
+            row = {name: record.get(name) for name in schema.names}
+            for key in self.NESTED:
+                if record.get(key) is not None:
+                    row[key] = json.dumps(record[key], ensure_ascii=False, default=str)
+            rows.append(row)
+        n = len(list(self.path.glob("part-*.parquet")))
+        tmp = self.path / f".part-{n:05d}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), tmp)
+        tmp.rename(self.path / f"part-{n:05d}.parquet")
+        self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+
+# ------------------------ Translation ------------------------
+
+class RateLimiter:
+    """Start at most ``rate`` questions per second (0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def translator(backend, use_answer_cache=False):
+    """Function question -> LLM answer for ``backend``."""
+    if backend == "search":
+        import searchTool.searchtool as sa
+        return sa.translate
+    import RAGModel.llmbasedbackend as lm
+    lm.warmup()
+    if backend == "rdfs":
+        return lambda q: lm.get_llm_response_rdfs(q, [])
+    return lambda q: lm.get_llm_response(q, [], use_cache=use_answer_cache)
+
+
+def _json_rows(df, max_rows):
+    df = df.head(max_rows)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def translate_one(translate, backend, rid, question, row, execute=False, max_rows=1000):
+    import captureSparql as cs
+
+    record = {"id": rid, "question": question, "backend": backend, "answer": None,
+              "sparql": None, "error": None, "input": row}
+    t0 = time.perf_counter()
+    with tracing.span("request", backend=backend, batch=True):
+        try:
+            answer = translate(question)
+            record["answer"] = answer
+            record["sparql"] = cs.clean_query(cs.split_answer(answer)[1])
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        if execute and record["sparql"]:
+            record.update(columns=None, rows=None, row_count=None, exec_error=None)
+            try:
+                df, _ = cs.execute_query(record["sparql"])
+                record.update(columns=[str(c) for c in df.columns], rows=_json_rows(df, max_rows),
+                              row_count=len(df))
+            except Exception as e:
+                record["exec_error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_s"] = time.perf_counter() - t0
+    return record
+
+
+def run(items, translate, sink, *, backend, concurrency=4, rate=0.0, execute=False, max_rows=1000):
+    """Translate ``items`` (``(id, question, row)``) into ``sink``; returns counts."""
+    limiter = RateLimiter(rate)
+    counts = {"ok": 0, "failed": 0}
+    total = len(items)
+    start = time.perf_counter()
+
+    def one(item):
+        limiter.wait()
+        return translate_one(translate, backend, *item, execute=execute, max_rows=max_rows)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        queue = iter(items)
+        try:
+            # Keep only a few questions queued ahead, so an interrupt loses little
+            for item in queue:
+                pending.add(pool.submit(one, item))
+                if len(pending) >= 2 * concurrency:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(finished, sink, counts, total, start)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(finished, sink, counts, total, start)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            logger.warning("Interrupted; %d questions in flight are not saved", len(pending))
+            raise
+        finally:
+            sink.close()
+    return counts
+
+
+def _collect(finished, sink, counts, total, start):
+    for future in finished:
+        record = future.result()
+        sink.write(record)
+        failed = bool(record["error"] or record.get("exec_error"))
+        counts["failed" if failed else "ok"] += 1
+        n = counts["ok"] + counts["failed"]
+        rate = n / (time.perf_counter() - start)
+        logger.info("[%d/%d] %s %.1fs %s (%.2f q/s)", n, total, "FAILED" if failed else "ok",
+                    record["elapsed_s"], record["question"][:60], rate)
+
+
+# ------------------------ CLI ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="CSV or JSONL file with questions")
+    parser.add_argument("--out", type=Path, required=True, help="JSONL file or Parquet directory")
+    parser.add_argument("--format", choices=("jsonl", "parquet"),
+                        help="default: parquet if --out ends in .parquet, else jsonl")
+    parser.add_argument("--backend", choices=("rag", "rdfs", "search"), default="rag")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="questions started per second, 0 = unlimited")
+    parser.add_argument("--execute", action="store_true", help="run the queries and store their results")
+    parser.add_argument("--max-rows", type=int, default=1000, help="result rows kept per question")
+    parser.add_argument("--question-column", default="question")
+    parser.add_argument("--id-column", help="column with a stable id (default: row number)")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry failed ids on resume")
+    parser.add_argument("--flush-every", type=int, default=50, help="records per Parquet part file")
+    parser.add_argument("--answer-cache", action="store_true", help="use the semantic answer cache (rag)")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    fmt = args.format or ("parquet" if args.out.suffix == ".parquet" else "jsonl")
+    sink = ParquetSink(args.out, args.flush_every) if fmt == "parquet" else JsonlSink(args.out)
+
+    done = sink.done()
+    items = []
+    for rid, question, row in read_questions(args.input, args.question_column, args.id_column):
+        if rid in done and (args.skip_failed or not done[rid]):
+            continue
+        items.append((rid, question, row))
+    items = items[: args.limit]
+    logger.info("%d questions to translate (%d already in %s)", len(items), len(done), args.out)
+    if not items:
+        return
+
+    translate = translator(args.backend, args.answer_cache)
+    counts = run(items, translate, sink, backend=args.backend, concurrency=args.concurrency,
+                 rate=args.rate, execute=args.execute, max_rows=args.max_rows)
+    logger.info("Done: %d ok, %d failed -> %s", counts["ok"], counts["failed"], args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Recall vs. latency of the approximate entity index types against flat.
+
+    python -m benchmarks.ann_recall [--k 3] [--synthetic 0] [--out benchmarks/results/ann_recall.json]
+
+The bundled entity embeddings are indexed with every type in
+retriever.INDEX_TYPES (IVF at several nprobe values, HNSW at several
+efSearch values) and queried with the evaluation.csv questions.  Recall@k is
+measured against the exact top-k of the flat index; latency is per single
+query, as the pipeline issues them.  ``--synthetic N`` adds N vectors drawn
+around the corpus embeddings to see how the numbers move with corpus size.
+"""
+
+import argparse
+import csv
+import json
+import statistics
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from RAGModel.jsonfiles import retriever
+from RAGModel.model_registry import get_encoder
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "ann_recall.json"
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64)
+EF_SEARCHES = (16, 32, 64, 128, 256)
+
+
+def load_questions(path=ROOT / "evaluation.csv"):
+    with open(path, newline="", encoding="utf-8") as fp:
+        return [row["question"] for row in csv.DictReader(fp) if row.get("question")]
+
+
+def synthetic_corpus(base, n, seed=0):
+    """``n`` unit vectors scattered around randomly chosen corpus vectors."""
+    rng = np.random.default_rng(seed)
+    picks = base[rng.integers(0, len(base), n)]
+    noisy = picks + rng.normal(scale=0.5 / np.sqrt(base.shape[1]), size=picks.shape).astype(np.float32)
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+
+def recall(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / max(1, sum(int((t >= 0).sum()) for t in truth))
+
+
+def measure(index, config, corpus, queries, truth, k):
+    latencies = []
+    found = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, idx = retriever.search_index(index, config, corpus, q[None, :], k)
+        latencies.append(time.perf_counter() - t0)
+        found.append(idx[0])
+    ordered = sorted(latencies)
+    return {
+        "recall": recall(np.array(found), truth),
+        "p50_ms": 1000 * statistics.median(ordered),
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(0.99 * (len(ordered) - 1)))],
+        "mean_ms": 1000 * statistics.mean(ordered),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3, help="neighbours per query (topk_entity)")
+    parser.add_argument("--synthetic", type=int, default=0, help="extra vectors added to the corpus")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    st = retriever.get_state()
+    if st.entity_embeddings is None:  # quantised storage keeps no float32 copy
+        corpus = np.asarray(get_encoder(retriever.MODEL_NAME).encode(
+            st.entity_texts, normalize_embeddings=True), dtype=np.float32)
+    else:
+        corpus = np.ascontiguousarray(st.entity_embeddings, dtype=np.float32)
+    if args.synthetic:
+        corpus = np.vstack([corpus, synthetic_corpus(corpus, args.synthetic)])
+    queries = retriever.encode_queries(load_questions())
+
+    flat, _ = retriever.build_index(corpus, retriever.index_config("flat", "float32"))
+    _, truth = flat.search(queries, args.k)
+
+    rows = []
+    for kind in retriever.INDEX_TYPES:
+        t0 = time.perf_counter()
+        index, used = retriever.build_index(corpus, retriever.index_config(kind, "float32"))
+        build_s = time.perf_counter() - t0
+        size = len(faiss.serialize_index(index))
+        if used["type"] in ("ivf_flat", "ivf_pq"):
+            settings = [{"nprobe": n} for n in NPROBES if n <= used["nlist"]]
+        elif used["type"] == "hnsw":
+            settings = [{"ef_search": ef} for ef in EF_SEARCHES]
+        else:
+            settings = [{}]
+        for params in settings:
+            retriever.set_search_params(index, **params)
+            row = {"type": kind, "built_as": used, **params, "build_s": build_s, "index_bytes": size}
+            row.update(measure(index, used, corpus, queries, truth, args.k))
+            rows.append(row)
+            knob = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{kind:9s} {knob:14s} recall@{args.k} {row['recall']:.3f}  "
+                  f"p50 {row['p50_ms']:.3f} ms  p99 {row['p99_ms']:.3f} ms  {size / 1e6:.1f} MB")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus_size": len(corpus),
+        "queries": len(queries),
+        "k": args.k,
+        "results": rows,
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compare per-question retrieval against the batch API on evaluation.csv.
+
+    python -m benchmarks.batch_retrieval [--batch-size 64] [--repeat 3]
+
+Both paths run on the same questions after a warm-up, and the script checks
+that they return identical entity/property hits and examples.  The shared
+query-embedding cache is cleared before every cold sample, so the cold
+speedup is that of batching; warm samples run with every question cached
+(on-disk spill is turned off for the run).
+"""
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_questions(path=ROOT / "evaluation.csv"):
+    with open(path, newline="", encoding="utf-8") as fp:
+        return [row["question"] for row in csv.DictReader(fp) if row.get("question")]
+
+
+def run_loop(questions):
+    import RAGModel.llmbasedbackend as lm
+    out = []
+    for q in questions:
+        ents, props = lm.retrieve_offline_ids(q)
+        out.append({"question": q, "entities": ents, "properties": props,
+                    "examples": lm.retrieve_examples(q)})
+    return out
+
+
+def run_batch(questions, batch_size):
+    import RAGModel.llmbasedbackend as lm
+    return lm.retrieve_context_batch(questions, batch_size=batch_size)
+
+
+def timed(fn, repeat, cold):
+    from RAGModel.embedding_cache import get_embedding_cache
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            get_embedding_cache().clear()
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ["NL2SPARQL_EMBED_SPILL_DIR"] = ""
+    import RAGModel.llmbasedbackend as lm
+    questions = load_questions()
+    lm.warmup()
+
+    report = {"questions": len(questions), "batch_size": args.batch_size}
+    for mode in ("cold", "warm"):
+        loop_res, loop_s = timed(lambda: run_loop(questions), args.repeat, mode == "cold")
+        batch_res, batch_s = timed(lambda: run_batch(questions, args.batch_size), args.repeat, mode == "cold")
+        report.update({
+            f"{mode}_loop_s": round(loop_s, 4),
+            f"{mode}_batch_s": round(batch_s, 4),
+            f"{mode}_speedup": round(loop_s / batch_s, 2) if batch_s else None,
+        })
+    report["identical"] = loop_res == batch_res
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Throughput and latency of the LLM gateway under many concurrent users.
+
+    python -m benchmarks.llm_load [--users 32] [--requests 8] [--latency 0.2]
+        [--concurrency 8] [--tpm 0] [--error-rate 0.05] [--mode sync|async]
+        [--out benchmarks/results/llm_load.json]
+
+Each simulated user sends ``--requests`` prompts of about 2k tokens, one
+after the other, to a FakeProvider that answers after ``--latency`` seconds
+and fails a ``--error-rate`` share of calls with a 429 or 503.  With the
+provider's concurrency cap C and latency L, throughput should level off at
+about C / L requests per second (less when the TPM budget binds), however
+many users there are.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import llm_gateway
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "llm_load.json"
+PROMPT = "Translate this question to SPARQL. " * 230  # about 2k tokens
+
+
+def scripted_errors(n, rate, seed=0):
+    rng = random.Random(seed)
+    return [llm_gateway.FakeError(rng.choice((429, 503))) if rng.random() < rate else None
+            for _ in range(n)]
+
+
+def summary(latencies, wall, n):
+    ordered = sorted(latencies)
+    return {
+        "requests": n,
+        "wall_s": wall,
+        "throughput_rps": n / wall if wall else None,
+        "p50_ms": 1000 * statistics.median(ordered),
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(0.99 * (len(ordered) - 1)))],
+        "max_ms": 1000 * ordered[-1],
+    }
+
+
+def run_sync(users, requests):
+    def user(_):
+        out = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            llm_gateway.complete("gemini", PROMPT, model="fake", purpose="load")
+            out.append(time.perf_counter() - t0)
+        return out
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        return [s for samples in pool.map(user, range(users)) for s in samples]
+
+
+async def run_async(users, requests):
+    async def user():
+        out = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            await llm_gateway.acomplete("gemini", PROMPT, model="fake", purpose="load")
+            out.append(time.perf_counter() - t0)
+        return out
+
+    results = await asyncio.gather(*(user() for _ in range(users)))
+    return [s for samples in results for s in samples]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=8, help="requests per user")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake provider seconds per call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per minute, 0 = unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--backoff-base", type=float, default=0.05, help="seconds, overrides the gateway default")
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    n = args.users * args.requests
+    llm_gateway.BACKOFF_BASE = args.backoff_base
+    llm_gateway.register_provider(llm_gateway.FakeProvider(
+        "gemini", reply=lambda prompt, system: "SELECT ?x WHERE { ?x ?p ?o }",
+        latency=args.latency, errors=scripted_errors(n * 2, args.error_rate),
+        concurrency=args.concurrency, tpm=args.tpm,
+    ))
+
+    t0 = time.perf_counter()
+    if args.mode == "async":
+        latencies = asyncio.run(run_async(args.users, args.requests))
+    else:
+        latencies = run_sync(args.users, args.requests)
+    wall = time.perf_counter() - t0
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "expected_rps": args.concurrency / args.latency if args.latency else None,
+        "results": summary(latencies, wall, n),
+        "gateway": llm_gateway.gateway_stats()["gemini"],
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    res = report["results"]
+    print(f"{args.mode}: {n} requests, {res['throughput_rps']:.1f} req/s "
+          f"(cap {report['expected_rps'] or 0:.1f}), p50 {res['p50_ms']:.0f} ms, "
+          f"p99 {res['p99_ms']:.0f} ms, retries {report['gateway']['retries']}, "
+          f"errors {report['gateway']['errors']}")
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Check that the RAG generation prompts start with a byte-identical prefix.
+
+    python -m benchmarks.prompt_prefix [--limit 20] [--out benchmarks/results/prompt_prefix.json]
+
+Asks the evaluation questions as one conversation through both RAG prompt
+builders (plain and RDFS), with the LLM replaced by the FakeProvider from
+benchmarks/stubs.py, so the examples, history and hints differ on every
+request.  Every generation call must send one of exactly two prefixes
+(system prompt + USER_PREFIX, system prompt + RDFS_PREFIX); the script
+exits non-zero otherwise.  Also reports how much of each prompt the prefix
+covers.  Needs no network (the sentence-transformers model must be in the
+local cache).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.replay_evaluation import load_questions
+from benchmarks.stubs import FakeLLM, Recordings
+import tracing
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "prompt_prefix.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recordings", type=Path)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    os.environ.update({"NL2SPARQL_CACHE_DB": "", "HF_HUB_OFFLINE": "1", "NL2SPARQL_ANSWER_CACHE": "0"})
+    import llm_gateway
+    gemini, _ = (llm_gateway.register_provider(p) for p in FakeLLM(Recordings(args.recordings)).providers())
+    import RAGModel.llmbasedbackend as lm
+    from RAGModel.prompt_template import RDFS_PREFIX, SYSTEM_PROMPT, USER_PREFIX
+    lm.warmup()
+
+    expected = {
+        llm_gateway.prefix_digest(SYSTEM_PROMPT, USER_PREFIX): "rag",
+        llm_gateway.prefix_digest(SYSTEM_PROMPT, RDFS_PREFIX): "rdfs",
+    }
+    history = []
+    with tracing.span("prompt_prefix") as root, tracing.collect(root.trace_id) as records:
+        for item in load_questions()[: args.limit]:
+            question = item["question"]
+            history.append({"role": "user", "content": question})
+            answer = lm.get_llm_response(question, history, use_cache=False)
+            lm.get_llm_response_rdfs(question, history)
+            history.append({"role": "assistant", "content": answer})
+    shares = [r["attrs"].get("prefix_chars", 0) / r["attrs"]["prompt_chars"] for r in records
+              if r["name"] == "llm_call" and r["attrs"].get("purpose") == "generation"]
+
+    seen = dict(gemini.prefixes)
+    ok = set(seen) == set(expected)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "questions": len(history) // 2,
+        "prefixes": {expected.get(digest, digest): n for digest, n in seen.items()},
+        "byte_identical": ok,
+        "prefix_share_mean": statistics.mean(shares) if shares else None,
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"{report['questions']} questions, prefixes {report['prefixes']}, "
+          f"{'byte-identical' if ok else 'PREFIX DRIFT'}; prefix is "
+          f"{100 * (report['prefix_share_mean'] or 0):.0f}% of a prompt on average")
+    print("Wrote", args.out)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
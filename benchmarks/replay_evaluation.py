@@ -0,0 +1,297 @@
+"""Replay evaluation.csv through both backends against local stand-ins.
+
+Gemini, OpenAI, Serper, wbgetentities and the SPARQL endpoint are replaced
+by the fakes in benchmarks/stubs.py, so the run needs no network (the
+sentence-transformers model must be in the local cache).  Reports per-stage
+latency percentiles, throughput and precision/recall/F1 per hop count and
+domain as JSON:
+
+    python -m benchmarks.replay_evaluation [--recordings rec.json]
+        [--backends rag,search] [--concurrency 1] [--llm-latency 0]
+        [--http-latency 0] [--limit N] [--answer-cache] [--extraction-cache]
+        [--out benchmarks/results/replay.json]
+
+Quality is only scored for questions whose generated query has a recorded
+SPARQL result; synthetic answers measure latency, not correctness.  The
+semantic answer cache and the concept-extraction cache are off unless
+``--answer-cache`` / ``--extraction-cache`` is given, so every question
+pays for a full translation and the stage percentiles contain no cache hits.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.stubs import FakeLLM, Recordings, start_http_stubs
+from tracing import span
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "replay.json"
+GOLD_COLUMN = "Golden Standard/Our answers Rag/Search"
+
+
+# ------------------------------------------------------------------ inputs
+
+def load_questions(path=ROOT / "evaluation.csv"):
+    rows = []
+    with open(path, newline="", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            question = (row.get("question") or "").strip()
+            if not question:
+                continue
+            gold = (row.get(GOLD_COLUMN) or "").split("/", 1)[0]
+            rows.append({
+                "question": question,
+                "hops": (row.get("hops") or "").strip() or "unknown",
+                "domain": (row.get("domain") or "").strip().lower() or "unknown",
+                "gold": _answer_set(gold),
+                "handfilled": {
+                    "search": _num(row.get("F1 Score Search")),
+                    "rag": _num(row.get("F1 Score RAG")),
+                },
+            })
+    return rows
+
+
+def _num(value):
+    try:
+        return float((value or "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _norm(text):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", str(text).lower())).strip()
+
+
+def _answer_set(text):
+    items = {_norm(part) for part in re.split(r"[,;\n]", text)}
+    return {i for i in items if i and i not in {"etc", "n a", "none"}}
+
+
+# ------------------------------------------------------------------ metrics
+
+def _predicted_set(df):
+    # Golden answers are human-readable, so compare against label columns
+    # when the query has them and against every value otherwise
+    cols = [c for c in df.columns if str(c).endswith("Label")] or list(df.columns)
+    return {_norm(v) for v in df[cols].astype(str).values.ravel() if _norm(v)}
+
+
+def percentiles(samples):
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {"n": len(ordered), "mean_ms": 1000 * statistics.mean(ordered),
+            "p50_ms": 1000 * pct(50), "p90_ms": 1000 * pct(90), "p99_ms": 1000 * pct(99),
+            "max_ms": 1000 * ordered[-1]}
+
+
+def prf(pred, gold):
+    if not pred and not gold:
+        return 1.0, 1.0, 1.0
+    hit = len(pred & gold)
+    p = hit / len(pred) if pred else 0.0
+    r = hit / len(gold) if gold else 0.0
+    f = 2 * p * r / (p + r) if p + r else 0.0
+    return p, r, f
+
+
+def aggregate_quality(results, key):
+    groups = defaultdict(list)
+    for res in results:
+        if res.get("scores"):
+            groups[res[key]].append(res["scores"])
+    out = {}
+    for name, scores in sorted(groups.items()):
+        out[name] = {m: statistics.mean(s[m] for s in scores) for m in ("precision", "recall", "f1")}
+        out[name]["n"] = len(scores)
+    return out
+
+
+# ------------------------------------------------------------------ backends
+
+def run_rag(cs, lm, item):
+    stages = {}
+    t0 = time.perf_counter()
+    answer = lm.get_llm_response(item["question"], [], timings=stages)
+    stages["generation"] = time.perf_counter() - t0 - stages.get("total", 0.0)
+    stages.pop("total", None)
+    return answer, stages
+
+
+def run_search(cs, sa, item):
+    stages = {}
+
+    def timed(name, fn, *args):
+        t = time.perf_counter()
+        out = fn(*args)
+        stages[name] = time.perf_counter() - t
+        return out
+
+    q = item["question"]
+    terms = timed("concept_extraction", lambda: sa.normalize_roles(sa.convert_query_to_wikidata_search(q)))
+    results = timed("serper_search", sa.query_search_api, [t["term"] for t in terms])
+    ids = timed("id_extraction", sa.extract_ids_per_term, results)
+    entities = timed("wbgetentities", sa.get_wikidata_descriptions, ids)
+    answer = timed("generation", sa.natural_language_to_sparql, q, entities, terms)
+    return answer, stages
+
+
+def replay(run_one, module, cs, items, recordings, concurrency):
+    lock = threading.Lock()
+    results = []
+
+    def one(item):
+        t0 = time.perf_counter()
+        out = {"question": item["question"], "hops": item["hops"], "domain": item["domain"]}
+        try:
+            # One root span per question, so NL2SPARQL_TRACE_* sinks see
+            # the same traces as the UI produces
+            with span("request", backend=run_one.__name__[len("run_"):]):
+                answer, stages = run_one(cs, module, item)
+                _, sparql = cs.split_answer(answer)
+                query = cs.clean_query(sparql)
+                t = time.perf_counter()
+                df, _ = cs.execute_query(query, use_cache=False)
+                stages["sparql_exec"] = time.perf_counter() - t
+            out["stages"] = stages
+            if recordings.has_sparql(query):
+                pred = _predicted_set(df)
+                p, r, f = prf(pred, item["gold"])
+                out["scores"] = {"precision": p, "recall": r, "f1": f}
+        except Exception as e:  # keep replaying; errors are part of the report
+            out["error"] = f"{type(e).__name__}: {e}"
+        out["end_to_end"] = time.perf_counter() - t0
+        with lock:
+            results.append(out)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, items))
+    wall = time.perf_counter() - t0
+
+    stage_samples = defaultdict(list)
+    for res in results:
+        for stage, seconds in res.get("stages", {}).items():
+            stage_samples[stage].append(seconds)
+        stage_samples["end_to_end"].append(res["end_to_end"])
+
+    errors = [r for r in results if "error" in r]
+    return {
+        "questions": len(items),
+        "errors": len(errors),
+        "error_samples": [{"question": r["question"], "error": r["error"]} for r in errors[:5]],
+        "wall_s": wall,
+        "throughput_qps": len(items) / wall if wall else None,
+        "stages": {stage: percentiles(s) for stage, s in sorted(stage_samples.items())},
+        "quality": {
+            "scored": sum(1 for r in results if r.get("scores")),
+            "overall": aggregate_quality([dict(r, all="all") for r in results], "all").get("all"),
+            "by_hops": aggregate_quality(results, "hops"),
+            "by_domain": aggregate_quality(results, "domain"),
+        },
+    }
+
+
+def handfilled_baseline(items):
+    out = {}
+    for backend in ("rag", "search"):
+        by = {"by_hops": defaultdict(list), "by_domain": defaultdict(list)}
+        for it in items:
+            score = it["handfilled"][backend]
+            if score is not None:
+                by["by_hops"][it["hops"]].append(score)
+                by["by_domain"][it["domain"]].append(score)
+        out[backend] = {k: {g: statistics.mean(v) for g, v in sorted(d.items())} for k, d in by.items()}
+    return out
+
+
+# ------------------------------------------------------------------ main
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recordings", type=Path)
+    parser.add_argument("--backends", default="rag,search")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds added per fake LLM call")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds added per stub HTTP request")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--answer-cache", action="store_true", help="serve near-duplicate questions from the answer cache")
+    parser.add_argument("--extraction-cache", action="store_true", help="reuse concept extractions of repeated questions")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    recordings = Recordings(args.recordings)
+    server = start_http_stubs(recordings, args.http_latency)
+    base = f"http://127.0.0.1:{server.server_port}"
+    # Must be set before the backends are imported; nothing may hit the network
+    os.environ.update({
+        "SERPER_URL": f"{base}/search",
+        "WIKIDATA_API_URL": f"{base}/w/api.php",
+        "NL2SPARQL_CACHE_DB": "",
+        "HF_HUB_OFFLINE": "1",
+        "NL2SPARQL_ANSWER_CACHE": "1" if args.answer_cache else "0",
+        "NL2SPARQL_EXTRACTION_CACHE": "1" if args.extraction_cache else "0",
+    })
+
+    import captureSparql as cs
+    cs.url = f"{base}/sparql"
+
+    import llm_gateway
+    fake = FakeLLM(recordings, args.llm_latency)
+    for provider in fake.providers():
+        llm_gateway.register_provider(provider)
+    items = load_questions()[: args.limit]
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "backends": {},
+        "handfilled_f1": handfilled_baseline(items),
+    }
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "rag" in backends:
+        import RAGModel.llmbasedbackend as lm
+        t0 = time.perf_counter()
+        lm.warmup()
+        report["rag_warmup_s"] = time.perf_counter() - t0
+        report["backends"]["rag"] = replay(run_rag, lm, cs, items, recordings, args.concurrency)
+        report["backends"]["rag"]["embedding_cache"] = lm.embedding_cache_stats()
+        if args.answer_cache:
+            report["backends"]["rag"]["answer_cache"] = lm.answer_cache_stats()
+    if "search" in backends:
+        import searchTool.searchtool as sa
+        report["backends"]["search"] = replay(run_search, sa, cs, items, recordings, args.concurrency)
+
+    if args.extraction_cache:
+        from extraction_cache import extraction_cache_stats
+        report["extraction_cache"] = extraction_cache_stats()
+    report["llm_calls"] = fake.calls
+    report["llm_gateway"] = llm_gateway.gateway_stats()
+    report["responses"] = recordings.used
+    server.shutdown()
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    for name, res in report["backends"].items():
+        e2e = res["stages"].get("end_to_end", {})
+        print(f"{name:7s} {res['questions']} questions, {res['errors']} errors, "
+              f"{res['throughput_qps']:.2f} q/s, p50 {e2e.get('p50_ms', 0):.1f} ms")
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time query_search_api against a local Serper stand-in.
+
+Starts a threaded HTTP server that answers every search after a fixed delay,
+points searchtool at it via SERPER_URL and compares the concurrent fan-out
+with a one-term-at-a-time loop.
+
+    python -m benchmarks.serper_fanout [--delay 0.2] [--terms 5]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_stub(delay):
+    class StubSerper(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(delay)
+            term = body["q"].replace(" site:wikidata.org", "")
+            payload = json.dumps({"organic": [{
+                "title": f"{term} - Wikidata",
+                "link": f"https://www.wikidata.org/wiki/Q{abs(hash(term)) % 100000}",
+                "snippet": term,
+            }]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StubSerper
+
+
+def start_stub(delay):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub(delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.2, help="stub latency per request (s)")
+    parser.add_argument("--terms", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub(args.delay)
+    os.environ["SERPER_URL"] = f"http://127.0.0.1:{server.server_port}/search"
+    import searchTool.searchtool as sa  # reads SERPER_URL at import
+
+    terms = [f"term{i}" for i in range(args.terms)]
+
+    t0 = time.perf_counter()
+    serial = {t: sa._search_term(t) for t in terms}
+    serial_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    concurrent = sa.query_search_api(terms)
+    concurrent_s = time.perf_counter() - t0
+
+    server.shutdown()
+    print(json.dumps({
+        "terms": args.terms,
+        "stub_delay_s": args.delay,
+        "serial_s": round(serial_s, 3),
+        "concurrent_s": round(concurrent_s, 3),
+        "round_trips": round(concurrent_s / args.delay, 2),
+        "same_results": serial == concurrent,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Measure import and warm-up times of the modules FrontEnd.py pulls in.
+
+Each measurement runs in a fresh interpreter so nothing is already cached in
+``sys.modules``.  Results are written as JSON (default:
+benchmarks/results/startup.json) so they can be committed and compared
+between revisions.
+
+    python -m benchmarks.startup_times [--repeat 5] [--out PATH]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "startup.json"
+
+# name -> code timed inside a fresh interpreter
+CASES = {
+    "import captureSparql": "import captureSparql",
+    "import searchTool.searchtool": "import searchTool.searchtool",
+    "import RAGModel.llmbasedbackend": "import RAGModel.llmbasedbackend",
+    "RAGModel.llmbasedbackend.warmup()": None,  # import excluded, see below
+}
+
+_TIMER = """
+import time, json
+t0 = time.perf_counter()
+{code}
+print(json.dumps(time.perf_counter() - t0))
+"""
+
+_WARMUP = """
+import time, json
+import RAGModel.llmbasedbackend as lm
+t0 = time.perf_counter()
+lm.warmup()
+print(json.dumps(time.perf_counter() - t0))
+"""
+
+
+def _run(script):
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat):
+    results = {}
+    for name, code in CASES.items():
+        script = _WARMUP if code is None else _TIMER.format(code=code)
+        try:
+            samples = [_run(script) for _ in range(repeat)]
+        except subprocess.CalledProcessError as e:
+            # e.g. the model stack is not installed; keep the other cases
+            error = (e.stderr.strip().splitlines() or ["exit status %d" % e.returncode])[-1]
+            results[name] = {"error": error}
+            print(f"{name:40s} failed: {error}")
+            continue
+        results[name] = {
+            "median_s": round(statistics.median(samples), 4),
+            "min_s": round(min(samples), 4),
+            "max_s": round(max(samples), 4),
+            "samples": [round(s, 4) for s in samples],
+        }
+        print(f"{name:40s} median {results[name]['median_s']:.3f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": measure(args.repeat),
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
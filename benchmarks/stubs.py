@@ -0,0 +1,253 @@
+"""Local stand-ins for every external service the two backends call.
+
+* Gemini and OpenAI are replaced by ``llm_gateway.FakeProvider`` instances,
+  so the gateway's limits, retries and spans are exercised as in production.
+* Serper, ``wbgetentities`` and the Wikidata SPARQL endpoint are served by a
+  threaded HTTP server on 127.0.0.1, so the real request code (sessions,
+  thread pools, JSON parsing) is exercised.
+
+Answers come from a recordings file when one is given and are synthesised
+from the bundled entity corpus otherwise.  Recordings format (all keys
+optional)::
+
+    {
+      "questions": {
+        "<question>": {
+          "extraction_rag": "<raw Gemini concept-extraction reply>",
+          "generation_rag": "<raw Gemini answer: Thought ... SPARQL: ...>",
+          "extraction_search": "<raw GPT-4o term/role reply>",
+          "generation_search": "<raw GPT-4o SPARQL reply>"
+        }
+      },
+      "serper": {"<term>": [<organic results>]},
+      "sparql": {"<canonical query (captureSparql.canonicalize_query)>": <SPARQL JSON>}
+    }
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTITY_DIR = ROOT / "RAGModel" / "jsonfiles"
+ENTITY_FILES = ["capital.json", "companies.json", "countries.json", "event.json",
+                "movies.json", "public_figures.json"]
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "by", "with", "and", "or", "is", "are",
+    "was", "were", "be", "been", "what", "which", "who", "whom", "whose", "where", "when", "how",
+    "many", "much", "did", "does", "do", "give", "me", "show", "list", "all", "that", "this",
+    "has", "have", "had", "its", "their", "his", "her", "from", "as", "it", "there",
+}
+
+
+def _load_corpus():
+    by_label = {}
+    by_id = {}
+    for name in ENTITY_FILES:
+        with open(ENTITY_DIR / name, encoding="utf-8") as fp:
+            for e in json.load(fp):
+                qid = e.get("wikidata_id")
+                label = e.get("name") or ""
+                if qid:
+                    by_label.setdefault(label.lower(), []).append((qid, label, e.get("description", "")))
+                    by_id[qid] = (label, e.get("description", ""))
+    return by_label, by_id
+
+
+class Recordings:
+    def __init__(self, path=None):
+        data = {}
+        if path:
+            with open(path, encoding="utf-8") as fp:
+                data = json.load(fp)
+        self.questions = data.get("questions", {})
+        self.serper = data.get("serper", {})
+        self.sparql = data.get("sparql", {})
+        self.by_label, self.by_id = _load_corpus()
+        self.used = {"recorded": 0, "synthetic": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, recorded):
+        with self._lock:
+            self.used["recorded" if recorded else "synthetic"] += 1
+
+    def answer(self, question, key):
+        value = self.questions.get(question, {}).get(key)
+        self._count(value is not None)
+        return value
+
+    def sparql_result(self, query):
+        value = self.sparql.get(self._canonical(query))
+        self._count(value is not None)
+        return value
+
+    def has_sparql(self, query):
+        return self._canonical(query) in self.sparql
+
+    @staticmethod
+    def _canonical(query):
+        import captureSparql as cs
+        return cs.canonicalize_query(query)[0]
+
+    # ------------------------------------------------------------ synthesis
+    @staticmethod
+    def terms(question):
+        words = re.findall(r"[A-Za-z0-9][\w'-]*", question)
+        return [w for w in words if w.lower() not in _STOPWORDS][:4]
+
+    def search_results(self, term):
+        if term in self.serper:
+            self._count(True)
+            return self.serper[term]
+        self._count(False)
+        t = term.lower()
+        hits = [row for label, rows in self.by_label.items() if t in label for row in rows][:4]
+        return [{"title": f"{label} - Wikidata",
+                 "link": f"https://www.wikidata.org/wiki/{qid}",
+                 "snippet": desc} for qid, label, desc in hits]
+
+
+# ------------------------------------------------------------------ LLM fakes
+
+def _question_from_prompt(prompt):
+    m = re.search(r'Now extract from this:\s*"(.*?)"\s*\n', prompt, re.DOTALL)
+    if m:
+        return m.group(1)
+    m = re.search(r'generate a SPARQL query for:\s*"(.*?)"', prompt, re.DOTALL)
+    if m:
+        return m.group(1)
+    idx = prompt.rfind("Question: ")
+    return prompt[idx + len("Question: "):].split("\n", 1)[0].strip() if idx >= 0 else ""
+
+
+def _synthetic_sparql(prompt):
+    qids = list(dict.fromkeys(re.findall(r"\(entity:(Q\d+)\)|\((Q\d+)\)", prompt)))
+    qids = [a or b for a, b in qids][:3] or ["Q5"]
+    values = " ".join(f"wd:{q}" for q in qids)
+    return ("SELECT ?item ?itemLabel WHERE {\n  VALUES ?item { " + values + " }\n"
+            '  SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }\n}')
+
+
+class FakeLLM:
+    """Answers both providers' prompts; optional fixed latency per call."""
+
+    def __init__(self, recordings, latency=0.0):
+        self.rec = recordings
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reply(self, prompt, provider):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        question = _question_from_prompt(prompt)
+        if "semantic concepts" in prompt:
+            recorded = self.rec.answer(question, f"extraction_{provider}")
+            if recorded is not None:
+                return recorded
+            if provider == "search":
+                return json.dumps([{"term": t, "role": "object"} for t in self.rec.terms(question)])
+            return json.dumps([{"term": t} for t in self.rec.terms(question)])
+        recorded = self.rec.answer(question, f"generation_{provider}")
+        if recorded is not None:
+            return recorded
+        sparql = _synthetic_sparql(prompt)
+        return sparql if provider == "search" else f"Thought: stub reasoning.\nSPARQL:\n{sparql}"
+
+    def providers(self, concurrency=None, tpm=0, errors=()):
+        """FakeProviders for "gemini" and "openai" to pass to llm_gateway.register_provider.
+
+        The fake latency is applied in :meth:`reply`; ``errors`` is scripted
+        into both providers (see ``FakeProvider``).
+        """
+        from llm_gateway import FakeProvider
+        return [
+            FakeProvider("gemini", lambda prompt, system: self.reply(prompt, "rag"),
+                         concurrency=concurrency, tpm=tpm, errors=errors),
+            FakeProvider("openai", lambda prompt, system: self.reply(prompt, "search"),
+                         concurrency=concurrency, tpm=tpm, errors=errors),
+        ]
+
+
+# ------------------------------------------------------------- HTTP stand-ins
+
+def start_http_stubs(recordings, latency=0.0, errors=()):
+    """Serve /search (Serper), /w/api.php (wbgetentities) and /sparql.
+
+    ``errors`` scripts failures, one per request (across all routes), like
+    ``FakeProvider``: an HTTP status code to reply with, a dict to send as
+    the 200 body (e.g. ``{"error": {...}}``), or None for a normal reply.
+    The remaining script is ``server.errors``.
+    """
+    rec = recordings
+    script = list(errors)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, obj, status=200):
+            payload = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _scripted(self):
+            # True when a scripted error was sent instead of the normal reply
+            with lock:
+                error = script.pop(0) if script else None
+            if error is None:
+                return False
+            if isinstance(error, int):
+                self._send({}, status=error)
+            else:
+                self._send(error)
+            return True
+
+        def do_POST(self):
+            if latency:
+                time.sleep(latency)
+            if self._scripted():
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            term = body.get("q", "").replace(" site:wikidata.org", "")
+            self._send({"organic": rec.search_results(term)})
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            if self._scripted():
+                return
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path.endswith("/api.php"):
+                lang = params.get("languages", "en")
+                entities = {}
+                for qid in params.get("ids", "").split("|"):
+                    if qid not in rec.by_id:
+                        entities[qid] = {"id": qid, "missing": ""}
+                        continue
+                    label, desc = rec.by_id[qid]
+                    entities[qid] = {"labels": {lang: {"value": label}} if label else {},
+                                     "descriptions": {lang: {"value": desc}} if desc else {}}
+                self._send({"entities": entities})
+            else:
+                result = rec.sparql_result(params.get("query", ""))
+                self._send(result or {"head": {"vars": []}, "results": {"bindings": []}})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.errors = script
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,98 @@
+"""Memory footprint and top-k agreement of quantised vector storage.
+
+    python -m benchmarks.vector_storage [--out benchmarks/results/vector_storage.json]
+
+The bundled entities and properties are indexed with every storage in
+retriever.VECTOR_STORAGES (flat index) and queried with the evaluation.csv
+questions.  For each storage the report gives the bytes kept per corpus
+(index plus the float32 .npy where one is kept), top-k overlap with float32
+and how often the score thresholds of retrieve_offline_ids give the same
+hits as float32.
+"""
+
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from RAGModel.jsonfiles import retriever
+from RAGModel.model_registry import get_encoder
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = ROOT / "benchmarks" / "results" / "vector_storage.json"
+
+# (corpus, k, score threshold) as used by retrieve_offline_ids
+CORPORA = (("entity", 3, 0.6), ("prop", 5, 0.2))
+
+
+def load_questions(path=ROOT / "evaluation.csv"):
+    with open(path, newline="", encoding="utf-8") as fp:
+        return [row["question"] for row in csv.DictReader(fp) if row.get("question")]
+
+
+def agreement(base, other, k, threshold):
+    (b_scores, b_idx), (o_scores, o_idx) = base, other
+    overlap = same_order = same_hits = 0
+    for bs, bi, os_, oi in zip(b_scores, b_idx, o_scores, o_idx):
+        overlap += len(set(bi) & set(oi))
+        same_order += list(bi) == list(oi)
+        same_hits += {i for s, i in zip(bs, bi) if s >= threshold} == {i for s, i in zip(os_, oi) if s >= threshold}
+    n = len(b_idx)
+    return {"overlap_at_k": overlap / (n * k), "same_order": same_order / n, "same_thresholded_hits": same_hits / n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    st = retriever.get_state()
+    encoder = get_encoder(retriever.MODEL_NAME)
+    vectors = {
+        "entity": np.asarray(encoder.encode(st.entity_texts, normalize_embeddings=True), dtype=np.float32),
+        "prop": np.asarray(encoder.encode(st.prop_texts, normalize_embeddings=True), dtype=np.float32),
+    }
+    queries = retriever.encode_queries(load_questions())
+
+    results = {}
+    baseline = {}
+    for storage in retriever.VECTOR_STORAGES:
+        results[storage] = {}
+        for name, k, threshold in CORPORA:
+            emb = vectors[name]
+            index, used = retriever.build_index(emb, retriever.index_config("flat", storage))
+            index_bytes = len(faiss.serialize_index(index))
+            npy_bytes = emb.nbytes if storage == "float32" else 0
+            found = index.search(queries, k)
+            if storage == "float32":
+                baseline[name] = found
+            results[storage][name] = {
+                "factory": used["factory"],
+                "vectors": len(emb),
+                "index_bytes": index_bytes,
+                "npy_bytes": npy_bytes,
+                "total_bytes": index_bytes + npy_bytes,
+                "bytes_per_vector": (index_bytes + npy_bytes) / len(emb),
+                **agreement(baseline[name], found, k, threshold),
+            }
+            r = results[storage][name]
+            print(f"{storage:8s} {name:7s} {r['total_bytes'] / 1e6:7.2f} MB  "
+                  f"overlap@{k} {r['overlap_at_k']:.3f}  same order {r['same_order']:.3f}  "
+                  f"same thresholded hits {r['same_thresholded_hits']:.3f}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "queries": len(queries),
+        "results": results,
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
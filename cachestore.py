@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# ------------------------ Shared TTL cache ------------------------
+#
+# Small key/value cache used by the backends for network and LLM results:
+# an in-memory LRU with a per-entry time-to-live, optionally backed by a
+# SQLite file so entries survive restarts and are shared between processes.
+# Values must be JSON-serialisable when a database is used.  The database
+# keeps at most ``maxsize`` rows per namespace (the most recently written
+# ones, whichever process wrote them), and expired rows are purged every
+# few minutes while the cache is written to.
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+# Default database for persistent caches; set NL2SPARQL_CACHE_DB="" to keep
+# every cache in memory only.
+DEFAULT_DB_PATH = os.getenv("NL2SPARQL_CACHE_DB", str(ROOT_DIR / ".cache" / "nl2sparql.sqlite"))
+
+# Seconds between purges of expired rows from the database
+PURGE_INTERVAL = 300.0
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-memory LRU with per-entry TTL and an optional SQLite backing store.
+
+    ``namespace`` separates independent caches that share one database file.
+    A ``ttl`` of ``None`` means entries never expire.
+    """
+
+    def __init__(self, namespace, maxsize=1024, ttl=3600.0, db_path=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._purged = 0.0
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires REAL, PRIMARY KEY (namespace, key))"
+            )
+            self._purge(time.time())
+            self._db.commit()
+
+    # ---------------------------------------------------------------- internals
+    def _expiry(self, ttl):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        return None if ttl is None else time.time() + ttl
+
+    def _remember(self, key, expires, value):
+        # caller holds the lock
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _purge(self, now):
+        # caller holds the lock (or is __init__); does not commit
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires IS NOT NULL AND expires < ?",
+            (self.namespace, now),
+        )
+        self._purged = now
+
+    def _trim(self):
+        # caller holds the lock; does not commit.  INSERT OR REPLACE gives a
+        # rewritten row a new rowid, so rowid order is write order.
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND rowid NOT IN"
+            " (SELECT rowid FROM cache WHERE namespace = ? ORDER BY rowid DESC LIMIT ?)",
+            (self.namespace, self.namespace, self.maxsize),
+        )
+
+    def _lookup(self, key, now):
+        # caller holds the lock; returns _MISSING on a miss
+        entry = self._data.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires is None or expires > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return _MISSING
+
+    # ---------------------------------------------------------------- public API
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, time.time())
+        return default if value is _MISSING else value
+
+    def get_many(self, keys):
+        """Return ``{key: value}`` for the keys that are cached and fresh."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is not _MISSING:
+                    found[key] = value
+        return found
+
+    def set(self, key, value, ttl=_MISSING):
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items, ttl=_MISSING):
+        expires = self._expiry(ttl)
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, expires, value)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                    [(self.namespace, key, json.dumps(value), expires) for key, value in items.items()],
+                )
+                self._trim()
+                now = time.time()
+                if now - self._purged >= PURGE_INTERVAL:
+                    self._purge(now)
+                self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.disk_hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "persistent": self._db is not None,
+            }
+
+    def __len__(self):
+        return len(self._data)
@@ -1,8 +1,14 @@
 import requests
-import RAGModel.llmbasedbackend as askai
-from fastapi import FastAPI
 import json
 import re
+import os
+import hashlib
+import threading
+import time
+import pandas as pd
+from cachestore import TTLCache
+from sparql_stream import ColumnarResult, SparqlParseError, parse_sparql_json
+from tracing import span
 
 # print(repr(askai.result))
 url = 'https://query.wikidata.org/sparql'
@@ -23,6 +29,21 @@ def extract_sparql_from_response(response_text):
     else:
         return None
 
+# Marker that separates the reasoning from the query in generated answers
+SPARQL_MARKER = "SPARQL:"
+
+
+def split_answer(answer):
+    """Split an LLM answer into ``(reasoning, sparql_code)``.
+
+    Answers without the ``SPARQL:`` marker are treated as bare queries.
+    Works on partial (streamed) answers too.
+    """
+    if SPARQL_MARKER in answer:
+        reasoning, sparql_code = answer.split(SPARQL_MARKER, 1)
+        return reasoning.strip(), sparql_code.strip()
+    return "", answer.strip()
+
 #test = askai.get_llm_response(userquestion,dialog_history)
 #query = extract_sparql_from_response(test)
 '''
@@ -45,4 +66,224 @@ bindings = data.get("results",{}).get("bindings",[])
 if not bindings:
     print(askai.get_llm_response(f"The following SPARQL query was generated for the question: {askai.user_question}.It returned no results. Can you identify the mistake and generate a corrected version?"))
 
-print(data)    '''
\ No newline at end of file
+print(data)    '''
+
+
+# ------------------------ Query canonicalisation ------------------------
+
+_TOKEN_RE = re.compile(r"""
+    (?P<string>"{3}(?:[^"\\]|\\.|"(?!""))*"{3}|'{3}(?:[^'\\]|\\.|'(?!''))*'{3}
+              |"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<comment>\#[^\n]*)
+  | (?P<var>[?$][A-Za-z0-9_·À-￿]+)
+  | (?P<word>[A-Za-z0-9_:@%À-￿-]+(?:\.[A-Za-z0-9_:@%À-￿-]+)*)
+  | (?P<op>\|\||&&|!=|<=|>=|\^\^|\S)
+""", re.VERBOSE)
+
+# Keywords and built-ins are case-insensitive in SPARQL
+_KEYWORDS = {
+    "SELECT", "ASK", "CONSTRUCT", "DESCRIBE", "WHERE", "FROM", "NAMED", "DISTINCT", "REDUCED",
+    "OPTIONAL", "FILTER", "SERVICE", "UNION", "MINUS", "GRAPH", "BIND", "AS", "VALUES", "WITH",
+    "INCLUDE", "PREFIX", "BASE", "ORDER", "GROUP", "BY", "HAVING", "ASC", "DESC", "LIMIT",
+    "OFFSET", "NOT", "EXISTS", "IN", "COUNT", "SUM", "MIN", "MAX", "AVG", "SAMPLE",
+    "GROUP_CONCAT", "SEPARATOR", "LANG", "LANGMATCHES", "STR", "REGEX", "CONTAINS", "YEAR",
+    "MONTH", "DAY", "NOW", "BOUND", "IF", "COALESCE", "LCASE", "UCASE", "STRSTARTS", "STRENDS",
+    "STRLEN", "SUBSTR", "DATATYPE", "ISIRI", "ISURI", "ISLITERAL", "ISBLANK", "TRUE", "FALSE",
+}
+
+# Columns the Wikidata label service derives from a variable name
+_LABEL_SUFFIXES = ("AltLabel", "Description", "Label")
+
+
+def canonicalize_query(query):
+    """Canonical form of a SPARQL query for use as a cache key.
+
+    Comments are dropped, whitespace is collapsed, keywords are upper-cased,
+    PREFIX declarations are sorted and variables are renamed to ?v0, ?v1, ...
+    in order of first appearance.  Returns ``(canonical_text, var_map)``
+    where ``var_map`` maps the original variable names to the canonical ones.
+    The canonical text is a key, not meant to be executed.
+    """
+    tokens = []
+    for m in _TOKEN_RE.finditer(clean_query(query)):
+        kind = m.lastgroup
+        text = m.group()
+        if kind == "comment":
+            continue
+        if kind == "word" and text.upper() in _KEYWORDS:
+            text = text.upper()
+        tokens.append((kind, text))
+
+    # Pull PREFIX/BASE declarations out of the prologue and sort them
+    prologue = set()
+    body = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if text == "PREFIX" and i + 2 < len(tokens) and tokens[i + 2][0] == "iri":
+            prologue.add(f"PREFIX {tokens[i + 1][1]} {tokens[i + 2][1]}")
+            i += 3
+            continue
+        if text == "BASE" and i + 1 < len(tokens) and tokens[i + 1][0] == "iri":
+            prologue.add(f"BASE {tokens[i + 1][1]}")
+            i += 2
+            continue
+        body.append((kind, text))
+        i += 1
+
+    # Label-service variables (?xLabel, ?xDescription, ?xAltLabel) follow
+    # their base variable, so ?itemLabel is not confused with ?personLabel
+    names = {text[1:] for kind, text in body if kind == "var"}
+    var_map = {}
+    counter = 0
+
+    def canonical(name):
+        nonlocal counter
+        if name not in var_map:
+            for suffix in _LABEL_SUFFIXES:
+                base = name[:-len(suffix)]
+                if name.endswith(suffix) and base in names:
+                    var_map[name] = canonical(base) + suffix
+                    return var_map[name]
+            var_map[name] = f"v{counter}"
+            counter += 1
+        return var_map[name]
+
+    out = []
+    for kind, text in body:
+        if kind == "var":
+            text = "?" + canonical(text[1:])
+        out.append(text)
+
+    return " ".join(sorted(prologue) + out), var_map
+
+
+def _column_map(var_map):
+    """Extend a variable map to label-service columns (?x -> xLabel etc.)."""
+    def rename(col):
+        if col in var_map:
+            return var_map[col]
+        for suffix in _LABEL_SUFFIXES:
+            if col.endswith(suffix) and col[:-len(suffix)] in var_map:
+                return var_map[col[:-len(suffix)]] + suffix
+        return col
+    return rename
+
+
+# ------------------------ Cached query execution ------------------------
+
+SPARQL_TIMEOUT = float(os.getenv("SPARQL_TIMEOUT", "60"))
+SPARQL_CACHE_TTL = float(os.getenv("SPARQL_CACHE_TTL", "3600"))
+SPARQL_CACHE_SIZE = int(os.getenv("SPARQL_CACHE_SIZE", "256"))
+SPARQL_CACHE_MAX_ROWS = int(os.getenv("SPARQL_CACHE_MAX_ROWS", "50000"))
+# Optional SQLite file for the result cache; empty keeps it in memory only
+SPARQL_CACHE_DB = os.getenv("SPARQL_CACHE_DB", "")
+# Stop reading a response after this many rows / bytes (0 = no limit)
+SPARQL_MAX_ROWS = int(os.getenv("SPARQL_MAX_ROWS", "200000"))
+SPARQL_MAX_BYTES = int(os.getenv("SPARQL_MAX_BYTES", str(256 * 1024 * 1024)))
+# Rows handed to ``on_page`` while the rest is still downloading
+SPARQL_PAGE_SIZE = int(os.getenv("SPARQL_PAGE_SIZE", "100"))
+_CHUNK_SIZE = 64 * 1024
+
+_result_cache = TTLCache("sparql", maxsize=SPARQL_CACHE_SIZE, ttl=SPARQL_CACHE_TTL, db_path=SPARQL_CACHE_DB)
+_session = requests.Session()
+_stats_lock = threading.Lock()
+_latency = {"hit": [], "miss": []}
+_LATENCY_WINDOW = 1000
+
+
+class SparqlError(Exception):
+    """The endpoint failed or returned something that is not SPARQL JSON."""
+
+    def __init__(self, message, detail=""):
+        super().__init__(message)
+        self.detail = detail
+
+
+def _record_latency(kind, seconds):
+    with _stats_lock:
+        samples = _latency[kind]
+        samples.append(seconds)
+        if len(samples) > _LATENCY_WINDOW:
+            del samples[0]
+
+
+def execute_query(query, use_cache=True, on_page=None):
+    """Run *query* against the Wikidata endpoint and return ``(df, info)``.
+
+    ``query`` should already be passed through :func:`clean_query`.  Results
+    are cached under the canonical form of the query, so a repeat that only
+    differs in whitespace, comments, prefix order or variable names is served
+    from the cache with its own column names.  The response is parsed while
+    it downloads, into typed columns; ``on_page(df)`` is called with the
+    first ``SPARQL_PAGE_SIZE`` rows as soon as they are in (not on cache
+    hits).  Reading stops at ``SPARQL_MAX_ROWS`` rows or ``SPARQL_MAX_BYTES``
+    bytes.  ``info`` holds ``cached``, ``latency`` (seconds) and
+    ``truncated`` (None, "max_rows" or "max_bytes").  Raises
+    :class:`SparqlError` on endpoint errors.
+    """
+    with span("sparql_exec") as sp:
+        df, info = _execute_query(query, use_cache, on_page)
+        sp.set("cached", info["cached"])
+        sp.set("cache_hits" if info["cached"] else "cache_misses", 1)
+    return df, info
+
+
+def _from_cache(cached, rename):
+    if isinstance(cached, list):  # row dicts, written before results were columnar
+        return pd.DataFrame([{rename(k): v for k, v in row.items()} for row in cached])
+    return ColumnarResult.from_payload(cached, rename).to_frame()
+
+
+def _execute_query(query, use_cache, on_page=None):
+    start = time.perf_counter()
+    canonical, var_map = canonicalize_query(query)
+    key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    cached = _result_cache.get(key) if use_cache else None
+    if cached is not None:
+        df = _from_cache(cached, _column_map({v: k for k, v in var_map.items()}))
+        latency = time.perf_counter() - start
+        _record_latency("hit", latency)
+        return df, {"cached": True, "latency": latency, "truncated": None}
+
+    with _session.get(url, params={'format': 'json', 'query': query},
+                      headers={"Accept": "application/sparql-results+json"},
+                      timeout=SPARQL_TIMEOUT, stream=True) as r:
+        if not r.ok:
+            raise SparqlError(f"SPARQL endpoint returned an error: {r.status_code}", r.text)
+        with span("result_parse") as sp:
+            try:
+                result, parsed = parse_sparql_json(
+                    r.iter_content(chunk_size=_CHUNK_SIZE),
+                    max_rows=SPARQL_MAX_ROWS or None, max_bytes=SPARQL_MAX_BYTES or None,
+                    page_size=SPARQL_PAGE_SIZE, on_page=on_page,
+                )
+            except SparqlParseError as e:
+                raise SparqlError(str(e), "The endpoint did not return SPARQL JSON.")
+            df = result.to_frame()
+            sp.set("bytes", parsed["bytes"])
+            sp.set("rows", parsed["rows"])
+            if parsed["truncated"]:
+                sp.set("truncated", parsed["truncated"])
+
+    if use_cache and not parsed["truncated"] and result.rows <= SPARQL_CACHE_MAX_ROWS:
+        _result_cache.set(key, result.to_payload(_column_map(var_map)))
+
+    latency = time.perf_counter() - start
+    _record_latency("miss", latency)
+    return df, {"cached": False, "latency": latency, "truncated": parsed["truncated"]}
+
+
+def sparql_cache_stats():
+    """Result-cache counters plus latency (ms) of cache hits and endpoint calls."""
+    stats = _result_cache.stats()
+    with _stats_lock:
+        for kind, samples in _latency.items():
+            ordered = sorted(samples)
+            stats[f"{kind}_count"] = len(ordered)
+            stats[f"{kind}_mean_ms"] = 1000 * sum(ordered) / len(ordered) if ordered else 0.0
+            stats[f"{kind}_p50_ms"] = 1000 * ordered[len(ordered) // 2] if ordered else 0.0
+            stats[f"{kind}_max_ms"] = 1000 * ordered[-1] if ordered else 0.0
+    return stats
@@ -0,0 +1,86 @@
+import ast
+import hashlib
+import json
+import os
+
+from cachestore import DEFAULT_DB_PATH, TTLCache
+from tracing import current_span
+
+# ------------------------ Concept-extraction cache ------------------------
+#
+# Both backends start by asking an LLM for the concepts of the question
+# (Gemini in the RAG model, GPT-4o in the search tool).  The answer only
+# depends on the backend, the model, the extraction prompt and the question,
+# so it is memoised under exactly that key: the RDFS retry of a question and
+# warm runs over an evaluation set then skip the call.  Entries are kept in
+# the shared cachestore database (NL2SPARQL_CACHE_DB) and survive restarts.
+#
+# Each backend defines a prompt version next to its prompt; bump it whenever
+# the prompt changes so stale extractions are not reused.
+# NL2SPARQL_EXTRACTION_CACHE=0 turns the cache off (every question pays
+# for the extraction call, e.g. when measuring its latency).
+
+ENABLED = os.getenv("NL2SPARQL_EXTRACTION_CACHE", "1").lower() not in ("0", "false", "no", "off")
+EXTRACTION_CACHE_TTL = float(os.getenv("NL2SPARQL_EXTRACTION_CACHE_TTL", str(30 * 24 * 3600)))
+
+_cache = TTLCache(
+    "concept_extraction",
+    maxsize=int(os.getenv("NL2SPARQL_EXTRACTION_CACHE_SIZE", "4096")),
+    ttl=EXTRACTION_CACHE_TTL,
+    db_path=DEFAULT_DB_PATH,
+)
+
+
+def extraction_key(backend, model, prompt_version, question):
+    normalized = " ".join(question.split())
+    raw = json.dumps([backend, model, prompt_version, normalized], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cached_extraction(backend, model, prompt_version, question, extract):
+    """Return ``extract(question)``, memoised per backend/model/prompt version.
+
+    ``extract`` should raise when the LLM reply cannot be used, so failures
+    are never cached.  Callers get a fresh copy and may modify it.
+    """
+    if not ENABLED:
+        return extract(question)
+    key = extraction_key(backend, model, prompt_version, question)
+    value = _cache.get(key)
+    if value is None:
+        current_span().add("cache_misses", 1)
+        value = extract(question)
+        _cache.set(key, value)
+    else:
+        current_span().add("cache_hits", 1)
+    return json.loads(json.dumps(value))
+
+
+def parse_term_list(text, fields=("term",)):
+    """The list of term dicts in an extraction reply, or ValueError.
+
+    The reply is parsed as a Python literal (or JSON), never evaluated, and
+    every item must be a dict with a string value for each of ``fields``.
+    """
+    text = text.strip()
+    if text.startswith("```"):  # markdown code fence
+        text = text.strip("`").strip()
+        for language in ("python", "json"):
+            if text.startswith(language):
+                text = text[len(language):].strip()
+    try:
+        terms = ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        try:
+            terms = json.loads(text)
+        except ValueError:
+            raise ValueError("LLM output is not a list literal") from None
+    if not isinstance(terms, list) or not all(
+            isinstance(t, dict) and all(isinstance(t.get(f), str) for f in fields) for t in terms):
+        raise ValueError("LLM output did not follow expected structure")
+    return terms
+
+
+def extraction_cache_stats():
+    """Hit/miss counters of the concept-extraction cache."""
+    return _cache.stats()
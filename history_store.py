@@ -0,0 +1,166 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cachestore import ROOT_DIR
+
+# ------------------------ Conversation result tables ------------------------
+#
+# Result tables of a chat session, stored once as Arrow tables instead of
+# pandas dicts in the Streamlit session state.  The tables of one session
+# share a memory budget; when it is exceeded the least recently used ones
+# are written to a Parquet file in the spill directory and dropped from
+# memory.  Previews read only the row groups they need, so paging through an
+# old result does not load it back; ``get`` does (and counts it as used).
+# Spill directories of sessions idle for longer than the spill TTL are
+# removed when a new store is created.
+
+HISTORY_MEMORY_BYTES = int(float(os.getenv("NL2SPARQL_HISTORY_MEMORY_MB", "64")) * 1024 * 1024)
+HISTORY_SPILL_DIR = os.getenv("NL2SPARQL_HISTORY_SPILL_DIR", str(ROOT_DIR / ".cache" / "history"))
+HISTORY_SPILL_TTL = float(os.getenv("NL2SPARQL_HISTORY_SPILL_TTL", "86400"))
+HISTORY_PAGE_SIZE = int(os.getenv("NL2SPARQL_HISTORY_PAGE_SIZE", "20"))
+_ROW_GROUP_SIZE = 10_000
+
+
+def to_arrow(df):
+    """Arrow table for a result DataFrame; mixed-type columns become text."""
+    df = df.rename(columns=str)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: v if v is None or v != v else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def prune_spill_dir(spill_dir=HISTORY_SPILL_DIR, max_age=HISTORY_SPILL_TTL):
+    """Delete session spill directories not written to for ``max_age`` seconds."""
+    root = Path(spill_dir)
+    if not root.is_dir():
+        return
+    cutoff = time.time() - max_age
+    for path in root.iterdir():
+        try:
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+class ResultStore:
+    """Result tables of one session, LRU-spilled to Parquet above ``memory_cap`` bytes."""
+
+    def __init__(self, memory_cap=HISTORY_MEMORY_BYTES, spill_dir=HISTORY_SPILL_DIR, session_id=None):
+        self.memory_cap = memory_cap
+        self.session_id = session_id or uuid.uuid4().hex
+        self.spill_dir = Path(spill_dir) / self.session_id
+        self._tables = OrderedDict()  # table id -> pa.Table, in memory, least recently used first
+        self._rows = {}               # table id -> row count, for every table
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.loads = 0
+        prune_spill_dir(spill_dir)
+
+    # ---------------------------------------------------------------- internals
+    def _path(self, table_id):
+        return self.spill_dir / f"{table_id}.parquet"
+
+    def _read(self, table_id):
+        # Reading keeps the session's spill directory from being pruned
+        path = self._path(table_id)
+        os.utime(self.spill_dir)
+        return path
+
+    def _memory(self):
+        return sum(t.nbytes for t in self._tables.values())
+
+    def _evict(self):
+        # caller holds the lock
+        while self._tables and self._memory() > self.memory_cap:
+            table_id, table = self._tables.popitem(last=False)
+            path = self._path(table_id)
+            if not path.exists():  # tables never change, so a spilled copy stays valid
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                pq.write_table(table, tmp, row_group_size=_ROW_GROUP_SIZE)
+                tmp.rename(path)
+            self.spills += 1
+
+    # ------------------------------------------------------------- public API
+    def put(self, df):
+        """Store a result DataFrame; returns its table id."""
+        table = to_arrow(df)
+        table_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._tables[table_id] = table
+            self._rows[table_id] = table.num_rows
+            self._evict()
+        return table_id
+
+    def get(self, table_id):
+        """The whole table as a DataFrame, loading it back into memory if spilled."""
+        with self._lock:
+            table = self._tables.get(table_id)
+            if table is None:
+                table = pq.read_table(self._read(table_id))
+                self.loads += 1
+                self._tables[table_id] = table
+                self._evict()
+            else:
+                self._tables.move_to_end(table_id)
+        return table.to_pandas()
+
+    def page(self, table_id, page=0, page_size=HISTORY_PAGE_SIZE):
+        """Rows ``page * page_size`` to ``(page + 1) * page_size`` as a DataFrame."""
+        start = page * page_size
+        with self._lock:
+            table = self._tables.get(table_id)
+        if table is not None:
+            return table.slice(start, page_size).to_pandas()
+        pf = pq.ParquetFile(self._read(table_id))
+        groups, offset = [], 0
+        for i in range(pf.num_row_groups):
+            n = pf.metadata.row_group(i).num_rows
+            if offset + n > start and offset < start + page_size:
+                if not groups:
+                    first = offset
+                groups.append(i)
+            offset += n
+        if not groups:
+            return pf.schema_arrow.empty_table().to_pandas()
+        return pf.read_row_groups(groups).slice(start - first, page_size).to_pandas()
+
+    def num_rows(self, table_id):
+        return self._rows[table_id]
+
+    def num_pages(self, table_id, page_size=HISTORY_PAGE_SIZE):
+        return max(1, -(-self._rows[table_id] // page_size))
+
+    def __contains__(self, table_id):
+        return table_id in self._rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tables": len(self._rows),
+                "in_memory": len(self._tables),
+                "spilled": len(self._rows) - len(self._tables),
+                "memory_bytes": self._memory(),
+                "memory_cap": self.memory_cap,
+                "spills": self.spills,
+                "loads": self.loads,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._rows.clear()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
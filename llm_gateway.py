@@ -0,0 +1,666 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from dotenv import load_dotenv
+
+from tracing import end_span, span, start_span
+
+# ------------------------ LLM gateway ------------------------
+#
+# Every Gemini and OpenAI call of both backends goes through this module:
+#
+#   * clients are created once per provider (and per model/system prompt for
+#     Gemini) and reused, instead of a new GenerativeModel per call;
+#   * each provider has a cap on in-flight requests and a tokens-per-minute
+#     budget (a token bucket charged with an estimate before the call and
+#     corrected with the reported usage afterwards), so many concurrent users
+#     queue here instead of running into the provider's rate limits;
+#   * requests time out, and 429/5xx/timeouts are retried with exponential
+#     backoff and full jitter (honouring Retry-After when the error has it);
+#   * complete() / stream() are the sync entry points, acomplete() the async
+#     one; all of them are traced as "llm_call" spans;
+#   * a ``prefix`` (the static start of a prompt) is sent before the prompt.
+#     Keeping it byte-identical across requests lets provider-side prompt
+#     caches reuse it; for Gemini it can also be put in an explicit context
+#     cache (NL2SPARQL_GEMINI_CONTEXT_CACHE=1), so only the rest is sent.
+#
+# Providers are looked up by name ("gemini", "openai").  register_provider()
+# replaces one, e.g. with a FakeProvider for tests and offline benchmarks.
+#
+# Settings per provider (NAME = GEMINI or OPENAI), all optional:
+#
+#   NL2SPARQL_<NAME>_CONCURRENCY   in-flight requests (default 8)
+#   NL2SPARQL_<NAME>_TPM           tokens per minute, 0 = unlimited
+#   NL2SPARQL_LLM_TIMEOUT          seconds per request (default 120)
+#   NL2SPARQL_LLM_MAX_RETRIES      retries after the first attempt (default 4)
+#   NL2SPARQL_GEMINI_CONTEXT_CACHE      1 = cache system prompt + prefix on Gemini
+#   NL2SPARQL_GEMINI_CONTEXT_CACHE_TTL  seconds a context cache lives (default 3600)
+#   NL2SPARQL_GEMINI_CONTEXT_CACHE_MIN_TOKENS  smaller prefixes are sent inline
+#                                       (default 4096, Gemini's minimum cache size)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT = float(os.getenv("NL2SPARQL_LLM_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("NL2SPARQL_LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0   # seconds before the first retry (upper bound, jittered)
+BACKOFF_CAP = 30.0
+# Completion tokens reserved per call until the real usage is known
+COMPLETION_ESTIMATE = int(os.getenv("NL2SPARQL_LLM_COMPLETION_ESTIMATE", "512"))
+
+_DEFAULT_TPM = {"gemini": 1_000_000, "openai": 30_000}
+
+GEMINI_CONTEXT_CACHE = os.getenv("NL2SPARQL_GEMINI_CONTEXT_CACHE", "0").lower() in ("1", "true", "yes", "on")
+GEMINI_CONTEXT_CACHE_TTL = float(os.getenv("NL2SPARQL_GEMINI_CONTEXT_CACHE_TTL", "3600"))
+# Gemini rejects context caches below a minimum size; don't try for smaller prefixes
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("NL2SPARQL_GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+# After a failed context-cache creation, send the prefix inline for this long
+_CONTEXT_CACHE_RETRY = 600.0
+
+
+def estimate_tokens(text):
+    """Rough token count of *text* (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def prefix_digest(system, prefix):
+    """Short hash of what a provider sees before the prompt (system prompt + prefix)."""
+    return hashlib.sha256(f"{system or ''}\x00{prefix}".encode("utf-8")).hexdigest()[:16]
+
+
+class Completion:
+    __slots__ = ("text", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+    def __init__(self, text, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_tokens = cached_tokens
+
+
+# ------------------------ Limits ------------------------
+
+class Limiter:
+    """In-flight cap plus tokens-per-minute bucket, usable from threads and coroutines.
+
+    Waiters are served first come, first served, so a burst of users sees
+    evenly spread queueing delays rather than a few starving callers.
+    Coroutines wait on an asyncio.Event that is set (thread-safely) whenever
+    a slot or the head of the queue changes, or sleep for the time until the
+    bucket has refilled, instead of polling.
+    """
+
+    def __init__(self, concurrency, tpm=0):
+        self.concurrency = concurrency
+        self.tpm = tpm
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._async_waiters = set()  # (loop, asyncio.Event) of waiting coroutines
+        self._in_flight = 0
+        self._tokens = float(tpm)
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+        # caller holds the lock
+        now = time.monotonic()
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + (now - self._stamp) * self.tpm / 60.0)
+        self._stamp = now
+
+    def _try_acquire(self, ticket, tokens):
+        # caller holds the lock; returns 0 once acquired, else seconds to wait
+        self._refill()
+        if self._queue[0] is not ticket or self._in_flight >= self.concurrency:
+            return 0.05
+        tokens = min(tokens, self.tpm)
+        if self.tpm and self._tokens < tokens:
+            return (tokens - self._tokens) * 60.0 / self.tpm
+        self._queue.popleft()
+        self._in_flight += 1
+        if self.tpm:
+            self._tokens -= tokens
+        self._wake()
+        return 0
+
+    def _wake(self):
+        # caller holds the lock
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _leave(self, ticket):
+        # caller holds the lock; the waiter gave up (e.g. was cancelled)
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            self._wake()
+
+    def acquire(self, tokens):
+        """Block until a slot and ``tokens`` of budget are free."""
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, tokens)
+                    if not wait:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._leave(ticket)
+                raise
+
+    async def acquire_async(self, tokens):
+        ticket = object()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._queue.append(ticket)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    waiter[1].clear()
+                    wait = self._try_acquire(ticket, tokens)
+                if not wait:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+
+    def release(self, reserved, used=None):
+        """Free the slot; refund or charge the difference to the real usage."""
+        with self._cond:
+            self._in_flight -= 1
+            if self.tpm and used is not None:
+                self._refill()
+                self._tokens = min(self.tpm, self._tokens + min(reserved, self.tpm) - used)
+            self._wake()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+
+# ------------------------ Retries ------------------------
+
+_RETRYABLE_NAMES = ("RateLimit", "ResourceExhausted", "ServiceUnavailable", "Timeout",
+                    "DeadlineExceeded", "ConnectionError", "APIConnection", "InternalServerError",
+                    "TryAgain")
+
+
+def status_of(exc):
+    """HTTP status carried by a provider exception, if any."""
+    for attr in ("http_status", "status_code", "code"):
+        value = getattr(exc, attr, None)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_retryable(exc):
+    status = status_of(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return isinstance(exc, (TimeoutError, ConnectionError)) or any(n in name for n in _RETRYABLE_NAMES)
+
+
+def backoff_delay(attempt, exc=None):
+    """Seconds to wait before retry number ``attempt`` (0-based)."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after") or headers.get("Retry-After") or 0))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return delay
+
+
+# ------------------------ Providers ------------------------
+
+class Provider:
+    """Base class: one client per provider, with its limiter and counters."""
+
+    name = None
+
+    def __init__(self, concurrency=None, tpm=None):
+        env = self.name.upper()
+        if concurrency is None:
+            concurrency = int(os.getenv(f"NL2SPARQL_{env}_CONCURRENCY", "8"))
+        if tpm is None:
+            tpm = int(os.getenv(f"NL2SPARQL_{env}_TPM", str(_DEFAULT_TPM.get(self.name, 0))))
+        self.limiter = Limiter(concurrency, tpm)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "errors": 0, "prompt_tokens": 0,
+                         "completion_tokens": 0, "cached_tokens": 0, "queued_s": 0.0}
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    # Subclasses implement these; each raises the provider's own exceptions.
+    # ``prefix`` goes before ``prompt``; providers may cache it.
+    def generate(self, prompt, model, system, temperature, timeout, prefix=""):
+        raise NotImplementedError
+
+    async def generate_async(self, prompt, model, system, temperature, timeout, prefix=""):
+        return await asyncio.to_thread(self.generate, prompt, model, system, temperature, timeout, prefix)
+
+    def generate_stream(self, prompt, model, system, temperature, timeout, prefix=""):
+        """Yield text chunks, then return the final Completion (for usage)."""
+        completion = self.generate(prompt, model, system, temperature, timeout, prefix)
+        yield completion.text
+        return completion
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self._genai = genai
+        self._models = {}
+        self._contexts = {}  # (model, system, prefix) -> (model bound to a context cache or None, valid until)
+        self._creating = set()  # keys whose context cache is being created
+        self._context_lock = threading.Lock()
+
+    def _model(self, model, system):
+        key = (model, system)
+        instance = self._models.get(key)
+        if instance is None:
+            with self._lock:
+                instance = self._models.get(key)
+                if instance is None:
+                    instance = self._genai.GenerativeModel(model_name=model, system_instruction=system)
+                    self._models[key] = instance
+        return instance
+
+    def _create_context(self, model, system, prefix, now):
+        # (model bound to a new context cache or None, valid until)
+        try:
+            from google.generativeai import caching
+            cached = caching.CachedContent.create(
+                model=model if model.startswith("models/") else f"models/{model}",
+                system_instruction=system, contents=[prefix],
+                ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL),
+            )
+        except Exception as e:
+            logger.warning("Gemini context cache unavailable (%s); sending the prefix inline", e)
+            return None, now + _CONTEXT_CACHE_RETRY
+        logger.info("Gemini context cache %s created for prefix %s", cached.name,
+                    prefix_digest(system, prefix))
+        return (self._genai.GenerativeModel.from_cached_content(cached_content=cached),
+                now + GEMINI_CONTEXT_CACHE_TTL)
+
+    def _context_model(self, model, system, prefix):
+        # A model bound to a context cache holding system prompt + prefix, or
+        # None when caching is unavailable or the prefix is below the
+        # provider's minimum size.  The cache is recreated shortly before it
+        # expires; one call per prefix creates it, outside the lock, while
+        # concurrent calls keep using the old one or send the prefix inline.
+        if estimate_tokens((system or "") + prefix) < GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        key = (model, system, prefix)
+        now = time.time()
+        entry = self._contexts.get(key)
+        if entry is not None and entry[1] > now + 60:
+            return entry[0]
+        with self._context_lock:
+            entry = self._contexts.get(key)
+            if entry is not None and entry[1] > now + 60:
+                return entry[0]
+            if key in self._creating:
+                return entry[0] if entry is not None and entry[1] > now else None
+            self._creating.add(key)
+        try:
+            entry = self._create_context(model, system, prefix, now)
+            self._contexts[key] = entry
+        finally:
+            with self._context_lock:
+                self._creating.discard(key)
+        return entry[0]
+
+    def _request(self, prompt, model, system, prefix):
+        # (model instance, contents) for one call
+        if prefix and GEMINI_CONTEXT_CACHE:
+            instance = self._context_model(model, system, prefix)
+            if instance is not None:
+                return instance, prompt
+        return self._model(model, system), prefix + prompt
+
+    @staticmethod
+    def _completion(response, text):
+        usage = getattr(response, "usage_metadata", None)
+        return Completion(text, getattr(usage, "prompt_token_count", None),
+                          getattr(usage, "candidates_token_count", None),
+                          getattr(usage, "cached_content_token_count", None))
+
+    def generate(self, prompt, model, system, temperature, timeout, prefix=""):
+        instance, contents = self._request(prompt, model, system, prefix)
+        response = instance.generate_content(
+            contents, generation_config={"temperature": temperature},
+            request_options={"timeout": timeout},
+        )
+        return self._completion(response, response.text)
+
+    async def generate_async(self, prompt, model, system, temperature, timeout, prefix=""):
+        instance, contents = self._request(prompt, model, system, prefix)
+        response = await instance.generate_content_async(
+            contents, generation_config={"temperature": temperature},
+            request_options={"timeout": timeout},
+        )
+        return self._completion(response, response.text)
+
+    def generate_stream(self, prompt, model, system, temperature, timeout, prefix=""):
+        instance, contents = self._request(prompt, model, system, prefix)
+        response = instance.generate_content(
+            contents, generation_config={"temperature": temperature},
+            request_options={"timeout": timeout}, stream=True,
+        )
+        parts = []
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only safety metadata)
+                continue
+            if text:
+                parts.append(text)
+                yield text
+        return self._completion(response, "".join(parts))
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import openai
+        import requests
+        from requests.adapters import HTTPAdapter
+        openai.api_key = openai.api_key or os.getenv("OPENAI_API_KEY")
+        if getattr(openai, "requestssession", None) is None:
+            # One pooled session sized to the concurrency cap
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=self.limiter.concurrency))
+            openai.requestssession = session
+        self._openai = openai
+
+    @staticmethod
+    def _completion(response):
+        usage = getattr(response, "usage", None) or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        return Completion(response.choices[0].message.content.strip(),
+                          usage.get("prompt_tokens"), usage.get("completion_tokens"), cached)
+
+    def _kwargs(self, prompt, model, system, temperature, timeout, prefix):
+        # OpenAI caches long prompt prefixes by itself; the prefix just has to come first
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prefix + prompt})
+        return {"model": model, "messages": messages, "temperature": temperature,
+                "request_timeout": timeout}
+
+    def generate(self, prompt, model, system, temperature, timeout, prefix=""):
+        return self._completion(self._openai.ChatCompletion.create(
+            **self._kwargs(prompt, model, system, temperature, timeout, prefix)))
+
+    async def generate_async(self, prompt, model, system, temperature, timeout, prefix=""):
+        return self._completion(await self._openai.ChatCompletion.acreate(
+            **self._kwargs(prompt, model, system, temperature, timeout, prefix)))
+
+
+class FakeProvider(Provider):
+    """Local stand-in for tests and offline benchmarks.
+
+    ``reply(prompt, system)`` produces the text (an echo by default) from
+    the full prompt, prefix included.  Each call sleeps ``latency`` seconds;
+    ``errors`` is a list of exceptions (or None for success) consumed one per
+    call, to script 429s and 5xx.  ``prefixes`` counts calls per
+    :func:`prefix_digest`, to check that a prompt prefix stays byte-identical
+    across requests.
+    """
+
+    def __init__(self, name, reply=None, latency=0.0, errors=(), chunk_size=32, **kwargs):
+        self.name = name
+        super().__init__(**kwargs)
+        self.reply = reply or (lambda prompt, system: prompt)
+        self.latency = latency
+        self.errors = list(errors)
+        self.chunk_size = chunk_size
+        self.prefixes = Counter()
+
+    def _next(self, prompt, system, prefix):
+        with self._lock:
+            error = self.errors.pop(0) if self.errors else None
+            if prefix:
+                self.prefixes[prefix_digest(system, prefix)] += 1
+        if error is not None:
+            raise error
+        text = self.reply(prefix + prompt, system)
+        return Completion(text, estimate_tokens(prefix + prompt), estimate_tokens(text))
+
+    def generate(self, prompt, model, system, temperature, timeout, prefix=""):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next(prompt, system, prefix)
+
+    async def generate_async(self, prompt, model, system, temperature, timeout, prefix=""):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next(prompt, system, prefix)
+
+    def generate_stream(self, prompt, model, system, temperature, timeout, prefix=""):
+        completion = self.generate(prompt, model, system, temperature, timeout, prefix)
+        for i in range(0, len(completion.text), self.chunk_size):
+            yield completion.text[i:i + self.chunk_size]
+        return completion
+
+
+class FakeError(Exception):
+    """Provider-style error with an HTTP status, for FakeProvider scripts."""
+
+    def __init__(self, status, message="fake provider error", headers=None):
+        super().__init__(f"{status}: {message}")
+        self.http_status = status
+        self.headers = headers or {}
+
+
+_PROVIDER_CLASSES = {"gemini": GeminiProvider, "openai": OpenAIProvider}
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    """The shared provider instance called *name*, created on first use."""
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = _PROVIDER_CLASSES[name]()
+                _providers[name] = provider
+    return provider
+
+
+def register_provider(provider):
+    """Use *provider* for all calls to ``provider.name`` (e.g. a FakeProvider)."""
+    with _providers_lock:
+        _providers[provider.name] = provider
+    return provider
+
+
+def gateway_stats():
+    """Per-provider call, retry, error and token counters plus current load."""
+    with _providers_lock:
+        providers = dict(_providers)
+    stats = {}
+    for name, provider in providers.items():
+        with provider._lock:
+            stats[name] = dict(provider.counters)
+        stats[name].update(in_flight=provider.limiter.in_flight,
+                           concurrency=provider.limiter.concurrency, tpm=provider.limiter.tpm)
+    return stats
+
+
+# ------------------------ Entry points ------------------------
+
+def _record(provider, sp, completion):
+    for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+        value = getattr(completion, key)
+        if value is not None:
+            sp.set(key, value)
+            provider.count(key, value)
+
+
+def _used(completion, reserved):
+    if completion.prompt_tokens is None or completion.completion_tokens is None:
+        return reserved
+    return completion.prompt_tokens + completion.completion_tokens
+
+
+def _give_up(provider, exc, attempt):
+    if attempt >= MAX_RETRIES or not is_retryable(exc):
+        provider.count("errors")
+        return True
+    provider.count("retries")
+    logger.warning("%s call failed (%s), retry %d/%d", provider.name, exc, attempt + 1, MAX_RETRIES)
+    return False
+
+
+def _prompt_attrs(system, prefix, prompt):
+    attrs = {"prompt_chars": len(prefix) + len(prompt)}
+    if prefix:
+        attrs.update(prefix_chars=len(prefix), prefix_digest=prefix_digest(system, prefix))
+    return attrs
+
+
+def complete(provider, prompt, *, model, system=None, prefix="", temperature=0.2,
+             purpose="generation", timeout=None):
+    """Text of one completion from *provider* ("gemini" or "openai").
+
+    ``prefix`` is the static start of the prompt, sent before ``prompt``.
+    """
+    p = get_provider(provider)
+    timeout = timeout or LLM_TIMEOUT
+    reserved = estimate_tokens(prefix + prompt) + COMPLETION_ESTIMATE
+    with span("llm_call", provider=provider, model=model, purpose=purpose,
+              **_prompt_attrs(system, prefix, prompt)) as sp:
+        for attempt in range(MAX_RETRIES + 1):
+            t0 = time.perf_counter()
+            p.limiter.acquire(reserved)
+            p.count("queued_s", time.perf_counter() - t0)
+            p.count("calls")
+            completion = None
+            try:
+                completion = p.generate(prompt, model, system, temperature, timeout, prefix)
+            except Exception as e:
+                if _give_up(p, e, attempt):
+                    raise
+                delay = backoff_delay(attempt, e)
+            finally:
+                p.limiter.release(reserved, None if completion is None else _used(completion, reserved))
+            if completion is not None:
+                sp.set("attempts", attempt + 1)
+                _record(p, sp, completion)
+                return completion.text
+            time.sleep(delay)
+
+
+async def acomplete(provider, prompt, *, model, system=None, prefix="", temperature=0.2,
+                    purpose="generation", timeout=None):
+    """Async version of :func:`complete`."""
+    p = get_provider(provider)
+    timeout = timeout or LLM_TIMEOUT
+    reserved = estimate_tokens(prefix + prompt) + COMPLETION_ESTIMATE
+    with span("llm_call", provider=provider, model=model, purpose=purpose,
+              **_prompt_attrs(system, prefix, prompt)) as sp:
+        for attempt in range(MAX_RETRIES + 1):
+            t0 = time.perf_counter()
+            await p.limiter.acquire_async(reserved)
+            p.count("queued_s", time.perf_counter() - t0)
+            p.count("calls")
+            completion = None
+            try:
+                completion = await p.generate_async(prompt, model, system, temperature, timeout, prefix)
+            except Exception as e:
+                if _give_up(p, e, attempt):
+                    raise
+                delay = backoff_delay(attempt, e)
+            finally:
+                p.limiter.release(reserved, None if completion is None else _used(completion, reserved))
+            if completion is not None:
+                sp.set("attempts", attempt + 1)
+                _record(p, sp, completion)
+                return completion.text
+            await asyncio.sleep(delay)
+
+
+def stream(provider, prompt, *, model, system=None, prefix="", temperature=0.2,
+           purpose="generation", timeout=None):
+    """Yield the text of a streamed completion as the chunks arrive.
+
+    A failed attempt is retried only while nothing has been yielded yet.
+    The span is opened by hand because the consumer may stop iterating early.
+    """
+    p = get_provider(provider)
+    timeout = timeout or LLM_TIMEOUT
+    reserved = estimate_tokens(prefix + prompt) + COMPLETION_ESTIMATE
+    sp = start_span("llm_call", provider=provider, model=model, purpose=purpose,
+                    stream=True, **_prompt_attrs(system, prefix, prompt))
+    error = None
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            t0 = time.perf_counter()
+            p.limiter.acquire(reserved)
+            p.count("queued_s", time.perf_counter() - t0)
+            p.count("calls")
+            completion = None
+            yielded = False
+            try:
+                chunks = p.generate_stream(prompt, model, system, temperature, timeout, prefix)
+                while True:
+                    try:
+                        text = next(chunks)
+                    except StopIteration as stop:
+                        completion = stop.value
+                        break
+                    if not yielded:
+                        sp.set("first_token_s", time.time() - sp.start)
+                        yielded = True
+                    yield text
+            except Exception as e:
+                if yielded or _give_up(p, e, attempt):
+                    raise
+                delay = backoff_delay(attempt, e)
+            finally:
+                p.limiter.release(reserved, None if completion is None else _used(completion, reserved))
+            if completion is not None or yielded:
+                sp.set("attempts", attempt + 1)
+                if completion is not None:
+                    _record(p, sp, completion)
+                return
+            time.sleep(delay)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        end_span(sp, error)
@@ -1,28 +1,78 @@
 import requests
-import openai
+import llm_gateway
 import json
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
+from cachestore import DEFAULT_DB_PATH, TTLCache
+from extraction_cache import cached_extraction, parse_term_list
+from tracing import span
 
 load_dotenv()
 
 # === CONFIGURATION ===
-openai.api_key = os.getenv("OPENAI_API_KEY")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+OPENAI_MODEL = "gpt-4o"
+
+# Outgoing HTTP: max in-flight requests per fan-out and per-request timeout (s)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("SEARCH_MAX_CONCURRENCY", "8"))
+HTTP_TIMEOUT = float(os.getenv("SEARCH_HTTP_TIMEOUT", "15"))
+
+# Labels/descriptions from wbgetentities, cached per (language, QID)
+WIKIDATA_API_URL = os.getenv("WIKIDATA_API_URL", "https://www.wikidata.org/w/api.php")
+WBGETENTITIES_MAX_IDS = 50  # API limit per request for regular clients
+WIKIDATA_CACHE_TTL = float(os.getenv("WIKIDATA_CACHE_TTL", str(7 * 24 * 3600)))
+_entity_cache = TTLCache(
+    "wbgetentities",
+    maxsize=int(os.getenv("WIKIDATA_CACHE_SIZE", "10000")),
+    ttl=WIKIDATA_CACHE_TTL,
+    db_path=DEFAULT_DB_PATH,
+)
+
+
+# === HTTP SESSION ===
+# One pooled session for all outgoing calls so keep-alive connections are
+# reused across terms and questions instead of a new TLS handshake each time.
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Created on first use, possibly from several pool threads at once
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
 
 # === LLM CALL ===
-def call_openai(prompt):
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-    return response.choices[0].message.content.strip()
+# Through the shared LLM gateway: pooled client, concurrency and
+# tokens-per-minute limits, retries with backoff, llm_call spans
+def call_openai(prompt, purpose="generation"):
+    return llm_gateway.complete("openai", prompt, model=OPENAI_MODEL, temperature=0, purpose=purpose)
 
 
 # === STEP 1: Extract semantic roles ===
+# Bump when the extraction prompt below changes (part of the cache key)
+CONCEPT_PROMPT_VERSION = 1
+
+
 def convert_query_to_wikidata_search(output):
+    # Memoised in the shared extraction cache; failed replies are not cached
+    with span("concept_extraction", backend="search"):
+        return cached_extraction("search", OPENAI_MODEL, CONCEPT_PROMPT_VERSION, output, _extract_terms)
+
+
+def _extract_terms(output):
     prompt = f"""
 Your job is to extract only the **semantic concepts** from the user's natural language query that should be searched on Wikidata to build a SPARQL query.
 
@@ -50,20 +100,8 @@ And also try always to remove plural (albums -> album | dogs -> dog). You just n
 some product (album named Pictures for example)
 
 """
-    text = call_openai(prompt)
-
-    # Clean markdown if needed
-    if text.startswith("```"):
-        text = text.strip("```").strip()
-        if text.startswith("python"):
-            text = text[len("python"):].strip()
-
-    terms = eval(text)
-
-    if isinstance(terms, list) and all("term" in t and "role" in t for t in terms):
-        return terms
-    else:
-        raise ValueError("LLM output did not follow expected structure")
+    text = call_openai(prompt, purpose="concept_extraction")
+    return parse_term_list(text, fields=("term", "role"))
 
 
 # === STEP 1.5: Normalize roles ===
@@ -85,21 +123,29 @@ def normalize_roles(terms):
 
 
 # === STEP 2: Use Serper to search Wikidata ===
-def query_search_api(terms):
-    url = "https://google.serper.dev/search"
+def _search_term(term):
     headers = {
         'X-API-KEY': SERPER_API_KEY,
         'Content-Type': 'application/json'
     }
+    payload = json.dumps({"q": term + " site:wikidata.org"})
+    response = get_session().post(SERPER_URL, headers=headers, data=payload, timeout=HTTP_TIMEOUT)
+    data = response.json()
+    return data.get("organic", [])
+
 
-    term_results = {}
-    for term in terms:
-        payload = json.dumps({"q": term + " site:wikidata.org"})
-        response = requests.post(url, headers=headers, data=payload)
-        data = response.json()
-        term_results[term] = data.get("organic", [])
-    
-    return term_results
+def query_search_api(terms, max_concurrency=None):
+    # All terms are searched concurrently (at most max_concurrency in flight),
+    # so a question costs roughly one round trip instead of one per term.
+    terms = list(dict.fromkeys(terms))
+    if not terms:
+        return {}
+
+    workers = min(len(terms), max_concurrency or MAX_CONCURRENT_REQUESTS)
+    with span("serper_search", terms=len(terms)), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_search_term, terms))
+
+    return dict(zip(terms, results))
 
 
 # === STEP 3: Extract relevant Q-IDs ===
@@ -129,11 +175,7 @@ def extract_ids_per_term(results_dict, max_ids_per_term=4):
 
 
 # === STEP 4: Retrieve Wikidata labels and descriptions ===
-def get_wikidata_descriptions(qids, language='en'):
-    if not qids:
-        return []
-
-    url = "https://www.wikidata.org/w/api.php"
+def _fetch_entities(qids, language):
     params = {
         "action": "wbgetentities",
         "ids": "|".join(qids),
@@ -141,17 +183,51 @@ def get_wikidata_descriptions(qids, language='en'):
         "props": "descriptions|labels",
         "languages": language
     }
-    response = requests.get(url, params=params)
+    response = get_session().get(WIKIDATA_API_URL, params=params, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
     data = response.json()
-    result = []
+    if "error" in data:
+        raise requests.HTTPError(f"wbgetentities failed: {data['error']}", response=response)
 
+    # Only entities the reply really has; missing ones are neither returned nor cached
+    fetched = {}
     for qid in qids:
-        entity = data["entities"].get(qid, {})
+        entity = data["entities"].get(qid)
+        if entity is None or "missing" in entity:
+            continue
         label = entity.get("labels", {}).get(language, {}).get("value", "")
         description = entity.get("descriptions", {}).get(language, {}).get("value", "")
-        result.append({"id": qid, "label": label, "description": description})
-    
-    return result
+        fetched[qid] = {"label": label, "description": description}
+    return fetched
+
+
+def get_wikidata_descriptions(qids, language='en'):
+    if not qids:
+        return []
+
+    # Serve what we can from the cache; fetch the rest in 50-id chunks,
+    # all chunks in parallel.
+    with span("wbgetentities", ids=len(qids)) as sp:
+        cached = _entity_cache.get_many(f"{language}:{qid}" for qid in qids)
+        known = {key.split(":", 1)[1]: value for key, value in cached.items()}
+        misses = [qid for qid in dict.fromkeys(qids) if qid not in known]
+        sp.set("cache_hits", len(known))
+        sp.set("cache_misses", len(misses))
+
+        if misses:
+            chunks = [misses[i:i + WBGETENTITIES_MAX_IDS] for i in range(0, len(misses), WBGETENTITIES_MAX_IDS)]
+            workers = min(len(chunks), MAX_CONCURRENT_REQUESTS)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for fetched in pool.map(lambda chunk: _fetch_entities(chunk, language), chunks):
+                    known.update(fetched)
+                    _entity_cache.set_many({f"{language}:{qid}": value for qid, value in fetched.items()})
+
+    return [{"id": qid, **known[qid]} for qid in qids if qid in known]
+
+
+def wikidata_cache_stats():
+    """Hit/miss counters of the wbgetentities label/description cache."""
+    return _entity_cache.stats()
 
 
 # === STEP 5: Generate SPARQL query ===
@@ -195,7 +271,18 @@ Now generate a SPARQL query for:
 
 Return only the SPARQL query.
 """
-    return call_openai(prompt)
+    with span("generation", backend="search"):
+        return call_openai(prompt)
+
+
+# === ALL STEPS: question -> SPARQL ===
+def translate(user_question):
+    """Run steps 1-5 for one question and return the generated SPARQL."""
+    terms = normalize_roles(convert_query_to_wikidata_search(user_question))
+    search_results = query_search_api([entry["term"] for entry in terms])
+    wikidata_ids = extract_ids_per_term(search_results)
+    entities = get_wikidata_descriptions(wikidata_ids)
+    return natural_language_to_sparql(user_question, entities, terms)
 
 
 # === MAIN EXECUTION ===
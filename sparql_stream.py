@@ -0,0 +1,358 @@
+import codecs
+import json
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# ------------------------ Streaming SPARQL-JSON parsing ------------------------
+#
+# A SPARQL JSON response is read chunk by chunk as it arrives.  Each binding
+# is decoded on its own and its values are appended straight to one typed
+# buffer per variable (int64 / float64 / bool arrays, or a list of strings),
+# so neither the whole body, nor the parsed JSON tree, nor a list of row
+# dicts is ever held in memory.  Parsing can stop early at a row cap or a
+# byte budget, and a callback receives the first page of rows as soon as it
+# is complete, before the download has finished.
+#
+# Values are typed by their datatype: xsd integer types become int64
+# (nullable Int64 when some rows are unbound), xsd:decimal/double/float
+# float64 and xsd:boolean bool.  Everything else, and any column that mixes
+# types, stays text.  Unbound values are NaN/<NA>, as with a DataFrame built
+# from row dicts, and columns appear in order of first use.
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+_INT_TYPES = {XSD + t for t in (
+    "integer", "int", "long", "short", "byte", "nonNegativeInteger", "positiveInteger",
+    "nonPositiveInteger", "negativeInteger", "unsignedLong", "unsignedInt", "unsignedShort",
+    "unsignedByte",
+)}
+_FLOAT_TYPES = {XSD + "decimal", XSD + "double", XSD + "float"}
+_BOOL_TYPE = XSD + "boolean"
+
+_WHITESPACE = " \t\r\n"
+_COMPACT_AT = 1 << 20  # drop consumed text from the buffer beyond this many characters
+
+
+class SparqlParseError(ValueError):
+    """The response is not valid SPARQL JSON."""
+
+
+class _Column:
+    """Values of one variable; typed while all bound values agree on a type."""
+
+    __slots__ = ("kind", "values", "mask", "lexical")
+
+    def __init__(self, missing):
+        self.kind = None  # None (only nulls so far), "int", "float", "bool" or "str"
+        self.values = [None] * missing
+        self.mask = None  # bytearray, 1 = unbound; used by the typed kinds
+        # Typed kinds: row -> lexical form, for values that _text() would not
+        # reproduce (e.g. "007", "1.50"); used when the column becomes text
+        self.lexical = {}
+
+    def _text(self, value):
+        if self.kind == "bool":
+            return "true" if value else "false"
+        return str(value)
+
+    @staticmethod
+    def _classify(term):
+        value = term.get("value")
+        if term.get("type") in ("literal", "typed-literal"):
+            datatype = term.get("datatype")
+            try:
+                if datatype in _INT_TYPES:
+                    return "int", int(value)
+                if datatype in _FLOAT_TYPES:
+                    return "float", float(value)
+            except (TypeError, ValueError, OverflowError):
+                return "str", value
+            if datatype == _BOOL_TYPE and value in ("true", "false", "1", "0"):
+                return "bool", value in ("true", "1")
+        return "str", value
+
+    def _to_typed(self, kind):
+        # Only nulls so far: switch to a typed buffer
+        n = len(self.values)
+        self.kind = kind
+        self.values = array({"int": "q", "float": "d", "bool": "b"}[kind], bytes(8 * n if kind != "bool" else n))
+        if kind == "float":
+            for i in range(n):
+                self.values[i] = math.nan
+        self.mask = bytearray(b"\x01" * n)
+
+    def _to_text(self):
+        # Mixed types: keep everything as text from here on, in the lexical
+        # form the endpoint sent
+        if self.kind in ("int", "float", "bool"):
+            lexical = self.lexical
+            self.values = [None if m else lexical[i] if i in lexical else self._text(v)
+                           for i, (v, m) in enumerate(zip(self.values, self.mask))]
+        self.kind = "str"
+        self.mask = None
+        self.lexical = {}
+
+    def append(self, term):
+        kind, value = self._classify(term)
+        if self.kind is None and kind != "str":
+            self._to_typed(kind)
+        elif self.kind != kind and self.kind != "str":
+            self._to_text()
+            value = term.get("value")
+        if self.kind in ("int", "float", "bool"):
+            try:
+                self.values.append(value)
+            except OverflowError:  # integer beyond int64
+                self._to_text()
+                self.values.append(term.get("value"))
+                return
+            self.mask.append(0)
+            if self._text(value) != term.get("value"):
+                self.lexical[len(self.values) - 1] = term.get("value")
+        else:
+            self.kind = "str"
+            self.values.append(term.get("value"))
+
+    def append_null(self):
+        if self.kind in ("int", "float", "bool"):
+            self.values.append(math.nan if self.kind == "float" else 0)
+            self.mask.append(1)
+        else:
+            self.values.append(None)
+
+    def to_lexical(self):
+        return {str(i): v for i, v in self.lexical.items()}
+
+    def to_list(self):
+        if self.kind in ("int", "float", "bool"):
+            return [None if m else v for v, m in zip(self.values, self.mask)]
+        return list(self.values)
+
+    @classmethod
+    def from_list(cls, kind, values, lexical=None):
+        column = cls(0)
+        column.kind = kind
+        column.lexical = {int(i): v for i, v in (lexical or {}).items()}
+        if kind in ("int", "float", "bool"):
+            null = math.nan if kind == "float" else 0
+            column.values = array({"int": "q", "float": "d", "bool": "b"}[kind],
+                                  [null if v is None else v for v in values])
+            column.mask = bytearray(v is None for v in values)
+        else:
+            column.values = list(values)
+        return column
+
+    def to_series_values(self, start=0, stop=None):
+        values = self.values[start:stop]
+        if self.kind == "int" or self.kind == "bool":
+            mask = np.array(self.mask[start:stop], dtype=np.bool_)
+            data = np.array(values, dtype=np.int64 if self.kind == "int" else np.bool_)
+            if not mask.any():
+                return data
+            if self.kind == "bool":
+                return pd.arrays.BooleanArray(data, mask)
+            return pd.arrays.IntegerArray(data, mask)
+        if self.kind == "float":
+            return np.array(values, dtype=np.float64)
+        out = np.empty(len(values), dtype=object)
+        out[:] = [math.nan if v is None else v for v in values]
+        return out
+
+
+class ColumnarResult:
+    """Typed column buffers filled one binding at a time."""
+
+    def __init__(self):
+        self.vars = []        # from the "head" section
+        self.columns = {}     # variable -> _Column, in order of first use
+        self.rows = 0
+        self.boolean = None   # ASK queries
+
+    def add_binding(self, binding):
+        for name, term in binding.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = _Column(self.rows)
+            column.append(term)
+        if len(binding) < len(self.columns):
+            for name, column in self.columns.items():
+                if name not in binding:
+                    column.append_null()
+        self.rows += 1
+
+    def to_payload(self, rename=str):
+        """JSON-serialisable form, for the result cache."""
+        return {"rows": self.rows,
+                "columns": [[rename(name), column.kind, column.to_list(), column.to_lexical()]
+                            for name, column in self.columns.items()]}
+
+    @classmethod
+    def from_payload(cls, payload, rename=str):
+        result = cls()
+        result.rows = payload["rows"]
+        for name, kind, values, *lexical in payload["columns"]:
+            result.columns[rename(name)] = _Column.from_list(kind, values, *lexical)
+        return result
+
+    def to_frame(self, start=0, stop=None):
+        return pd.DataFrame(
+            {name: column.to_series_values(start, stop) for name, column in self.columns.items()},
+            index=pd.RangeIndex(len(range(self.rows)[start:stop])),
+        )
+
+
+class _Reader:
+    """Pull parser over an iterator of byte chunks."""
+
+    def __init__(self, chunks, max_bytes=None):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes = 0
+        self.max_bytes = max_bytes
+        self.over_budget = False
+
+    def _more(self):
+        if self.eof:
+            return False
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            self.over_budget = True
+            self.eof = True
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self._decoder.decode(b"", final=True)
+        else:
+            self.bytes += len(chunk)
+            text = self._decoder.decode(chunk)
+        if self.pos > _COMPACT_AT:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        self.buf += text
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or "" at the end."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise SparqlParseError(f"Expected {char!r} at {self._where()}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self.buf, self.pos)
+                # A number or literal that ends with the buffer may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise SparqlParseError(f"Failed to parse JSON: {e}") from None
+            self._more()
+
+    def _where(self):
+        return repr(self.buf[self.pos:self.pos + 40])
+
+
+def parse_sparql_json(chunks, *, max_rows=None, max_bytes=None, page_size=None, on_page=None):
+    """Parse a SPARQL JSON response from an iterator of byte chunks.
+
+    Stops after ``max_rows`` bindings or once ``max_bytes`` bytes have been
+    read.  When ``on_page`` is given it is called once with a DataFrame of
+    the first ``page_size`` rows (or all rows, if there are fewer).  Returns
+    ``(result, info)`` where ``result`` is a :class:`ColumnarResult` and
+    ``info`` holds ``bytes``, ``rows`` and ``truncated`` (None, "max_rows"
+    or "max_bytes").
+    """
+    reader = _Reader(chunks, max_bytes)
+    result = ColumnarResult()
+    truncated = None
+    paged = on_page is None
+
+    def bindings():
+        nonlocal truncated, paged
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.pos += 1
+            return
+        while True:
+            if max_rows is not None and result.rows >= max_rows:
+                truncated = "max_rows"
+                return
+            try:
+                binding = reader.value()
+            except SparqlParseError:
+                if reader.over_budget:
+                    truncated = "max_bytes"
+                    return
+                raise
+            result.add_binding(binding)
+            if not paged and result.rows >= page_size:
+                on_page(result.to_frame(0, page_size))
+                paged = True
+            sep = reader.peek()
+            if sep == ",":
+                reader.pos += 1
+            elif sep == "]":
+                reader.pos += 1
+                return
+            elif reader.over_budget:
+                truncated = "max_bytes"
+                return
+            else:
+                raise SparqlParseError(f"Expected ',' or ']' at {reader._where()}")
+
+    def obj(handlers):
+        # Walk the keys of an object, streaming the ones in `handlers`
+        reader.expect("{")
+        if reader.peek() == "}":
+            reader.pos += 1
+            return
+        while truncated is None:
+            key = reader.value()
+            reader.expect(":")
+            handler = handlers.get(key)
+            if handler is not None:
+                handler()
+            else:
+                reader.value()
+            if truncated is not None:
+                return
+            sep = reader.peek()
+            reader.pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise SparqlParseError(f"Expected ',' or '}}' at {reader._where()}")
+
+    def head():
+        section = reader.value()
+        result.vars = list(section.get("vars", [])) if isinstance(section, dict) else []
+
+    def boolean():
+        result.boolean = reader.value()
+
+    obj({
+        "head": head,
+        "results": lambda: obj({"bindings": bindings}),
+        "boolean": boolean,
+    })
+    if not paged:
+        on_page(result.to_frame(0, page_size))
+    return result, {"bytes": reader.bytes, "rows": result.rows, "truncated": truncated}
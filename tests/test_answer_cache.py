@@ -0,0 +1,28 @@
+import sqlite3
+
+import numpy as np
+
+from RAGModel.answer_cache import SemanticAnswerCache
+
+
+def test_table_is_bounded_across_processes(tmp_path):
+    db_path = tmp_path / "cache.sqlite"
+    first = SemanticAnswerCache(maxsize=2, db_path=db_path)
+    second = SemanticAnswerCache(maxsize=2, db_path=db_path)
+    for i, cache in enumerate([first, second] * 3):
+        embedding = np.zeros(4, dtype=np.float32)
+        embedding[i % 4] = 1.0
+        cache.store(f"question {i}", embedding, ["Q1"], "rag", "answer")
+    with sqlite3.connect(db_path) as db:
+        questions = [q for (q,) in db.execute("SELECT question FROM answer_cache ORDER BY last_used")]
+    assert questions == ["question 4", "question 5"]
+
+
+def test_lookups_return_their_own_similarity():
+    cache = SemanticAnswerCache(threshold=0.5)
+    cache.store("question", np.array([1.0, 0.0], dtype=np.float32), ["Q1"], "rag", "answer")
+    close = cache.lookup(np.array([1.0, 0.0], dtype=np.float32), ["Q1"], "rag")
+    further = cache.lookup(np.array([0.8, 0.6], dtype=np.float32), ["Q1"], "rag")
+    assert close.similarity == 1.0
+    assert abs(further.similarity - 0.8) < 1e-6
+    assert close.key == further.key
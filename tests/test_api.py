@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi.testclient")
+from fastapi.testclient import TestClient
+
+import api
+import captureSparql as cs
+import llm_gateway
+import RAGModel.answer_cache as answer_cache
+import RAGModel.llmbasedbackend as lm
+from benchmarks.stubs import Recordings, start_http_stubs
+from cachestore import TTLCache
+
+ANSWER = "Thought: humans.\nSPARQL:\nSELECT ?item WHERE { ?item wdt:P31 wd:Q5 } LIMIT 2"
+ROWS = {"head": {"vars": ["item"]}, "results": {"bindings": [
+    {"item": {"type": "uri", "value": "http://www.wikidata.org/entity/Q1"}},
+    {"item": {"type": "uri", "value": "http://www.wikidata.org/entity/Q2"}},
+]}}
+
+
+def _embedding(question):
+    # Questions that differ only in case and punctuation share a direction
+    vec = np.zeros(64, dtype=np.float32)
+    for word in question.lower().strip("?!. ").split():
+        vec[hash(word) % 64] += 1.0
+    return vec / np.linalg.norm(vec)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The LLM, retrieval and the SPARQL endpoint are local stand-ins; the
+    # caches are in memory
+    gemini = llm_gateway.FakeProvider("gemini", lambda prompt, system: ANSWER)
+    monkeypatch.setattr(llm_gateway, "_providers", {"gemini": gemini})
+    monkeypatch.setattr(lm, "warmup", lambda: None)
+    monkeypatch.setattr(lm, "prepare_prompt", lambda question, history, timings=None: lm.Prompt("", question))
+    monkeypatch.setattr(lm, "retrieve_offline_ids", lambda question: (["Q5"], []))
+    monkeypatch.setattr(lm, "encode_queries", lambda questions: np.stack([_embedding(q) for q in questions]))
+    monkeypatch.setattr(answer_cache, "_cache", answer_cache.SemanticAnswerCache())
+    monkeypatch.setattr(cs, "_result_cache", TTLCache("sparql"))
+
+    recordings = tmp_path / "recordings.json"
+    recordings.write_text(json.dumps({"sparql": {cs.canonicalize_query(cs.split_answer(ANSWER)[1])[0]: ROWS}}))
+    server = start_http_stubs(Recordings(recordings))
+    monkeypatch.setattr(cs, "url", f"http://127.0.0.1:{server.server_port}/sparql")
+    with TestClient(api.app) as client:
+        client.gemini = gemini
+        yield client
+    server.shutdown()
+
+
+def test_health(client):
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_translate_caches_the_answer(client):
+    first = client.post("/translate", json={"question": "Who are humans?"}).json()
+    assert first["sparql"] == "SELECT ?item WHERE { ?item wdt:P31 wd:Q5 } LIMIT 2"
+    assert not first["cached"] and first["cache_key"]
+
+    second = client.post("/translate", json={"question": "who are humans"}).json()
+    assert second["cached"] and second["cache_key"] == first["cache_key"]
+    assert second["cached_question"] == "Who are humans?"
+    assert client.gemini.counters["calls"] == 1
+
+
+def test_ask_miss_then_hit(client):
+    miss = client.post("/ask", json={"question": "Who are humans?"}).json()
+    assert not miss["cached"] and miss["error"] is None
+    assert miss["columns"] == ["item"]
+    assert [row["item"] for row in miss["rows"]] == ["http://www.wikidata.org/entity/Q1",
+                                                     "http://www.wikidata.org/entity/Q2"]
+
+    hit = client.post("/ask", json={"question": "Who are humans?"}).json()
+    assert hit["cached"] and hit["similarity"] == pytest.approx(1.0)
+    assert hit["rows"] == miss["rows"]
+    assert client.gemini.counters["calls"] == 1
+
+
+def test_uncached_requests_and_forgotten_answers_are_regenerated(client):
+    key = client.post("/ask", json={"question": "Who are humans?"}).json()["cache_key"]
+    assert not client.post("/ask", json={"question": "Who are humans?", "use_cache": False}).json()["cached"]
+    assert client.delete(f"/answers/{key}").json() == {"deleted": key}
+    assert not client.post("/ask", json={"question": "Who are humans?"}).json()["cached"]
+    assert client.gemini.counters["calls"] == 3
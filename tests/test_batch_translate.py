@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from batch_translate import ParquetSink
+
+
+def _record(rid, **extra):
+    record = {"id": rid, "question": f"q {rid}", "backend": "rag", "answer": None,
+              "sparql": None, "error": None, "input": {"question": f"q {rid}"}, "elapsed_s": 0.1}
+    record.update(extra)
+    return record
+
+
+def test_parquet_part_keeps_result_fields_when_first_record_failed(tmp_path):
+    sink = ParquetSink(tmp_path / "out", flush_every=10)
+    sink.write(_record("row-1", error="RuntimeError: boom"))
+    sink.write(_record("row-2", answer="SPARQL:\nSELECT ?x {}", sparql="SELECT ?x {}",
+                       columns=["x"], rows=[{"x": "1"}], row_count=1, exec_error=None))
+    sink.close()
+
+    (part,) = sorted((tmp_path / "out").glob("part-*.parquet"))
+    table = pq.read_table(part).to_pylist()
+    assert table[0]["columns"] is None and table[0]["row_count"] is None
+    assert json.loads(table[1]["columns"]) == ["x"]
+    assert json.loads(table[1]["rows"]) == [{"x": "1"}]
+    assert table[1]["row_count"] == 1
+    assert sink.done() == {"row-1": True, "row-2": False}
+
+
+def test_parquet_parts_share_one_schema(tmp_path):
+    sink = ParquetSink(tmp_path / "out", flush_every=1)
+    sink.write(_record("row-1"))
+    sink.write(_record("row-2", error="ValueError: x", exec_error="SparqlError: y"))
+    sink.close()
+
+    schemas = {str(pq.read_schema(p)) for p in (tmp_path / "out").glob("part-*.parquet")}
+    assert len(schemas) == 1
@@ -0,0 +1,31 @@
+import sqlite3
+
+import cachestore
+from cachestore import TTLCache
+
+
+def _rows(db_path, namespace):
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT key FROM cache WHERE namespace = ? ORDER BY rowid", (namespace,)).fetchall()
+
+
+def test_database_keeps_the_newest_rows(tmp_path):
+    db_path = tmp_path / "cache.sqlite"
+    cache = TTLCache("test", maxsize=3, db_path=db_path)
+    other = TTLCache("other", maxsize=3, db_path=db_path)
+    other.set("kept", 1)
+    for i in range(10):
+        cache.set(f"k{i}", i)
+    assert _rows(db_path, "test") == [("k7",), ("k8",), ("k9",)]
+    assert _rows(db_path, "other") == [("kept",)]
+
+
+def test_expired_rows_are_purged_while_writing(tmp_path, monkeypatch):
+    db_path = tmp_path / "cache.sqlite"
+    cache = TTLCache("test", maxsize=10, db_path=db_path)
+    cache.set("old", 1, ttl=-1)
+    cache.set("new", 2)
+    assert ("old",) in _rows(db_path, "test")  # purged at most every PURGE_INTERVAL
+    monkeypatch.setattr(cachestore, "PURGE_INTERVAL", 0.0)
+    cache.set("newer", 3)
+    assert _rows(db_path, "test") == [("new",), ("newer",)]
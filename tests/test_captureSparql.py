@@ -0,0 +1,18 @@
+from captureSparql import canonicalize_query
+
+
+def test_label_variables_follow_their_base_variable():
+    item, _ = canonicalize_query(
+        "SELECT ?item ?itemLabel WHERE { ?item wdt:P31 wd:Q5 . "
+        "SERVICE wikibase:label { bd:serviceParam wikibase:language \"en\". } }")
+    person, _ = canonicalize_query(
+        "SELECT ?person ?itemLabel WHERE { ?person wdt:P31 wd:Q5 . "
+        "SERVICE wikibase:label { bd:serviceParam wikibase:language \"en\". } }")
+    assert item != person
+
+
+def test_renamed_variables_share_a_key():
+    a, map_a = canonicalize_query("SELECT ?item ?itemLabel WHERE { ?item wdt:P31 wd:Q5 }")
+    b, map_b = canonicalize_query("select ?x ?xLabel where { ?x wdt:P31 wd:Q5 } # comment")
+    assert a == b
+    assert map_a["itemLabel"] == map_b["xLabel"] == map_a["item"] + "Label"
@@ -0,0 +1,61 @@
+import pytest
+
+import extraction_cache
+from cachestore import TTLCache
+from extraction_cache import cached_extraction, parse_term_list
+
+
+@pytest.mark.parametrize("reply, terms", [
+    ('[{"term": "cat"}, {"term": "image"}]', [{"term": "cat"}, {"term": "image"}]),
+    ("```python\n[{'term': 'cat', 'role': 'class'}]\n```", [{"term": "cat", "role": "class"}]),
+    ('```json\n[{"term": "Q", "extra": null}]\n```', [{"term": "Q", "extra": None}]),
+    ("[]", []),
+])
+def test_parses_term_lists(reply, terms):
+    assert parse_term_list(reply) == terms
+
+
+@pytest.mark.parametrize("reply", [
+    '{"term": "cat"}',                       # a dict, not a list
+    '["cat", "dog"]',                        # items are not dicts
+    '[{"role": "class"}]',                   # no term
+    '[{"term": 42}]',                        # term is not a string
+    "__import__('os').getcwd()",             # code is not evaluated
+    "Sure! Here are the concepts: cat",
+])
+def test_rejects_other_replies(reply):
+    with pytest.raises(ValueError):
+        parse_term_list(reply)
+
+
+def test_required_fields():
+    with pytest.raises(ValueError):
+        parse_term_list('[{"term": "cat"}]', fields=("term", "role"))
+
+
+def test_unusable_replies_are_not_cached(monkeypatch):
+    monkeypatch.setattr(extraction_cache, "_cache", TTLCache("concept_extraction"))
+    replies = iter(['{"term": "cat"}', '[{"term": "cat"}]'])
+
+    def extract(question):
+        return parse_term_list(next(replies))
+
+    with pytest.raises(ValueError):
+        cached_extraction("rag", "model", 1, "cats?", extract)
+    assert cached_extraction("rag", "model", 1, "cats?", extract) == [{"term": "cat"}]
+    assert cached_extraction("rag", "model", 1, "cats?", extract) == [{"term": "cat"}]
+
+
+def test_disabled_cache_always_extracts(monkeypatch):
+    monkeypatch.setattr(extraction_cache, "_cache", TTLCache("concept_extraction"))
+    monkeypatch.setattr(extraction_cache, "ENABLED", False)
+    calls = []
+
+    def extract(question):
+        calls.append(question)
+        return [{"term": "cat"}]
+
+    for _ in range(2):
+        assert cached_extraction("rag", "model", 1, "cats?", extract) == [{"term": "cat"}]
+    assert calls == ["cats?", "cats?"]
+    assert extraction_cache.extraction_cache_stats()["misses"] == 0
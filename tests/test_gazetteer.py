@@ -0,0 +1,72 @@
+import csv
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from RAGModel.jsonfiles.gazetteer import Gazetteer
+from RAGModel.jsonfiles.ingest import iter_entities
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA = ROOT / "RAGModel" / "jsonfiles"
+ENTITY_FILES = ["capital.json", "companies.json", "countries.json", "event.json", "movies.json",
+                "public_figures.json"]
+
+
+def regex_matcher(entity_labels, prop_labels):
+    """The loops Gazetteer replaced: whole-word entity labels, substring property labels."""
+    patterns = [None if label is None else re.compile(r"\b" + re.escape(label.lower()) + r"\b")
+                for label in entity_labels]
+    prop_lower = [label.lower() for label in prop_labels]
+
+    def match(query_lower):
+        ents = [i for i, pattern in enumerate(patterns) if pattern is not None and pattern.search(query_lower)]
+        props = [i for i, label in enumerate(prop_lower) if label in query_lower]
+        return ents, props
+    return match
+
+
+@pytest.fixture(scope="module")
+def bundled():
+    entity_labels = [e["label"] for e in iter_entities(DATA / name for name in ENTITY_FILES)]
+    with open(DATA / "en.json", encoding="utf-8") as fp:
+        prop_labels = list(json.load(fp).values())
+    return entity_labels, prop_labels, Gazetteer.build(entity_labels, prop_labels)
+
+
+def test_bundled_labels_on_evaluation_questions(bundled):
+    entity_labels, prop_labels, gazetteer = bundled
+    expected = regex_matcher(entity_labels, prop_labels)
+    with open(ROOT / "evaluation.csv", newline="", encoding="utf-8") as fp:
+        questions = [row["question"] for row in csv.DictReader(fp) if row.get("question")]
+    # Each label on its own, and labels run together with punctuation around them
+    queries = questions + entity_labels[::7] + [f"({a}), {b}!" for a, b in zip(entity_labels[::11], prop_labels[::5])]
+    for query in queries:
+        query_lower = query.lower()
+        assert gazetteer.match(query_lower) == expected(query_lower), query
+
+
+EDGE_LABELS = ["New York", "York", "New York City", "C++", "U.S.", "São Paulo", "Zürich", "Ωmega",
+               "_id", "a", "an", "and", "at&t", "x-men", "population", "popul"]
+EDGE_QUERIES = [
+    "new york",                      # label is the whole string
+    "new york city is big",          # overlapping labels at the start
+    "flights to new york city",      # overlapping labels at the end
+    "newyork yorkshire",             # no word boundary
+    "who wrote c++?",                # label ending in a non-word character
+    "in the u.s., and at&t",         # punctuation inside and around labels
+    "x-men: the movie",
+    "são paulo and zürich",          # non-ASCII word characters
+    "ωmega_id",
+    "_id and an a",
+    "population of populations",     # property substring inside a word
+    "",
+    "!!!",
+]
+
+
+@pytest.mark.parametrize("query", EDGE_QUERIES)
+def test_edge_cases(query):
+    gazetteer = Gazetteer.build(EDGE_LABELS, EDGE_LABELS)
+    assert gazetteer.match(query) == regex_matcher(EDGE_LABELS, EDGE_LABELS)(query)
@@ -0,0 +1,31 @@
+from RAGModel.history import compact_history
+
+
+def words(text):
+    return len(text.split())
+
+
+def sparql_of(answer):
+    return answer.split("SPARQL:", 1)[-1].strip()
+
+
+def conversation(n):
+    history = []
+    for i in range(n):
+        history.append({"role": "user", "content": f"question {i}"})
+        history.append({"role": "assistant", "content": f"Thought: long reasoning {i}.\nSPARQL:\nQ{i}"})
+    return history
+
+
+def test_recent_turns_verbatim_older_compacted():
+    text, stats = compact_history(conversation(3), words, sparql_of, budget=100, recent_turns=1)
+    assert stats["history_verbatim"] == 1 and stats["history_compacted"] == 2
+    assert "long reasoning 2" in text and "long reasoning 1" not in text
+    assert "Assistant: SPARQL:\nQ0" in text
+
+
+def test_budget_drops_oldest_turns():
+    text, stats = compact_history(conversation(5), words, sparql_of, budget=12, recent_turns=0)
+    assert stats["history_dropped"] == 3
+    assert text.startswith("(3 earlier turns omitted)")
+    assert "question 4" in text and "question 1" not in text
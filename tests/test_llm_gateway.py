@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_gateway
+from llm_gateway import FakeError, FakeProvider, Limiter
+
+
+@pytest.fixture(autouse=True)
+def providers(monkeypatch):
+    # Fresh provider registry and no backoff sleeps
+    monkeypatch.setattr(llm_gateway, "_providers", {})
+    monkeypatch.setattr(llm_gateway, "BACKOFF_BASE", 0.0)
+
+
+# ---------------------------------------------------------------- limiter
+
+def test_async_waiters_are_woken_by_release_in_order():
+    limiter = Limiter(concurrency=1)
+    limiter.acquire(1)
+    events = []
+
+    async def waiter(name):
+        await limiter.acquire_async(1)
+        events.append(f"acquired {name}")
+
+    def release():
+        events.append("release")
+        limiter.release(1)
+
+    async def main():
+        tasks = [asyncio.create_task(waiter(name)) for name in "abc"]
+        await asyncio.sleep(0.05)
+        for delay in (0.1, 0.2, 0.3):
+            threading.Timer(delay, release).start()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert events == ["release", "acquired a", "release", "acquired b", "release", "acquired c"]
+    assert limiter.in_flight == 1
+
+
+def test_tokens_per_minute_bucket():
+    limiter = Limiter(concurrency=4, tpm=60_000)  # refills 1000 tokens per second
+    limiter.acquire(60_000)
+    t0 = time.monotonic()
+    limiter.acquire(300)
+    assert time.monotonic() - t0 >= 0.25
+    # Unused reservations are refunded: 59_900 of the first call's tokens come back
+    limiter.release(60_000, used=100)
+    t0 = time.monotonic()
+    limiter.acquire(50_000)
+    assert time.monotonic() - t0 < 0.25
+
+
+def test_a_call_larger_than_the_budget_waits_for_a_full_bucket():
+    limiter = Limiter(concurrency=1, tpm=1000)
+    limiter.acquire(10_000)  # capped at the bucket size instead of waiting forever
+    limiter.release(10_000)
+
+
+# ---------------------------------------------------------------- retries
+
+def test_retries_scripted_429_and_5xx():
+    provider = llm_gateway.register_provider(
+        FakeProvider("gemini", errors=[FakeError(429), FakeError(503), None]))
+    assert llm_gateway.complete("gemini", "ping", model="m") == "ping"
+    assert provider.counters["calls"] == 3
+    assert provider.counters["retries"] == 2
+    assert provider.counters["errors"] == 0
+    assert provider.limiter.in_flight == 0
+
+
+def test_gives_up_after_max_retries():
+    provider = llm_gateway.register_provider(
+        FakeProvider("gemini", errors=[FakeError(500)] * (llm_gateway.MAX_RETRIES + 2)))
+    with pytest.raises(FakeError):
+        llm_gateway.complete("gemini", "ping", model="m")
+    assert provider.counters["calls"] == llm_gateway.MAX_RETRIES + 1
+    assert provider.counters["errors"] == 1
+    assert provider.limiter.in_flight == 0
+
+
+def test_does_not_retry_client_errors():
+    provider = llm_gateway.register_provider(FakeProvider("openai", errors=[FakeError(400)]))
+    with pytest.raises(FakeError):
+        asyncio.run(llm_gateway.acomplete("openai", "ping", model="m"))
+    assert provider.counters["calls"] == 1
+    assert provider.counters["retries"] == 0
+
+
+def test_async_retries():
+    provider = llm_gateway.register_provider(FakeProvider("openai", errors=[FakeError(429), None]))
+    assert asyncio.run(llm_gateway.acomplete("openai", "ping", model="m")) == "ping"
+    assert provider.counters["retries"] == 1
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "BACKOFF_BASE", 1.0)
+    for attempt in range(10):
+        assert 0 <= llm_gateway.backoff_delay(attempt) <= llm_gateway.BACKOFF_CAP
+    assert llm_gateway.backoff_delay(0, FakeError(429, headers={"Retry-After": "7"})) >= 7
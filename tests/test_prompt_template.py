@@ -0,0 +1,69 @@
+import pytest
+
+import RAGModel.llmbasedbackend as lm
+from RAGModel.prompt_template import RDFS_PREFIX, USER_PREFIX
+
+QUESTIONS = [
+    ("Who founded Siemens?", [{"term": "Siemens"}], (["Q81230"], ["P112"])),
+    ("When was the Eiffel Tower built and by whom?", [{"term": "Eiffel Tower"}, {"term": "architect"}],
+     (["Q243"], ["P571", "P84"])),
+]
+
+
+@pytest.fixture
+def stubbed_retrieval(monkeypatch):
+    # Each question gets its own concepts, entities and examples, so only
+    # the prefix can be shared between the two prompts
+    by_question = {q: (concepts, hits, i) for i, (q, concepts, hits) in enumerate(QUESTIONS)}
+    monkeypatch.setattr(lm, "convert_query_to_wikidata_search", lambda q: by_question[q][0])
+    # also called with the joined candidate terms, which add nothing here
+    monkeypatch.setattr(lm, "retrieve_offline_ids", lambda q: by_question.get(q, (None, ([], [])))[1])
+    monkeypatch.setattr(lm, "retrieve_examples", lambda q: lm.EXAMPLES[by_question[q][2]::2][:3])
+    monkeypatch.setattr(lm, "retrieve_examples_rdfs", lambda q: lm.EXAMPLES_RDFS[by_question[q][2]::2][:3])
+
+
+@pytest.mark.parametrize("prepare, prefix", [
+    (lm.prepare_prompt, USER_PREFIX),
+    (lm.prepare_prompt_rdfs, RDFS_PREFIX),
+], ids=["rag", "rdfs"])
+def test_prefix_is_identical_across_requests(stubbed_retrieval, prepare, prefix):
+    history = []
+    prompts = []
+    for question, _, _ in QUESTIONS:
+        history.append({"role": "user", "content": question})
+        prompt = prepare(question, list(history))
+        prompts.append(prompt)
+        history.append({"role": "assistant", "content": "Thought: t.\nSPARQL:\nSELECT ?x WHERE { ?x ?p ?o }"})
+
+    first, second = prompts
+    assert first.suffix != second.suffix
+    assert first.prefix == second.prefix == prefix
+    assert str(first) == first.prefix + first.suffix
+    assert second.suffix.count("Who founded Siemens?") == 1  # only in the history
+
+
+def test_split_keeps_the_prompt_text():
+    # prefix + suffix is the text the single templates produced before the split
+    example = {"question": "Q?", "thought": "T.", "sparql": "SELECT 1"}
+    history = [{"role": "user", "content": "Hi"}]
+    rendered = "Question: Q?\nReasoningStyle: Chain of Thought\nThought: T.\nSPARQL:\nSELECT 1\n\n"
+
+    assert lm.build_prompt("And BMW?", [example], history, "(entity:Q26678)") == (
+        "\nUse the following examples to help you write a correct SPARQL query:\n\n"
+        f"{rendered}\n\n\n\nConversation so far:\nUser: Hi\n\n"
+        "Now answer the following question. Use only hints that were given (do not invent new ones):\n"
+        "Question: And BMW?\n(entity:Q26678)\nReasoningStyle:"
+    )
+    assert lm.build_prompt_rdfs("And BMW?", [example], history, '(label:"BMW"@en)') == (
+        "You are a SPARQL expert.\n\nTask:\n"
+        "- Translate the natural-language question to SPARQL.\n"
+        '- Use rdfs:label look-ups (e.g., ?x rdfs:label "Albert Einstein"@en).\n'
+        '- Always add SERVICE wikibase:label { bd:serviceParam wikibase:language "en". } for readable labels.\n'
+        "- Use the correct properties (like wdt:P31) and known constants (like wd:Q5).\n"
+        "- Never guess IDs \u2014 use only rdfs:label matches or provided hints.\n\n"
+        "Use the following examples to guide your approach:\n\n"
+        f"{rendered}\n\nConversation so far:\nUser: Hi\n\n"
+        "Now answer the following question using rdfs:label and no QIDs unless explicitly provided:\n"
+        'Question: And BMW?\n(label:"BMW"@en)\n'
+        "Your answer should follow this structure:\nThought: <reasoning>\nSPARQL:\n<query>"
+    )
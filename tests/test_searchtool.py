@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import requests
+
+from benchmarks.stubs import Recordings, start_http_stubs
+from cachestore import TTLCache
+from searchTool import searchtool
+
+
+@pytest.fixture(scope="module")
+def recordings():
+    return Recordings()
+
+
+@pytest.fixture
+def stub(recordings, monkeypatch):
+    server = start_http_stubs(recordings)
+    monkeypatch.setattr(searchtool, "WIKIDATA_API_URL", f"http://127.0.0.1:{server.server_port}/w/api.php")
+    monkeypatch.setattr(searchtool, "_entity_cache", TTLCache("wbgetentities", ttl=None))
+    yield server
+    server.shutdown()
+
+
+@pytest.mark.parametrize("error", [429, 503, {"error": {"code": "maxlag", "info": "Waiting for a database server"}}])
+def test_error_replies_are_not_cached(stub, recordings, error):
+    qid = next(iter(recordings.by_id))
+    stub.errors.append(error)
+    with pytest.raises(requests.HTTPError):
+        searchtool.get_wikidata_descriptions([qid])
+    assert len(searchtool._entity_cache) == 0
+
+    entities = searchtool.get_wikidata_descriptions([qid])
+    assert entities == [{"id": qid, "label": recordings.by_id[qid][0], "description": recordings.by_id[qid][1]}]
+
+
+def test_missing_entities_are_skipped(stub, recordings):
+    qid = next(iter(recordings.by_id))
+    entities = searchtool.get_wikidata_descriptions([qid, "Q999999999999"])
+    assert [e["id"] for e in entities] == [qid]
+    assert len(searchtool._entity_cache) == 1
+
+
+def test_search_terms_are_fetched_concurrently(recordings, monkeypatch):
+    delay, terms = 0.2, ["cat", "dog", "film", "album", "song", "city"]
+    server = start_http_stubs(recordings, latency=delay)
+    monkeypatch.setattr(searchtool, "SERPER_URL", f"http://127.0.0.1:{server.server_port}/search")
+    try:
+        t0 = time.perf_counter()
+        results = searchtool.query_search_api(terms)
+        elapsed = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+    assert list(results) == terms
+    assert elapsed < len(terms) * delay / 2  # sequentially it would take len(terms) * delay
@@ -0,0 +1,42 @@
+import json
+
+from sparql_stream import ColumnarResult, parse_sparql_json
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+
+def _parse(bindings):
+    body = json.dumps({"head": {"vars": ["x"]}, "results": {"bindings": bindings}}).encode()
+    return parse_sparql_json([body[i:i + 7] for i in range(0, len(body), 7)])[0]
+
+
+def _lit(value, datatype=None):
+    term = {"type": "literal", "value": value}
+    if datatype:
+        term["datatype"] = XSD + datatype
+    return {"x": term}
+
+
+def test_typed_columns():
+    df = _parse([_lit("1", "integer"), {}, _lit("3", "integer")]).to_frame()
+    assert str(df["x"].dtype) == "Int64"
+    assert df["x"].tolist()[::2] == [1, 3]
+
+
+def test_mixed_column_keeps_lexical_forms():
+    result = _parse([_lit("007", "integer"), _lit("abc"), _lit("5", "integer"), _lit("true", "boolean")])
+    column = result.columns["x"]
+    assert column.kind == "str"
+    assert column.values == ["007", "abc", "5", "true"]
+
+
+def test_demotion_restores_lexical_forms():
+    result = _parse([_lit("1.50", "decimal"), _lit("2", "decimal"), {}, _lit("n/a")])
+    assert result.columns["x"].values == ["1.50", "2", None, "n/a"]
+
+
+def test_payload_round_trip_keeps_lexical_forms():
+    result = _parse([_lit("1.50", "decimal"), _lit("2.5", "decimal")])
+    restored = ColumnarResult.from_payload(json.loads(json.dumps(result.to_payload())))
+    restored.columns["x"].append({"type": "literal", "value": "x"})
+    assert restored.columns["x"].values == ["1.50", "2.5", "x"]
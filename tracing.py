@@ -0,0 +1,260 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# ------------------------ Per-stage tracing ------------------------
+#
+# Every pipeline stage (concept extraction, embedding, FAISS search, lexical
+# matching, prompt build, LLM call, SPARQL clean/exec, result parsing, ...)
+# runs inside ``span(name, **attrs)``.  Spans nest through a context variable,
+# carry free-form attributes (token counts, prompt sizes, cache hits) and are
+# handed to every registered sink when they finish.
+#
+# Sinks are plain objects with an ``emit(record)`` method; two are built in:
+# JSON lines and the Prometheus text format.  Both can be enabled from the
+# environment:
+#
+#   NL2SPARQL_TRACE_JSONL=traces.jsonl   one JSON object per finished span
+#   NL2SPARQL_TRACE_PROM=metrics.prom    Prometheus text, rewritten per request
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("nl2sparql_span", default=None)
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "duration", "error")
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def record(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_s": self.duration,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoSpan:
+    """Returned by current_span() outside any span; swallows attributes."""
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+def current_span():
+    return _current.get() or _NoSpan()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as a stage called *name*."""
+    s = Span(name, _current.get(), attrs)
+    token = _current.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration = time.perf_counter() - t0
+        _current.reset(token)
+        _emit(s.record())
+
+
+def start_span(name, **attrs):
+    """Open a span without making it current; close it with :func:`end_span`.
+
+    For work that is suspended and resumed, such as a streaming generator,
+    where a ``with span(...)`` block could be exited in another context.
+    """
+    return Span(name, _current.get(), attrs)
+
+
+def end_span(s, error=None):
+    s.duration = time.time() - s.start
+    s.error = error
+    _emit(s.record())
+
+
+def _emit(record):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.emit(record)
+        except Exception:
+            logger.exception("trace sink %r failed", sink)
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+@contextmanager
+def collect(trace_id):
+    """Collect the records of spans of *trace_id* finished inside the block."""
+    records = []
+    sink = _TraceSink(trace_id, records)
+    add_sink(sink)
+    try:
+        yield records
+    finally:
+        remove_sink(sink)
+
+
+class _TraceSink:
+    def __init__(self, trace_id, records):
+        self.trace_id = trace_id
+        self.records = records
+
+    def emit(self, record):
+        if record["trace_id"] == self.trace_id:
+            self.records.append(record)
+
+
+# ------------------------ Built-in sinks ------------------------
+
+class JsonLinesSink:
+    """Append one JSON object per finished span to a file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as fp:
+            fp.write(line + "\n")
+
+
+class PrometheusSink:
+    """Aggregate spans into Prometheus metrics (text exposition format).
+
+    Stage durations become a histogram; numeric attributes listed in
+    ``COUNTED_ATTRS`` become counters per stage.  With a ``path`` the text is
+    rewritten whenever a root span (a whole request) finishes, for a
+    node-exporter textfile collector or similar.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    COUNTED_ATTRS = ("prompt_tokens", "completion_tokens", "prompt_chars", "history_tokens",
+                     "cache_hits", "cache_misses", "rows")
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(lambda: [0] * len(self.BUCKETS))
+        self._count = defaultdict(int)
+        self._sum = defaultdict(float)
+        self._errors = defaultdict(int)
+        self._counters = defaultdict(float)
+
+    def emit(self, record):
+        stage = record["name"]
+        seconds = record["duration_s"] or 0.0
+        with self._lock:
+            buckets = self._buckets[stage]
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._count[stage] += 1
+            self._sum[stage] += seconds
+            if record["status"] == "error":
+                self._errors[stage] += 1
+            for key in self.COUNTED_ATTRS:
+                value = record["attrs"].get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._counters[(key, stage)] += value
+        if self.path is not None and record["parent_id"] is None:
+            self.write(self.path)
+
+    def render(self):
+        lines = [
+            "# HELP nl2sparql_stage_duration_seconds Wall time per pipeline stage.",
+            "# TYPE nl2sparql_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self._count):
+                for bound, n in zip(self.BUCKETS, self._buckets[stage]):
+                    lines.append(f'nl2sparql_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+                lines.append(f'nl2sparql_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {self._count[stage]}')
+                lines.append(f'nl2sparql_stage_duration_seconds_sum{{stage="{stage}"}} {self._sum[stage]}')
+                lines.append(f'nl2sparql_stage_duration_seconds_count{{stage="{stage}"}} {self._count[stage]}')
+            lines.append("# HELP nl2sparql_stage_errors_total Stages that raised.")
+            lines.append("# TYPE nl2sparql_stage_errors_total counter")
+            for stage in sorted(self._errors):
+                lines.append(f'nl2sparql_stage_errors_total{{stage="{stage}"}} {self._errors[stage]}')
+            for key in self.COUNTED_ATTRS:
+                stages = sorted(stage for (k, stage) in self._counters if k == key)
+                if not stages:
+                    continue
+                lines.append(f"# TYPE nl2sparql_{key}_total counter")
+                for stage in stages:
+                    lines.append(f'nl2sparql_{key}_total{{stage="{stage}"}} {self._counters[(key, stage)]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def configure_from_env():
+    """Register the sinks requested through NL2SPARQL_TRACE_* variables."""
+    sinks = []
+    if os.getenv("NL2SPARQL_TRACE_JSONL"):
+        sinks.append(add_sink(JsonLinesSink(os.environ["NL2SPARQL_TRACE_JSONL"])))
+    if os.getenv("NL2SPARQL_TRACE_PROM"):
+        sinks.append(add_sink(PrometheusSink(os.environ["NL2SPARQL_TRACE_PROM"])))
+    return sinks
+
+
+load_dotenv()
+configure_from_env()